@@ -1,11 +1,12 @@
 """Simple authentication system."""
 
-import json
 from pathlib import Path
 from functools import wraps
 from flask import session, redirect, url_for, request, jsonify
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from tools import json_utils
+
 
 class AuthManager:
     """Simple username/password authentication manager."""
@@ -18,8 +19,7 @@ class AuthManager:
     def _load_users(self):
         """Load users from JSON file."""
         if self.users_file.exists():
-            with open(self.users_file, 'r') as f:
-                self.users = json.load(f)
+            self.users = json_utils.loads(self.users_file.read_bytes())
         else:
             # Default admin user
             self.users = {
@@ -33,8 +33,7 @@ class AuthManager:
     def _save_users(self):
         """Save users to JSON file."""
         ensure_directory(self.users_file.parent)
-        with open(self.users_file, 'w') as f:
-            json.dump(self.users, f, indent=2)
+        self.users_file.write_bytes(json_utils.dumps_bytes(self.users, indent=True))
     
     def authenticate(self, username: str, password: str) -> bool:
         """Authenticate user."""
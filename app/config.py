@@ -29,6 +29,15 @@ def load_config() -> Dict[str, Any]:
     config['ANTHROPIC_API_KEY'] = os.getenv('ANTHROPIC_API_KEY', config.get('anthropic_api_key', ''))
     config['DATA_DIR'] = os.getenv('DATA_DIR', config.get('data_dir', 'data/documents'))
     config['UPLOAD_DIR'] = os.getenv('UPLOAD_DIR', config.get('upload_dir', 'data/uploads'))
+    # "json" keeps comments/suggestions/chat inside each document record; "sqlite" stores them as rows
+    config['ENTITY_STORE'] = os.getenv('ENTITY_STORE', config.get('entity_store', 'json')).lower()
+    # Indent stored document/index JSON (for inspecting data/documents by hand)
+    config['PRETTY_JSON'] = os.getenv('PRETTY_JSON', str(config.get('pretty_json', False))).lower() == 'true'
+    # zstd-compress document state files (needs the zstandard package)
+    config['COMPRESS_STATE'] = os.getenv('COMPRESS_STATE', str(config.get('compress_state', True))).lower() == 'true'
+    # Template pages processed at once; above 1, pages no longer see the
+    # suggestions made for earlier pages
+    config['TEMPLATE_PAGE_CONCURRENCY'] = int(os.getenv('TEMPLATE_PAGE_CONCURRENCY', config.get('template_page_concurrency', 1)))
     config['MAX_UPLOAD_SIZE'] = int(os.getenv('MAX_UPLOAD_SIZE', config.get('max_upload_size', 50 * 1024 * 1024)))
     config['DEBUG'] = os.getenv('DEBUG', 'false').lower() == 'true' or config.get('debug', False)
     
@@ -9,20 +9,27 @@ from pathlib import Path
 from typing import Any, Callable, Dict, Optional, Tuple
 from uuid import uuid4
 
-from flask import jsonify, request, render_template, session, send_from_directory, abort, Blueprint, redirect, url_for
+from flask import Response, jsonify, request, render_template, session, send_from_directory, abort, Blueprint, redirect, url_for, stream_with_context
 from app.auth import login_required, auth_manager
 from app.config import get_config
 from functools import wraps
 from werkzeug.utils import secure_filename
 
 
-from core.agent import DocReviewAgent
+from core.agent import LLM_CACHE_DIR, DocReviewAgent
 from core.store import DocReviewStore
 from core.vfs import DocReviewVFSAdapter
 from core.template_processor import TemplateProcessor, load_template, list_templates
 from core.comments import CommentsManager
 from core.ai_suggestions import AISuggestionsManager
 from core.chat_history import ChatHistoryManager
+from core.store_sqlite import (
+    SQLiteAISuggestionsManager,
+    SQLiteChatHistoryManager,
+    SQLiteCommentsManager,
+    SQLiteEntityStore,
+)
+from tools import json_utils
 from tools.llm_client import get_llm_client, is_llm_available
 
 
@@ -64,6 +71,7 @@ _store = None
 _comments = None
 _ai_suggestions = None
 _chat_history = None
+_entity_store = None
 _socketio = None
 _upload_dir = None
 _vscode_web_dir = Path("web/static/vscode-web")
@@ -72,13 +80,25 @@ _angular_app_dir = Path("web/static/doc-review-app/dist/doc-review-app/browser")
 
 def init_doc_review_routes(socketio_instance=None):
     """Initialize doc review routes with dependencies."""
-    global _agent, _store, _comments, _ai_suggestions, _chat_history, _socketio, _upload_dir
+    global _agent, _store, _comments, _ai_suggestions, _chat_history, _entity_store, _socketio, _upload_dir
     _agent = DocReviewAgent()
     config = get_config()
-    _store = DocReviewStore(data_dir=config.get('DATA_DIR', 'data/documents'))
-    _comments = CommentsManager(_store)
-    _ai_suggestions = AISuggestionsManager(_store)
-    _chat_history = ChatHistoryManager(_store)
+    data_dir = config.get('DATA_DIR', 'data/documents')
+    _store = DocReviewStore(
+        data_dir=data_dir,
+        pretty=config.get('PRETTY_JSON', False),
+        compress=config.get('COMPRESS_STATE', True),
+        llm_cache_dir=str(LLM_CACHE_DIR),
+    )
+    if config.get('ENTITY_STORE') == 'sqlite':
+        _entity_store = SQLiteEntityStore(str(Path(data_dir) / "entities.sqlite3"))
+        _comments = SQLiteCommentsManager(_store, _entity_store)
+        _ai_suggestions = SQLiteAISuggestionsManager(_store, _entity_store)
+        _chat_history = SQLiteChatHistoryManager(_store, _entity_store)
+    else:
+        _comments = CommentsManager(_store)
+        _ai_suggestions = AISuggestionsManager(_store)
+        _chat_history = ChatHistoryManager(_store)
     _socketio = socketio_instance
     _upload_dir = Path(config.get('UPLOAD_DIR', 'data/uploads'))
     _upload_dir.mkdir(parents=True, exist_ok=True)
@@ -539,12 +559,11 @@ def get_template(template_id: str):
         return jsonify({"error": f"Template '{template_id}' not found"}), 404
     
     try:
-        with template_path.open("r", encoding="utf-8") as f:
-            data = f.read()
+        data = template_path.read_bytes()
         return jsonify({
             "template_id": template_id,
             "path": str(template_path),
-            "content": json.loads(data),
+            "content": json_utils.loads(data),
             "location": "config/doc_review/outline_templates" if "config/doc_review" in str(template_path) else "external/doc_review/templates",
         })
     except Exception as exc:  # pylint: disable=broad-except
@@ -567,7 +586,7 @@ def documents():
         return jsonify({"error": f"File not found at {path}"}), 400
 
     file_id = payload.get("file_id") or _slugify(path.stem)
-    if _store.load(file_id):
+    if _store.load(file_id, readonly=True):
         return jsonify({"error": "Document with this file_id already exists"}), 409
 
     overrides = payload.get("config") or {}
@@ -597,13 +616,15 @@ def documents():
 def get_or_delete_document(file_id: str):
     if request.method == "DELETE":
         success = _store.delete(file_id)
+        if _entity_store is not None:
+            _entity_store.delete_document(file_id)
         if success:
             logger.info(f"Document deleted: {file_id}")
             return jsonify({"message": f"Document '{file_id}' deleted successfully"}), 200
         return jsonify({"error": "Document not found"}), 404
     
     # GET method
-    record = _store.load(file_id)
+    record = _store.load(file_id, readonly=True)
     if not record:
         return jsonify({"error": "Document not found"}), 404
     return jsonify({"document": record})
@@ -611,7 +632,7 @@ def get_or_delete_document(file_id: str):
 @doc_review_bp.route("/api/doc_review/documents/<file_id>/phase1_summary", methods=["GET"])
 @_api_key_or_login_required
 def get_phase1_summary(file_id: str):
-    record = _store.load(file_id)
+    record = _store.load(file_id, readonly=True)
     if not record:
         return jsonify({"error": "Document not found"}), 404
     
@@ -628,7 +649,7 @@ def get_phase1_summary(file_id: str):
 @doc_review_bp.route("/api/doc_review/documents/<file_id>/phase1_reports", methods=["GET"])
 @_api_key_or_login_required
 def get_phase1_reports(file_id: str):
-    record = _store.load(file_id)
+    record = _store.load(file_id, readonly=True)
     if not record:
         return jsonify({"error": "Document not found"}), 404
 
@@ -1336,6 +1357,22 @@ def doc_review_chat(file_id: str):
         "document_status": record.get("status"),
     })
 
+def _stream_riskgpt_answer(file_id: str, chunks, metrics=None):
+    """Relay streamed answer text; errors after the headers are sent end the text.
+
+    The metrics (token usage included) are logged once the stream ends, since
+    they can no longer go in the response body.
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("RiskGPT stream failed for %s: %s", file_id, exc)
+        yield f"\n\nSorry, I encountered an error: {exc}"
+    finally:
+        if metrics:
+            logger.info("RiskGPT stream for %s finished: llm=%s", file_id, metrics.get("llm"))
+
 @doc_review_bp.route("/api/doc_review/ask_riskgpt", methods=["POST"])
 @_api_key_or_login_required
 def ask_riskgpt():
@@ -1345,6 +1382,7 @@ def ask_riskgpt():
     selected_block_ids = body.get("selected_block_ids", [])  # Empty for general chat
     user_prompt = body.get("user_prompt", "").strip()
     conversation_history = body.get("conversation_history", [])  # Last 5 messages
+    stream = bool(body.get("stream"))  # Stream chat/search answers as text/markdown
     
     if not file_id:
         return jsonify({"error": "file_id is required"}), 400
@@ -1372,8 +1410,6 @@ def ask_riskgpt():
             else:
                 return jsonify({"error": "Document has no markdown content and no blocks to convert"}), 400
         
-        block_metadata = document_state.get("structure", {}).get("block_metadata", [])
-        
         # Get template info
         template_name = document_state.get("template_name")
         template_content = None
@@ -1384,32 +1420,7 @@ def ask_riskgpt():
             except Exception:
                 template_content = None
         
-        # Get all suggestions
-        template_improvements = document_state.get("template_improvements", [])
-        accepted_suggestions = set(document_state.get("accepted_suggestions", []))
-        rejected_suggestions = set(document_state.get("rejected_suggestions", []))
-        
-        all_suggestions = []
-        for imp in template_improvements:
-            block_id = imp.get("block_id")
-            status = "pending"
-            if block_id in accepted_suggestions:
-                status = "accepted"
-            elif block_id in rejected_suggestions:
-                status = "rejected"
-            all_suggestions.append({
-                "block_id": block_id,
-                "status": status,
-                "reasoning": imp.get("reasoning", ""),
-                "changes_made": imp.get("changes_made", [])
-            })
-        
-        # Find selected blocks (empty for general chat)
-        selected_blocks = []
-        if selected_block_ids and block_metadata:
-            selected_blocks = [b for b in block_metadata if b["id"] in selected_block_ids]
-        
-        # Call RiskGPT Agent
+        # Call RiskGPT Agent (it derives selected blocks and suggestion statuses)
         from core.riskgpt_agent import RiskGPTAgent
         agent = RiskGPTAgent()
         result = agent.run(
@@ -1418,9 +1429,22 @@ def ask_riskgpt():
             selected_block_ids=selected_block_ids,
             conversation_history=conversation_history,
             document_state=document_state,
-            template_content=template_content
+            template_content=template_content,
+            doc_version=record.get("updated_at"),
+            stream=stream
         )
         
+        analysis_stream = result.get("analysis_stream")
+        if analysis_stream is not None:
+            return Response(
+                stream_with_context(_stream_riskgpt_answer(file_id, analysis_stream, result.get("metrics"))),
+                mimetype="text/markdown",
+                headers={
+                    "X-RiskGPT-Intent": result.get("intent") or "",
+                    "Cache-Control": "no-cache",
+                },
+            )
+        
         return jsonify({
             "file_id": file_id,
             "analysis": result.get("analysis", ""),
@@ -1551,7 +1575,9 @@ def apply_template(file_id: str):
         if not api_key:
             return jsonify({"error": "ANTHROPIC_API_KEY not configured"}), 503
         
-        processor = TemplateProcessor(api_key)
+        processor = TemplateProcessor(
+            api_key, max_concurrency=get_config().get('TEMPLATE_PAGE_CONCURRENCY', 1)
+        )
         
         # Update status
         _store.update_status(file_id, "running")
@@ -1907,12 +1933,16 @@ def add_comment(file_id):
         comment = _comments.add_comment(
             file_id, block_id, block_title, content, author, selection_text, start_offset, end_offset
         )
+        if comment is None:
+            return jsonify({"error": "Document not found"}), 404
         
         # Emit socket event for real-time updates
         if _socketio:
             room = f"doc_review:{file_id}"
             _socketio.emit("comment:added", comment, room=room)
         
+        # Comment changes must survive a restart once acknowledged
+        _store.flush(file_id)
         return jsonify(comment), 201
     except Exception as e:
         logger.error("Error adding comment: %s", e, exc_info=True)
@@ -1939,6 +1969,7 @@ def add_reply(file_id, comment_id):
             room = f"doc_review:{file_id}"
             _socketio.emit("comment:reply_added", comment, room=room)
         
+        _store.flush(file_id)
         return jsonify(comment), 200
     except Exception as e:
         logger.error("Error adding reply: %s", e, exc_info=True)
@@ -1958,6 +1989,7 @@ def resolve_comment(file_id, comment_id):
             room = f"doc_review:{file_id}"
             _socketio.emit("comment:resolved", comment, room=room)
         
+        _store.flush(file_id)
         return jsonify(comment), 200
     except Exception as e:
         logger.error("Error resolving comment: %s", e, exc_info=True)
@@ -1977,6 +2009,7 @@ def delete_comment(file_id, comment_id):
             room = f"doc_review:{file_id}"
             _socketio.emit("comment:deleted", {"comment_id": comment_id}, room=room)
         
+        _store.flush(file_id)
         return jsonify({"success": True}), 200
     except Exception as e:
         logger.error("Error deleting comment: %s", e, exc_info=True)
@@ -2002,6 +2035,7 @@ def update_comment(file_id, comment_id):
             room = f"doc_review:{file_id}"
             _socketio.emit("comment:updated", comment, room=room)
         
+        _store.flush(file_id)
         return jsonify(comment), 200
     except Exception as e:
         logger.error("Error updating comment: %s", e, exc_info=True)
@@ -2086,6 +2120,19 @@ def add_ai_suggestion(file_id):
         return '', 200
     try:
         data = request.get_json() or {}
+
+        # Bulk form: {"suggestions": [{block_id, selection_text, improved_text, ...}, ...]}
+        items = data.get("suggestions")
+        if isinstance(items, list):
+            for item in items:
+                if not isinstance(item, dict) or not item.get("block_id") or not item.get("selection_text") or not item.get("improved_text"):
+                    return jsonify({"error": "each suggestion needs block_id, selection_text, and improved_text"}), 400
+            suggestions = _ai_suggestions.add_suggestions_bulk(file_id, items)
+            if suggestions is None:
+                return jsonify({"error": "Document not found"}), 404
+            _store.flush(file_id)
+            return jsonify({"suggestions": suggestions}), 201
+
         block_id = data.get("block_id")
         selection_text = data.get("selection_text", "")
         improved_text = data.get("improved_text", "")
@@ -2099,7 +2146,10 @@ def add_ai_suggestion(file_id):
         suggestion = _ai_suggestions.add_suggestion(
             file_id, block_id, selection_text, improved_text, status, start_offset, end_offset
         )
+        if suggestion is None:
+            return jsonify({"error": "Document not found"}), 404
         
+        _store.flush(file_id)
         return jsonify(suggestion), 201
     except Exception as e:
         logger.error("Error adding AI suggestion: %s", e, exc_info=True)
@@ -2122,6 +2172,8 @@ def update_ai_suggestion_status(file_id, suggestion_id):
         if not suggestion:
             return jsonify({"error": "Suggestion not found"}), 404
         
+        # Accept/reject decisions must survive a restart once acknowledged
+        _store.flush(file_id)
         return jsonify(suggestion), 200
     except Exception as e:
         logger.error("Error updating AI suggestion: %s", e, exc_info=True)
@@ -2138,6 +2190,7 @@ def delete_ai_suggestion(file_id, suggestion_id):
         if not success:
             return jsonify({"error": "Suggestion not found"}), 404
         
+        _store.flush(file_id)
         return jsonify({"success": True}), 200
     except Exception as e:
         logger.error("Error deleting AI suggestion: %s", e, exc_info=True)
@@ -2179,7 +2232,10 @@ def add_chat_message(file_id):
         message = _chat_history.add_message(
             file_id, role, content, context
         )
+        if message is None:
+            return jsonify({"error": "Document not found"}), 404
         
+        _store.flush(file_id)
         return jsonify(message), 201
     except Exception as e:
         logger.error("Error adding chat message: %s", e, exc_info=True)
@@ -2193,6 +2249,7 @@ def clear_chat_messages(file_id):
         return '', 200
     try:
         success = _chat_history.clear_messages(file_id)
+        _store.flush(file_id)
         return jsonify({"success": success}), 200
     except Exception as e:
         logger.error("Error clearing chat messages: %s", e, exc_info=True)
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import copy
+import hashlib
 import json
 import logging
 import os
+import re
+import sys
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 import time
-from typing import Any, Callable, Dict, List, Optional, Set
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from uuid import uuid4
 
+from tools import json_utils
 from tools.llm_client import get_llm_client, is_llm_available
 from core.models import (
     AgentState,
@@ -24,6 +33,10 @@ from core.models import (
 )
 
 
+_JSON_FENCE_RE = re.compile(r"\s*```[A-Za-z]*[ \t]*\n?")
+_JSON_DECODER = json.JSONDecoder()
+
+
 class LLMNotAvailableError(RuntimeError):
     """LLM not available error."""
     pass
@@ -34,16 +47,12 @@ def call_llm_json(system_prompt: str, payload: dict) -> list:
     if not is_llm_available():
         raise LLMNotAvailableError("LLM not configured")
     client = get_llm_client()
-    import json
-    user_prompt = json.dumps(payload, ensure_ascii=False, indent=2)
-    response = client.invoke_with_prompt(system_prompt, user_prompt, response_format="json")
+    user_prompt = _serialize_payload(payload)
+    response = client.invoke_with_prompt(
+        system_prompt, user_prompt, response_format="json", cache_prompt=True
+    )
     try:
-        cleaned_response = response.strip()
-        if cleaned_response.startswith("```"):
-            lines = cleaned_response.split("\n")
-            if len(lines) > 2:
-                cleaned_response = "\n".join(lines[1:-1])
-        parsed = json.loads(cleaned_response)
+        parsed = _parse_llm_json(response)
     except json.JSONDecodeError:
         return []
     if isinstance(parsed, list):
@@ -53,19 +62,83 @@ def call_llm_json(system_prompt: str, payload: dict) -> list:
     return [parsed]
 
 
+def _parse_llm_json(response: str) -> Any:
+    """
+    Decode a JSON response in place. An optional ```json fence is skipped by
+    offset and raw_decode stops at the end of the value, so the closing fence
+    never needs to be sliced off.
+    """
+    fence = _JSON_FENCE_RE.match(response)
+    start = fence.end() if fence else 0
+    end = len(response)
+    while start < end and response[start].isspace():
+        start += 1
+    parsed, _ = _JSON_DECODER.raw_decode(response, start)
+    return parsed
+
+
+def _extract_tagged_section(text: str, tag: str) -> Optional[str]:
+    """Return the stripped body of <tag>...</tag> in text, or None if absent/empty."""
+    start_tag = f"<{tag}>"
+    start = text.find(start_tag)
+    if start == -1:
+        return None
+    start += len(start_tag)
+    end = text.find(f"</{tag}>", start)
+    body = text[start:end if end != -1 else len(text)].strip()
+    return body or None
+
+
 def call_llm_markdown(system_prompt: str, payload: dict) -> str:
     """Call LLM with payload and return raw markdown response."""
     if not is_llm_available():
         raise LLMNotAvailableError("LLM not configured")
     client = get_llm_client()
-    import json
-    user_prompt = json.dumps(payload, ensure_ascii=False, indent=2)
-    response = client.invoke_with_prompt(system_prompt, user_prompt)
+    user_prompt = _serialize_payload(payload)
+    response = client.invoke_with_prompt(system_prompt, user_prompt, cache_prompt=True)
     return response.strip()
 
+
+def _serialize_payload(payload: dict) -> str:
+    """
+    Canonical, byte-stable JSON for LLM payloads. Sorted keys and compact
+    separators keep repeat calls on the same document identical so they can hit
+    the provider prompt cache.
+    """
+    return json_utils.dumps(payload, sort_keys=True)
+
 LOGGER = logging.getLogger(__name__)
 DEFAULT_AGENT_CONFIG_PATH = Path("config/agent/doc_review_agent.json")
 TEMPLATE_DIR = Path("config/doc_review/outline_templates")
+LLM_CACHE_DIR = Path("data/llm_cache")
+PROMPT_DIRS = (
+    Path("config/prompts"),
+    # Fallback to old location (for compatibility)
+    Path("external/products/doc_review/prompts"),
+)
+
+# Prompt text shared by every agent instance: name -> (path, mtime_ns, content)
+_PROMPT_CACHE: Dict[str, Tuple[Path, int, str]] = {}
+
+# Parsed config/template files shared by agent instances: path -> (mtime_ns, value)
+_CONFIG_CACHE: Dict[Path, Tuple[int, Dict[str, Any]]] = {}
+# path -> (mtime_ns, meta, sections, lowercased title -> section)
+_TEMPLATE_CACHE: Dict[Path, Tuple[int, TemplateMeta, List[Dict[str, Any]], Dict[str, Dict[str, Any]]]] = {}
+# Legacy serialized template_text -> (sections, title index)
+LEGACY_TEMPLATE_CACHE_MAX_ENTRIES = 8
+_LEGACY_TEMPLATE_CACHE: "OrderedDict[str, Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]]" = OrderedDict()
+
+# Runs whose derived suggested-change views are kept per agent instance
+CHANGES_INDEX_CACHE_MAX_RUNS = 32
+
+# Exact-match LLM response cache keyed by sha256(prompt, system prompt, payload)
+RESPONSE_CACHE_MAX_ENTRIES = 256
+_RESPONSE_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+# On-disk responses (LLM_CACHE_DIR/<doc_id>/) older than this are ignored and
+# removed; each document keeps at most LLM_DISK_CACHE_MAX_FILES, newest first
+LLM_DISK_CACHE_MAX_AGE_S = 7 * 24 * 3600
+LLM_DISK_CACHE_MAX_FILES = 512
 
 NODE_LABELS: Dict[str, str] = {
     "phase0_ingestion": "Phase 0 – Ingestion",
@@ -88,6 +161,19 @@ NODE_TRANSITIONS: Dict[str, str] = {
     "phase2_synthesis": "completed",
 }
 
+# Markdown prompts return raw strings, not JSON
+MARKDOWN_PROMPTS = frozenset(
+    {
+        "phase1_toc_review.md",
+        "phase2_check_conceptual_coverage.md",
+        "phase2_check_compliance_governance.md",
+        "phase2_check_language_clarity.md",
+        "phase2_check_structural_presentation.md",
+        "phase2_check_combined.md",
+        "phase2_synthesis_summary.md",
+    }
+)
+
 ORCHESTRATOR_WAIT_STATES: Set[str] = {
     "completed",
     "failed",
@@ -98,6 +184,33 @@ def _utcnow_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
+TRANSCRIPT_PREVIEW_KEYS = 5
+TRANSCRIPT_PREVIEW_CHARS = 200
+
+
+def _preview_value(value: Any) -> Any:
+    """Small, self-contained stand-in for a payload/result value in the transcript."""
+    if isinstance(value, str):
+        if len(value) > TRANSCRIPT_PREVIEW_CHARS:
+            return value[:TRANSCRIPT_PREVIEW_CHARS] + "..."
+        return value
+    if isinstance(value, (list, tuple)):
+        return f"[{len(value)} items]"
+    if isinstance(value, dict):
+        return f"{{{len(value)} keys}}"
+    return value
+
+
+def _preview_mapping(mapping: Any) -> Any:
+    """First few keys of ``mapping`` with truncated values, for agent_transcript."""
+    if not isinstance(mapping, dict):
+        return _preview_value(mapping)
+    return {
+        key: _preview_value(mapping[key])
+        for key in islice(mapping, TRANSCRIPT_PREVIEW_KEYS)
+    }
+
+
 class DocReviewAgent:
     """
     Orchestrates deterministic ingestion (Phase 0) and Phase 1 scaffolding for the
@@ -109,9 +222,10 @@ class DocReviewAgent:
         self.agent_config_path = agent_config_path or DEFAULT_AGENT_CONFIG_PATH
         self.config = self._load_config(self.agent_config_path)
         self.logger = LOGGER
-        self._prompt_cache: Dict[str, str] = {}
         self.node_registry = self._build_node_registry()
         self.state_lock_owner: Optional[str] = None
+        self._run_lock_guard = threading.Lock()
+        self._changes_index_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.event_emitter: Optional[Callable[[str, Dict[str, Any]], None]] = None
         self.agent_log_root = Path("logs")
         self.tools_registry = tools_registry
@@ -128,18 +242,19 @@ class DocReviewAgent:
         self.event_emitter = emitter
 
     def _acquire_run_lock(self, state: AgentState, session_id: str) -> None:
-        owner = state.get("locked_by")
-        if owner and owner != session_id:
-            raise RuntimeError(f"Run locked by {owner}")
-        if owner == session_id:
-            return
-        state["locked_by"] = session_id
-        state["lock_timestamp"] = _utcnow_iso()
+        # Initialised states carry locked_by=None, so claim on a falsy owner rather
+        # than relying on setdefault; the guard keeps check-and-set atomic.
+        with self._run_lock_guard:
+            owner = state.get("locked_by") or session_id
+            if owner != session_id:
+                raise RuntimeError(f"Run locked by {owner}")
+            state["locked_by"] = session_id
+            state["lock_timestamp"] = _utcnow_iso()
 
     def _release_run_lock(self, state: AgentState, session_id: str) -> None:
-        if state.get("locked_by") == session_id:
-            state["locked_by"] = None
-            state["lock_timestamp"] = None
+        with self._run_lock_guard:
+            if state.get("locked_by") == session_id:
+                state["locked_by"] = state["lock_timestamp"] = None
 
     def _append_agent_transcript_log(self, state: AgentState, entry: Dict[str, Any]) -> None:
         log_dir = self.agent_log_root / state["run_id"]
@@ -147,7 +262,7 @@ class DocReviewAgent:
         log_path = log_dir / "agent_transcript.jsonl"
         entry_with_ts = {"timestamp": _utcnow_iso(), **entry}
         with log_path.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(entry_with_ts, ensure_ascii=False) + "\n")
+            fh.write(json_utils.dumps(entry_with_ts) + "\n")
 
     def _sync_vfs_artifacts(self, state: AgentState, entries: List[Dict[str, str]]) -> None:
         timestamp = _utcnow_iso()
@@ -173,10 +288,11 @@ class DocReviewAgent:
         func: Callable[[AgentState], AgentState],
         state: AgentState,
     ) -> AgentState:
+        emit = self._emit_event
         node_kind = NODE_KINDS.get(node_id, "orchestrator")
         label = NODE_LABELS.get(node_id, node_id)
         start_ts = time.time()
-        self._emit_event(
+        emit(
             state,
             "node_started",
             {
@@ -195,13 +311,15 @@ class DocReviewAgent:
         except Exception as exc:  # pragma: no cover - safety
             status = "failed"
             error_msg = str(exc)
-            state["errors"].append(f"{node_id} failed: {exc}")
-            self.logger.exception("Node %s failed", node_id)
+            state["errors"].append(f"{node_id} failed: {error_msg}")
+            # The exception is re-raised and the caller logs the traceback; only
+            # record which node failed here instead of formatting it twice.
+            self.logger.error("Node %s failed: %s", node_id, error_msg)
             raise
         finally:
             duration_ms = int((time.time() - start_ts) * 1000)
             summary = self._summarize_node_result(node_id, state if status == "failed" else new_state)
-            self._emit_event(
+            emit(
                 state,
                 "node_completed",
                 {
@@ -237,19 +355,22 @@ class DocReviewAgent:
         stop_controls: Optional[Set[str]] = None,
     ) -> AgentState:
         stop_controls = stop_controls or ORCHESTRATOR_WAIT_STATES
+        registry_get = self.node_registry.get
+        run_node = self._run_node
+        advance_control = self._advance_control
 
         while True:
             control = state.get("control")
             if not control or control in stop_controls:
                 break
 
-            node_callable = self.node_registry.get(control)
+            node_callable = registry_get(control)
             if not node_callable:
                 self.logger.warning("No node registered for control '%s'", control)
                 break
 
-            state = self._run_node(control, node_callable, state)
-            state = self._advance_control(control, state)
+            state = run_node(control, node_callable, state)
+            state = advance_control(control, state)
 
         return state
 
@@ -257,11 +378,7 @@ class DocReviewAgent:
         if state.get("control") != current_control:
             # Node already mutated control (e.g., failure/waiting state)
             return state
-        next_control = NODE_TRANSITIONS.get(current_control)
-        if next_control:
-            state["control"] = next_control
-        else:
-            state["control"] = "completed"
+        state["control"] = NODE_TRANSITIONS.get(current_control) or "completed"
         return state
 
     # ------------------------------------------------------------------ #
@@ -290,22 +407,24 @@ class DocReviewAgent:
             state["block_metadata"] = state.get("structure", {}).get("block_metadata", [])
             state["verification_suggestions"] = state.get("structure", {}).get("verification_suggestions", [])
 
-            # Ensure VFS exists and write a file the UI can fetch
+            # Ensure VFS exists and publish files the UI can fetch. Entries reference
+            # the top-level state keys instead of holding copies, so the markdown and
+            # block metadata are stored (and persisted) once.
             vfs = state.setdefault("vfs", {})
             files = vfs.setdefault("files", {})
             files["/raw.md"] = {
                 "type": "file",
-                "content": raw_md,
+                "ref": "raw_markdown",
                 "mime": "text/markdown",
             }
             files["/blocks.json"] = {
                 "type": "file",
-                "content": json.dumps(state["block_metadata"], indent=2),
+                "ref": "block_metadata",
                 "mime": "application/json",
             }
             files["/suggestions.json"] = {
                 "type": "file",
-                "content": json.dumps(state["verification_suggestions"], indent=2),
+                "ref": "verification_suggestions",
                 "mime": "application/json",
             }
 
@@ -430,6 +549,7 @@ class DocReviewAgent:
         state["changes"]["new_raw_text"] = result.get("new_raw_markdown")
 
         if state["changes"]["applied_change_ids"]:
+            state["changes"]["revision"] = state["changes"].get("revision", 0) + 1
             state["structure"]["raw_text"] = result["new_raw_markdown"]
             state["doc_meta"]["version"] = state["doc_meta"].get("version", 1) + 1
             state["phase3_status"] = "success"
@@ -579,11 +699,14 @@ class DocReviewAgent:
         state["structure"]["ingestion_stats"] = result.get("ingestion_stats")
         
         # DEBUG: Log block IDs from ingestion
-        if block_metadata:
+        if block_metadata and LOGGER.isEnabledFor(logging.DEBUG):
             block_ids = [b.get("id", "") for b in block_metadata[:10]]
-            LOGGER.info(f"[INGESTION] Block IDs from convert_to_markdown (first 10): {block_ids}")
-            LOGGER.info(f"[INGESTION] Total blocks: {len(block_metadata)}")
-            LOGGER.info(f"[INGESTION] Block ID format check: {[type(b.get('id', '')).__name__ for b in block_metadata[:5]]}")
+            LOGGER.debug("[INGESTION] Block IDs from convert_to_markdown (first 10): %s", block_ids)
+            LOGGER.debug("[INGESTION] Total blocks: %d", len(block_metadata))
+            LOGGER.debug(
+                "[INGESTION] Block ID format check: %s",
+                [type(b.get("id", "")).__name__ for b in block_metadata[:5]],
+            )
         self._register_vfs_artifact(
             state,
             VfsArtifact(
@@ -758,7 +881,8 @@ class DocReviewAgent:
         if "phase2_data" not in state:
             state["phase2_data"] = {}
         
-        # Run 4 checks
+        # Run 4 checks. They share common_payload and are independent, so issue the
+        # (blocking) LLM calls concurrently and write results back in order.
         checks = [
             ("phase2_check_conceptual_coverage.md", "conceptual_coverage"),
             ("phase2_check_compliance_governance.md", "compliance_governance"),
@@ -766,8 +890,14 @@ class DocReviewAgent:
             ("phase2_check_structural_presentation.md", "structural_presentation"),
         ]
         
-        for prompt_file, key in checks:
-            result = self._invoke_llm_prompt(state, prompt_file, common_payload)
+        if self.config.get("phase2", {}).get("combined_checks"):
+            results = self._run_combined_holistic_checks(state, checks, common_payload)
+        else:
+            results = self._invoke_llm_prompts(
+                state, [(prompt_file, common_payload) for prompt_file, _ in checks]
+            )
+
+        for (prompt_file, key), result in zip(checks, results):
             if result:
                 state["phase2_data"][key] = result
                 self._emit_event(
@@ -784,6 +914,35 @@ class DocReviewAgent:
         
         return state
 
+    def _run_combined_holistic_checks(
+        self,
+        state: AgentState,
+        checks: List[Tuple[str, str]],
+        payload: Dict[str, Any],
+    ) -> List[Optional[str]]:
+        """
+        Run all holistic checks as one LLM call (phase2.combined_checks). The
+        system prompt is the combined header followed by each check's own prompt,
+        and the tagged sections of the response are split back out per check.
+        """
+        try:
+            parts = [self._load_prompt_template("phase2_check_combined.md")]
+            for prompt_file, key in checks:
+                parts.append(
+                    f"<{key}_instructions>\n{self._load_prompt_template(prompt_file)}\n</{key}_instructions>"
+                )
+        except FileNotFoundError as exc:
+            state["errors"].append(str(exc))
+            self.logger.error(str(exc))
+            return [None] * len(checks)
+
+        response = self._invoke_llm_prompt(
+            state, "phase2_check_combined.md", payload, system_prompt="\n\n".join(parts)
+        )
+        if not response:
+            return [None] * len(checks)
+        return [_extract_tagged_section(response, key) for _, key in checks]
+
     def _node_phase2_synthesis(self, state: AgentState) -> AgentState:
         """
         Phase 2: Generate synthesis summary from all 4 checks.
@@ -861,25 +1020,16 @@ class DocReviewAgent:
             self.logger.warning("No suggested changes available for selection intent")
             return None
 
-        pending_changes = [change for change in suggested_changes if change.get("status") != "applied"]
-        change_catalog = [
-            {
-                "id": change.get("id"),
-                "index": change.get("index"),
-                "section_title": change.get("section_title"),
-                "severity": change.get("severity"),
-                "type": change.get("type"),
-                "status": change.get("status", "pending"),
-            }
-            for change in suggested_changes
-        ]
+        index = self._get_changes_index(state)
+        change_catalog = index["change_catalog"]
+        valid_ids = index["valid_ids"]
 
         payload = {
             "doc_title": state["doc_meta"]["doc_title"],
             "user_instruction": user_instruction,
             "total_changes": len(suggested_changes),
-            "pending_changes": len(pending_changes),
-            "high_severity_changes": len([c for c in suggested_changes if c.get("severity") == "high"]),
+            "pending_changes": index["pending_count"],
+            "high_severity_changes": index["high_severity_count"],
             "change_catalog": change_catalog,
         }
         result = self._invoke_llm_prompt(state, "change_selection_intent.md", payload)
@@ -888,10 +1038,9 @@ class DocReviewAgent:
 
         apply_mode = result.get("apply_mode") or "by_ids"
         requested_ids = result.get("change_ids_to_apply") or []
-        valid_ids = {change.get("id") for change in suggested_changes if change.get("id")}
 
         if apply_mode == "all":
-            filtered_ids = [cid for cid in valid_ids]
+            filtered_ids = list(valid_ids)
         else:
             filtered_ids = [cid for cid in requested_ids if cid in valid_ids]
             if requested_ids and not filtered_ids:
@@ -915,6 +1064,67 @@ class DocReviewAgent:
         )
         return plan
 
+    def _get_changes_index(self, state: AgentState) -> Dict[str, Any]:
+        """
+        Derived views of suggested_changes (catalog, valid IDs, changes grouped by
+        severity, counts), built in a single pass and reused until the change list
+        is replaced or its revision is bumped. Kept on the agent rather than in
+        state so it is never persisted.
+        """
+        changes = state["changes"]
+        suggested_changes = changes.get("suggested_changes", [])
+        revision = changes.get("revision", 0)
+        key = state["run_id"]
+
+        cached = self._changes_index_cache.get(key)
+        if (
+            cached is not None
+            and cached["source"] is suggested_changes
+            and cached["revision"] == revision
+            and cached["length"] == len(suggested_changes)
+        ):
+            return cached
+
+        change_catalog = []
+        valid_ids: Set[str] = set()
+        by_severity: Dict[Any, List[Dict[str, Any]]] = {}
+        pending_count = 0
+        for change in suggested_changes:
+            change_id = change.get("id")
+            status = change.get("status", "pending")
+            severity = change.get("severity")
+            change_catalog.append(
+                {
+                    "id": change_id,
+                    "index": change.get("index"),
+                    "section_title": change.get("section_title"),
+                    "severity": severity,
+                    "type": change.get("type"),
+                    "status": status,
+                }
+            )
+            if change_id:
+                valid_ids.add(change_id)
+            if status != "applied":
+                pending_count += 1
+            by_severity.setdefault(severity, []).append(change)
+
+        index = {
+            "source": suggested_changes,
+            "revision": revision,
+            "length": len(suggested_changes),
+            "change_catalog": change_catalog,
+            "valid_ids": valid_ids,
+            "by_severity": by_severity,
+            "pending_count": pending_count,
+            "high_severity_count": len(by_severity.get("high", ())),
+        }
+        self._changes_index_cache[key] = index
+        self._changes_index_cache.move_to_end(key)
+        while len(self._changes_index_cache) > CHANGES_INDEX_CACHE_MAX_RUNS:
+            self._changes_index_cache.popitem(last=False)
+        return index
+
     def _node_apply_changes_verifier_llm(
         self,
         state: AgentState,
@@ -949,7 +1159,10 @@ class DocReviewAgent:
             "updated_excerpt": self._get_markdown_excerpt_from_text(updated_text, max_chars=6000),
         }
 
-        result = self._invoke_llm_prompt(state, "phase3_apply_verifier.md", payload)
+        # Verification must reflect the document as it is now, never a cached verdict
+        result = self._invoke_llm_prompt(
+            state, "phase3_apply_verifier.md", payload, force_refresh=True
+        )
         if not result:
             return None
 
@@ -1035,42 +1248,43 @@ class DocReviewAgent:
             Execution results with status, outputs, and any errors
         """
         plan_steps = plan.get("plan_steps", [])
-        results = []
-        execution_errors = []
-
-        for step in plan_steps:
-            tool = step.get("tool")
-            parameters = step.get("parameters", {})
-            reasoning = step.get("reasoning", "")
-
-            self.logger.info("Executing plan step: %s (reason: %s)", tool, reasoning)
-
-            try:
-                result = self._execute_tool(state, tool, parameters)
-                results.append({
-                    "tool": tool,
-                    "status": "success",
-                    "result": result,
-                    "reasoning": reasoning,
-                })
-            except Exception as exc:
-                error_msg = f"Tool {tool} failed: {exc}"
-                self.logger.error(error_msg)
-                execution_errors.append(error_msg)
-                results.append({
-                    "tool": tool,
-                    "status": "failed",
-                    "error": str(exc),
-                    "reasoning": reasoning,
-                })
+        outcomes = [self._execute_plan_step(state, step) for step in plan_steps]
 
         return {
             "plan_summary": plan.get("summary", ""),
             "requires_confirmation": plan.get("requires_confirmation", False),
-            "executed_steps": results,
-            "errors": execution_errors,
+            "executed_steps": [result for result, _ in outcomes],
+            "errors": [error for _, error in outcomes if error],
         }
 
+    def _execute_plan_step(
+        self, state: AgentState, step: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Run one plan step; returns (step result, error message or None)."""
+        tool = step.get("tool")
+        parameters = step.get("parameters", {})
+        reasoning = step.get("reasoning", "")
+
+        self.logger.info("Executing plan step: %s (reason: %s)", tool, reasoning)
+
+        try:
+            result = self._execute_tool(state, tool, parameters)
+            return {
+                "tool": tool,
+                "status": "success",
+                "result": result,
+                "reasoning": reasoning,
+            }, None
+        except Exception as exc:
+            error_msg = f"Tool {tool} failed: {exc}"
+            self.logger.error(error_msg)
+            return {
+                "tool": tool,
+                "status": "failed",
+                "error": str(exc),
+                "reasoning": reasoning,
+            }, error_msg
+
     def _execute_tool(
         self, state: AgentState, tool_name: str, parameters: Dict[str, Any]
     ) -> Any:
@@ -1155,10 +1369,9 @@ class DocReviewAgent:
         self, state: AgentState, severity_filter: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Return all suggested changes, optionally filtered by severity."""
-        changes = state["changes"].get("suggested_changes", [])
         if severity_filter:
-            changes = [c for c in changes if c.get("severity") == severity_filter]
-        return changes
+            return list(self._get_changes_index(state)["by_severity"].get(severity_filter, ()))
+        return state["changes"].get("suggested_changes", [])
 
     def _download_artifact(self, state: AgentState, artifact_type: str) -> Dict[str, Any]:
         """Prepare artifact for download."""
@@ -1171,13 +1384,13 @@ class DocReviewAgent:
         elif artifact_type == "phase1_report":
             return {
                 "artifact_type": "phase1_report",
-                "content": json.dumps(state["phase1"], indent=2),
+                "content": json_utils.dumps(state["phase1"], indent=True),
                 "filename": f"{state['doc_id']}_phase1_report.json",
             }
         elif artifact_type == "phase2_reviews":
             return {
                 "artifact_type": "phase2_reviews",
-                "content": json.dumps(state["phase2"]["reviews"], indent=2),
+                "content": json_utils.dumps(state["phase2"]["reviews"], indent=True),
                 "filename": f"{state['doc_id']}_phase2_reviews.json",
             }
         else:
@@ -1194,6 +1407,7 @@ class DocReviewAgent:
 
         # Filter applicable changes (exclude missing_content without original_text)
         applicable = []
+        applicable_index: Dict[str, int] = {}  # change id -> position in applicable
         skipped = []
 
         for change in suggestions:
@@ -1208,17 +1422,25 @@ class DocReviewAgent:
                 })
                 continue
 
+            change_id = change.get("id")
+            if change_id:
+                applicable_index.setdefault(change_id, len(applicable))
             applicable.append(change)
 
         # Store skipped changes for user review
         state["changes"]["skipped_changes"] = skipped
 
-        selected = list(applicable)
+        def _pick(ids: List[str]) -> List[Dict[str, Any]]:
+            # O(K) lookups, returned in document order
+            positions = sorted({applicable_index[cid] for cid in ids if cid in applicable_index})
+            return [applicable[pos] for pos in positions]
+
+        # applicable is local to this call, so hand it back without copying
+        selected = applicable
 
         # Apply explicit filters first
         if change_ids:
-            selected = [change for change in applicable if change.get("id") in change_ids]
-            return selected
+            return _pick(change_ids)
         if severity_filter:
             severity = severity_filter.lower()
             selected = [change for change in applicable if change.get("severity") == severity]
@@ -1228,11 +1450,10 @@ class DocReviewAgent:
             apply_mode = plan.get("apply_mode")
             plan_ids = plan.get("change_ids_to_apply", [])
             if apply_mode == "all":
-                selected = list(applicable)
+                selected = applicable
             elif plan_ids:
-                selected_ids = set(plan_ids)
-                selected = [change for change in applicable if change.get("id") in selected_ids]
-                missing_ids = [cid for cid in plan_ids if cid not in selected_ids]
+                selected = _pick(plan_ids)
+                missing_ids = [cid for cid in plan_ids if cid not in applicable_index]
                 if missing_ids:
                     self.logger.warning(
                         "Change selection plan referenced unavailable IDs: %s", missing_ids
@@ -1257,8 +1478,9 @@ class DocReviewAgent:
         run_id: Optional[str],
         template_id: Optional[str],
     ) -> AgentState:
-        doc_id = source.stem
-        run_identifier = run_id or f"docrev-{uuid4().hex}"
+        # Interned: these ids key events, logs and lookups for the whole run
+        doc_id = sys.intern(source.stem)
+        run_identifier = sys.intern(run_id or f"docrev-{uuid4().hex}")
         template_meta = self._load_template_definition(template_id)
 
         doc_meta: DocMeta = {
@@ -1301,6 +1523,7 @@ class DocReviewAgent:
             "change_selection_plan": None,
             "skipped_changes": [],
             "new_raw_text": None,
+            "revision": 0,
         }
         user_interaction: UserInteractionState = {
             "user_selected_section_strategy": False,
@@ -1328,32 +1551,64 @@ class DocReviewAgent:
             "user_interaction": user_interaction,
             "file_metadata": None,
             "vfs_artifacts": [],
+            "vfs_artifact_index": {},
             "logs": [],
             "agent_transcript": [],
         }
         return state
 
     def _load_config(self, config_path: Path) -> Dict[str, Any]:
-        if not config_path.exists():
-            raise FileNotFoundError(f"Doc review agent config not found: {config_path}")
-        with config_path.open("r", encoding="utf-8") as fh:
-            return json.load(fh)
+        try:
+            mtime_ns = config_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Doc review agent config not found: {config_path}") from None
+        cached = _CONFIG_CACHE.get(config_path)
+        if cached is not None and cached[0] == mtime_ns:
+            # Shared between instances; the agent treats its config as read-only.
+            return cached[1]
+        config = json_utils.loads(config_path.read_bytes())
+        _CONFIG_CACHE[config_path] = (mtime_ns, config)
+        return config
 
     def _load_template_definition(self, template_id: Optional[str]) -> TemplateMeta:
-        template_key = template_id or self.config.get("template", {}).get("template_id") or "policy_template"
-        template_path = TEMPLATE_DIR / f"{template_key}.json"
-        if not template_path.exists():
-            raise FileNotFoundError(f"Template definition not found: {template_path}")
-        with template_path.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-        categories = [section.get("title", "") for section in data.get("sections", []) if section.get("title")]
+        template_key = sys.intern(
+            template_id or self.config.get("template", {}).get("template_id") or "policy_template"
+        )
+        meta, _, _ = self._read_template(template_key)
+        # Each state gets its own dict. template_text is not stored: sections are
+        # resolved lazily from the template cache by template_id.
         return TemplateMeta(
+            meta,
+            template_categories=list(meta["template_categories"]),
+            max_section_words=self.config.get("template", {}).get("max_section_words", 500),
+        )
+
+    @staticmethod
+    def _read_template(
+        template_key: str,
+    ) -> Tuple[TemplateMeta, List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Parse a template definition once per file version: (meta, sections, title index)."""
+        template_path = TEMPLATE_DIR / f"{template_key}.json"
+        try:
+            mtime_ns = template_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template definition not found: {template_path}") from None
+
+        cached = _TEMPLATE_CACHE.get(template_path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1], cached[2], cached[3]
+
+        data = json_utils.loads(template_path.read_bytes())
+        sections = data.get("sections", [])
+        categories = [section.get("title", "") for section in sections if section.get("title")]
+        meta = TemplateMeta(
             template_id=template_key,
             template_label=data.get("title"),
-            template_text=json.dumps(data, ensure_ascii=False),
             template_categories=categories,
-            max_section_words=self.config.get("template", {}).get("max_section_words", 500),
         )
+        title_index = DocReviewAgent._build_title_index(sections)
+        _TEMPLATE_CACHE[template_path] = (mtime_ns, meta, sections, title_index)
+        return meta, sections, title_index
 
     def _call_tool(self, tool_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Call a tool directly (replaces MCP tool calls)."""
@@ -1475,10 +1730,20 @@ class DocReviewAgent:
         return levels
 
     def _register_vfs_artifact(self, state: AgentState, artifact: VfsArtifact) -> None:
-        existing_paths = {entry["path"] for entry in state["vfs_artifacts"]}
-        if artifact["path"] in existing_paths:
+        """
+        Append an artifact unless its path is already registered. Artifacts must be
+        added through this method so vfs_artifact_index stays in step; an index
+        that is missing or out of step (older states) is rebuilt.
+        """
+        artifacts = state["vfs_artifacts"]
+        index = state.get("vfs_artifact_index")
+        if index is None or len(index) != len(artifacts):
+            index = {entry["path"]: pos for pos, entry in enumerate(artifacts)}
+            state["vfs_artifact_index"] = index
+        if artifact["path"] in index:
             return
-        state["vfs_artifacts"].append(artifact)
+        index[artifact["path"]] = len(artifacts)
+        artifacts.append(artifact)
 
     def _emit_event(self, state: AgentState, event_type: str, payload: Optional[Dict[str, Any]] = None) -> None:
         """
@@ -1501,15 +1766,7 @@ class DocReviewAgent:
 
     def _get_markdown_excerpt(self, state: AgentState, max_chars: int = 10000) -> str:
         raw = state["structure"].get("raw_text", "") or ""
-        if not raw:
-            return ""
-        if len(raw) <= max_chars:
-            return raw
-        snippet = raw[:max_chars]
-        cutoff = snippet.rfind("\n")
-        if cutoff > max_chars * 0.7:
-            snippet = snippet[:cutoff]
-        return snippet.strip() + "\n\n..."
+        return self._get_markdown_excerpt_from_text(raw, max_chars=max_chars)
 
     @staticmethod
     def _get_markdown_excerpt_from_text(text: str, max_chars: int = 10000) -> str:
@@ -1517,10 +1774,10 @@ class DocReviewAgent:
             return ""
         if len(text) <= max_chars:
             return text
-        snippet = text[:max_chars]
-        cutoff = snippet.rfind("\n")
-        if cutoff > max_chars * 0.7:
-            snippet = snippet[:cutoff]
+        # Look for a line break only in the tail window (past 70% of the budget)
+        # so the text is sliced once instead of slice + rfind + re-slice.
+        cutoff = text.rfind("\n", int(max_chars * 0.7) + 1, max_chars)
+        snippet = text[:cutoff] if cutoff != -1 else text[:max_chars]
         return snippet.strip() + "\n\n..."
 
     def _get_phase1_excerpt(self, state: AgentState, preferred_pages: int = 5) -> str:
@@ -1539,70 +1796,133 @@ class DocReviewAgent:
         return " ".join(excerpt_words)
 
     def _load_prompt_template(self, prompt_name: str) -> str:
-        if prompt_name in self._prompt_cache:
-            return self._prompt_cache[prompt_name]
-        
-        # Try new location first (standalone version)
-        prompt_path = Path("config/prompts") / prompt_name
-        if not prompt_path.exists():
-            # Fallback to old location (for compatibility)
-            prompt_path = Path("external/products/doc_review/prompts") / prompt_name
-        
-        if not prompt_path.exists():
-            raise FileNotFoundError(f"Prompt template not found: {prompt_name}")
-        
-        content = prompt_path.read_text(encoding="utf-8").strip()
-        self._prompt_cache[prompt_name] = content
-        return content
+        cached = _PROMPT_CACHE.get(prompt_name)
+        if cached is not None:
+            cached_path, cached_mtime, content = cached
+            try:
+                if cached_path.stat().st_mtime_ns == cached_mtime:
+                    return content
+            except OSError:
+                pass
+
+        for prompt_dir in PROMPT_DIRS:
+            prompt_path = prompt_dir / prompt_name
+            try:
+                mtime_ns = prompt_path.stat().st_mtime_ns
+            except OSError:
+                continue
+            content = prompt_path.read_text(encoding="utf-8").strip()
+            _PROMPT_CACHE[prompt_name] = (prompt_path, mtime_ns, content)
+            return content
+
+        _PROMPT_CACHE.pop(prompt_name, None)
+        raise FileNotFoundError(f"Prompt template not found: {prompt_name}")
 
     def _invoke_llm_prompt(
-        self, state: AgentState, prompt_name: str, payload: Dict[str, Any]
+        self,
+        state: AgentState,
+        prompt_name: str,
+        payload: Dict[str, Any],
+        system_prompt: Optional[str] = None,
+        force_refresh: bool = False,
     ) -> Optional[Any]:
-        # Markdown prompts return raw strings, not JSON
-        markdown_prompts = {
-            "phase1_toc_review.md",
-            "phase2_check_conceptual_coverage.md",
-            "phase2_check_compliance_governance.md",
-            "phase2_check_language_clarity.md",
-            "phase2_check_structural_presentation.md",
-            "phase2_synthesis_summary.md",
-        }
-        
-        is_markdown = prompt_name in markdown_prompts
+        outcome = self._run_llm_prompt(
+            state["doc_id"], prompt_name, payload, system_prompt, force_refresh
+        )
+        return self._record_llm_outcome(state, outcome)
+
+    def _invoke_llm_prompts(
+        self,
+        state: AgentState,
+        calls: List[Tuple[str, Dict[str, Any]]],
+    ) -> List[Optional[Any]]:
+        """
+        Run independent (prompt_name, payload) calls concurrently, at most
+        ``llm.max_concurrency`` at a time (env DOC_REVIEW_LLM_MAX_CONCURRENCY
+        overrides). The provider SDK is blocking, so this uses threads; errors and
+        transcript entries are recorded on ``state`` in call order once all
+        calls have finished.
+        """
+        workers = min(len(calls), self._llm_max_concurrency())
+        if workers <= 1:
+            return [self._invoke_llm_prompt(state, name, payload) for name, payload in calls]
+
+        doc_id = state["doc_id"]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(
+                pool.map(lambda call: self._run_llm_prompt(doc_id, call[0], call[1]), calls)
+            )
+        return [self._record_llm_outcome(state, outcome) for outcome in outcomes]
+
+    def _llm_max_concurrency(self) -> int:
+        value = os.getenv("DOC_REVIEW_LLM_MAX_CONCURRENCY") or self.config.get("llm", {}).get(
+            "max_concurrency", 4
+        )
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return 1
+
+    def _run_llm_prompt(
+        self,
+        doc_id: str,
+        prompt_name: str,
+        payload: Dict[str, Any],
+        system_prompt: Optional[str] = None,
+        force_refresh: bool = False,
+    ) -> Tuple[str, Dict[str, Any], Optional[Any], Optional[str]]:
+        """
+        Call one prompt without touching agent state, so it can run on a worker
+        thread. Returns (prompt_name, payload, result, error message).
+        """
+        is_markdown = prompt_name in MARKDOWN_PROMPTS
         
         try:
-            system_prompt = self._load_prompt_template(prompt_name)
-            if is_markdown:
-                result = call_llm_markdown(system_prompt, payload)
-            else:
-                responses = call_llm_json(system_prompt, payload)
-                if not responses:
-                    self.logger.warning("LLM prompt %s returned empty result", prompt_name)
-                    return None
-                result = responses[0]
+            if system_prompt is None:
+                system_prompt = self._load_prompt_template(prompt_name)
+            result = self._call_llm_cached(
+                prompt_name,
+                system_prompt,
+                payload,
+                is_markdown,
+                cache_dir=LLM_CACHE_DIR / doc_id,
+                force_refresh=force_refresh,
+            )
+            if result is None:
+                self.logger.warning("LLM prompt %s returned empty result", prompt_name)
+            return prompt_name, payload, result, None
         except LLMNotAvailableError as exc:
             msg = f"{prompt_name} skipped: {exc}"
-            state["errors"].append(msg)
             self.logger.warning(msg)
-            return None
+            return prompt_name, payload, None, msg
         except FileNotFoundError as exc:
-            state["errors"].append(str(exc))
             self.logger.error(str(exc))
-            return None
+            return prompt_name, payload, None, str(exc)
         except Exception as exc:  # pragma: no cover
             msg = f"LLM prompt {prompt_name} failed: {exc}"
-            state["errors"].append(msg)
             self.logger.exception(msg)
+            return prompt_name, payload, None, msg
+
+    def _record_llm_outcome(
+        self,
+        state: AgentState,
+        outcome: Tuple[str, Dict[str, Any], Optional[Any], Optional[str]],
+    ) -> Optional[Any]:
+        """Append a _run_llm_prompt() outcome to state errors/transcript and return its result."""
+        prompt_name, payload, result, error = outcome
+        if error:
+            state["errors"].append(error)
+        if result is None:
             return None
 
         # Log transcript
-        if is_markdown:
+        if prompt_name in MARKDOWN_PROMPTS:
             preview = result[:200] + "..." if len(result) > 200 else result
             state["agent_transcript"].append(
                 {
                     "timestamp": _utcnow_iso(),
                     "prompt": prompt_name,
-                    "payload_preview": {k: payload.get(k) for k in list(payload.keys())[:5]},
+                    "payload_preview": _preview_mapping(payload),
                     "response_preview": preview,
                 }
             )
@@ -1611,35 +1931,172 @@ class DocReviewAgent:
                 {
                     "timestamp": _utcnow_iso(),
                     "prompt": prompt_name,
-                    "payload_preview": {k: payload.get(k) for k in list(payload.keys())[:5]},
-                    "response_preview": {k: result.get(k) for k in list(result.keys())[:5]},
+                    "payload_preview": _preview_mapping(payload),
+                    "response_preview": _preview_mapping(result),
                 }
             )
         return result
 
+    def _call_llm_cached(
+        self,
+        prompt_name: str,
+        system_prompt: str,
+        payload: Dict[str, Any],
+        is_markdown: bool,
+        cache_dir: Optional[Path] = None,
+        force_refresh: bool = False,
+    ) -> Optional[Any]:
+        """
+        Call the LLM, optionally through an exact-match response cache so
+        re-running a phase on an unchanged document skips the provider round-trip.
+        Responses are kept in memory and, when ``cache_dir`` is given, on disk so
+        interrupted runs resume without re-issuing completed calls. ``force_refresh``
+        skips lookups but still stores the fresh response.
+
+        The cache is off unless ``llm.response_cache: true`` is set in the agent
+        config: with it on, a re-run returns the earlier answer instead of a new
+        sample.
+        """
+        llm_config = self.config.get("llm", {})
+        cache_key = None
+        cache_path = None
+        if llm_config.get("response_cache", False):
+            digest = hashlib.sha256()
+            for part in (
+                str(llm_config.get("model", "")),
+                prompt_name,
+                system_prompt,
+                _serialize_payload(payload),
+            ):
+                digest.update(part.encode("utf-8"))
+                digest.update(b"\0")
+            cache_key = digest.hexdigest()
+            if cache_dir is not None:
+                cache_path = cache_dir / f"{cache_key}.json"
+
+            if not force_refresh:
+                with _RESPONSE_CACHE_LOCK:
+                    cached = _RESPONSE_CACHE.get(cache_key)
+                    if cached is not None:
+                        _RESPONSE_CACHE.move_to_end(cache_key)
+                if cached is None and cache_path is not None:
+                    cached = self._read_llm_disk_cache(cache_path)
+                    if cached is not None:
+                        self._remember_llm_response(cache_key, cached)
+                if cached is not None:
+                    self.logger.debug("LLM response cache hit for %s", prompt_name)
+                    return copy.deepcopy(cached)
+
+        if is_markdown:
+            result = call_llm_markdown(system_prompt, payload)
+        else:
+            responses = call_llm_json(system_prompt, payload)
+            result = responses[0] if responses else None
+
+        if cache_key and result:
+            self._remember_llm_response(cache_key, copy.deepcopy(result))
+            if cache_path is not None:
+                self._write_llm_disk_cache(cache_path, prompt_name, result)
+        return result
+
+    @staticmethod
+    def _remember_llm_response(cache_key: str, result: Any) -> None:
+        with _RESPONSE_CACHE_LOCK:
+            _RESPONSE_CACHE[cache_key] = result
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            while len(_RESPONSE_CACHE) > RESPONSE_CACHE_MAX_ENTRIES:
+                _RESPONSE_CACHE.popitem(last=False)
+
+    def _read_llm_disk_cache(self, cache_path: Path) -> Optional[Any]:
+        try:
+            if time.time() - cache_path.stat().st_mtime > LLM_DISK_CACHE_MAX_AGE_S:
+                cache_path.unlink(missing_ok=True)
+                return None
+            entry = json_utils.loads(cache_path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.logger.warning("Ignoring unreadable LLM cache entry %s", cache_path)
+            return None
+        return entry.get("result") if isinstance(entry, dict) else None
+
+    def _write_llm_disk_cache(self, cache_path: Path, prompt_name: str, result: Any) -> None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid4().hex}.tmp")
+            tmp_path.write_bytes(json_utils.dumps_bytes({"prompt": prompt_name, "result": result}))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            self.logger.warning("Failed to write LLM cache entry %s", cache_path, exc_info=True)
+            return
+        self._prune_llm_disk_cache(cache_path.parent)
+
+    def _prune_llm_disk_cache(self, cache_dir: Path) -> None:
+        """Drop expired entries, then the oldest ones beyond LLM_DISK_CACHE_MAX_FILES."""
+        entries = []
+        cutoff = time.time() - LLM_DISK_CACHE_MAX_AGE_S
+        try:
+            for path in cache_dir.glob("*.json"):
+                try:
+                    mtime = path.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                else:
+                    entries.append((mtime, path))
+            if len(entries) > LLM_DISK_CACHE_MAX_FILES:
+                entries.sort(reverse=True)
+                for _, path in entries[LLM_DISK_CACHE_MAX_FILES:]:
+                    path.unlink(missing_ok=True)
+        except OSError:
+            self.logger.warning("Failed to prune LLM cache %s", cache_dir, exc_info=True)
+
     def _get_template_sections(self, state: AgentState) -> List[Dict[str, Any]]:
-        text = state["template_meta"].get("template_text")
+        return self._get_template_parts(state)[0]
+
+    def _get_template_parts(
+        self, state: AgentState
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """(sections, lowercased title -> section) for the state's template."""
+        template_meta = state["template_meta"]
+        text = template_meta.get("template_text")
         if not text:
-            return []
+            # Current states: resolve from the (cached) template definition
+            template_id = template_meta.get("template_id")
+            if not template_id:
+                return [], {}
+            try:
+                _, sections, title_index = self._read_template(template_id)
+            except FileNotFoundError:
+                return [], {}
+            return sections, title_index
+        # States saved before template_text was dropped carry the serialized template
+        cached = _LEGACY_TEMPLATE_CACHE.get(text)
+        if cached is not None:
+            _LEGACY_TEMPLATE_CACHE.move_to_end(text)
+            return cached
         try:
-            data = json.loads(text)
+            data = json_utils.loads(text)
         except json.JSONDecodeError:
-            return []
-        return data.get("sections", [])
+            return [], {}
+        sections = data.get("sections", [])
+        parts = (sections, self._build_title_index(sections))
+        _LEGACY_TEMPLATE_CACHE[text] = parts
+        if len(_LEGACY_TEMPLATE_CACHE) > LEGACY_TEMPLATE_CACHE_MAX_ENTRIES:
+            _LEGACY_TEMPLATE_CACHE.popitem(last=False)
+        return parts
 
     def _lookup_template_description(self, state: AgentState, section_title: str) -> Optional[Dict[str, Any]]:
-        sections = self._get_template_sections(state)
-        return self._lookup_template_description_from_list(sections, section_title)
+        _, title_index = self._get_template_parts(state)
+        return title_index.get(section_title.lower().strip())
 
     @staticmethod
-    def _lookup_template_description_from_list(
-        sections: List[Dict[str, Any]], section_title: str
-    ) -> Optional[Dict[str, Any]]:
-        target = section_title.lower().strip()
+    def _build_title_index(sections: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        index: Dict[str, Dict[str, Any]] = {}
         for section in sections:
-            title = (section.get("title") or "").lower().strip()
-            if title == target:
-                return section
-        return None
+            # First section wins on duplicate titles, as with a linear scan
+            index.setdefault((section.get("title") or "").lower().strip(), section)
+        return index
 
 
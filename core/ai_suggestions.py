@@ -2,49 +2,47 @@
 AI Suggestions management for document review.
 Handles CRUD operations for AI-suggested text improvements.
 """
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from pathlib import Path
-import json
+import time
+from typing import Any, Dict, List, Optional
 
-from core.store import DocReviewStore
+from core.models import AISuggestion
+from core.store import StateCollectionManager, find_by_id, items_for_block, make_id
+from tools.time_utils import utc_timestamp
 
 
-def _timestamp() -> str:
-    return datetime.utcnow().isoformat() + "Z"
+def build_suggestions(items: List[Dict[str, Any]], first_seq: int) -> List[AISuggestion]:
+    """Build suggestion records numbered from ``first_seq`` (one clock read for the batch)."""
+    now = time.time()
+    timestamp = utc_timestamp(now)
+    ts_ms = int(now * 1000)
+
+    suggestions: List[AISuggestion] = []
+    for seq, item in enumerate(items, start=first_seq):
+        suggestion: AISuggestion = {
+            "id": make_id("ai", seq, ts_ms),
+            "block_id": item["block_id"],
+            "selection_text": item["selection_text"],
+            "improved_text": item["improved_text"],
+            "status": item.get("status") or "pending",
+            "timestamp": timestamp,
+        }
+
+        if item.get("start_offset") is not None:
+            suggestion["start_offset"] = item["start_offset"]
+
+        if item.get("end_offset") is not None:
+            suggestion["end_offset"] = item["end_offset"]
+
+        suggestions.append(suggestion)
+    return suggestions
 
 
-class AISuggestionsManager:
+class AISuggestionsManager(StateCollectionManager):
     """Manages AI suggestions for document review."""
     
-    def __init__(self, store: DocReviewStore):
-        self.store = store
-    
     def _get_suggestions_from_state(self, file_id: str) -> List[Dict[str, Any]]:
         """Get AI suggestions array from document state."""
-        record = self.store.load(file_id)
-        if not record:
-            return []
-        
-        state = record.get("state", {})
-        return state.get("ai_suggestions", [])
-    
-    def _save_suggestions_to_state(self, file_id: str, suggestions: List[Dict[str, Any]]) -> bool:
-        """Save AI suggestions array to document state."""
-        record = self.store.load(file_id)
-        if not record:
-            return False
-        
-        state = record.get("state", {})
-        state["ai_suggestions"] = suggestions
-        record["state"] = state
-        record["updated_at"] = _timestamp()
-        
-        path = self.store._state_path(file_id)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(record, f, indent=2)
-        
-        return True
+        return self._get_state(file_id).get("ai_suggestions", [])
     
     def list_suggestions(self, file_id: str, block_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
@@ -57,12 +55,10 @@ class AISuggestionsManager:
         Returns:
             List of suggestion dictionaries
         """
-        suggestions = self._get_suggestions_from_state(file_id)
-        
         if block_id:
-            suggestions = [s for s in suggestions if s.get("block_id") == block_id]
+            return items_for_block(self._get_state(file_id), "ai_suggestions", block_id)
         
-        return suggestions
+        return self._get_suggestions_from_state(file_id)
     
     def add_suggestion(
         self,
@@ -73,7 +69,7 @@ class AISuggestionsManager:
         status: str = "pending",  # pending, accepted, rejected
         start_offset: Optional[int] = None,
         end_offset: Optional[int] = None,
-    ) -> Dict[str, Any]:
+    ) -> Optional[Dict[str, Any]]:
         """
         Add a new AI suggestion.
         
@@ -87,29 +83,35 @@ class AISuggestionsManager:
             end_offset: Optional character offset where selection ends in block
             
         Returns:
-            The created suggestion dictionary
+            The created suggestion dictionary, or None if the document does not exist
         """
-        suggestions = self._get_suggestions_from_state(file_id)
-        
-        suggestion = {
-            "id": f"ai{len(suggestions) + 1}_{int(datetime.utcnow().timestamp() * 1000)}",
+        item: Dict[str, Any] = {
             "block_id": block_id,
             "selection_text": selection_text,
             "improved_text": improved_text,
             "status": status,
-            "timestamp": _timestamp(),
+            "start_offset": start_offset,
+            "end_offset": end_offset,
         }
+        created = self.add_suggestions_bulk(file_id, [item])
+        return None if created is None else created[0]
+    
+    def add_suggestions_bulk(self, file_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Add several AI suggestions with a single write.
         
-        if start_offset is not None:
-            suggestion["start_offset"] = start_offset
-        
-        if end_offset is not None:
-            suggestion["end_offset"] = end_offset
-        
-        suggestions.append(suggestion)
-        self._save_suggestions_to_state(file_id, suggestions)
-        
-        return suggestion
+        Args:
+            file_id: Document ID
+            items: Dicts with the add_suggestion fields (block_id, selection_text,
+                improved_text and optionally status, start_offset, end_offset)
+            
+        Returns:
+            The created suggestion dictionaries, in input order, or None if the
+            document does not exist
+        """
+        return self.store.append_new_items(
+            file_id, "ai_suggestions", lambda first_seq: build_suggestions(items, first_seq)
+        )
     
     def update_status(
         self,
@@ -128,16 +130,16 @@ class AISuggestionsManager:
         Returns:
             Updated suggestion dictionary or None if not found
         """
-        suggestions = self._get_suggestions_from_state(file_id)
-        
-        for suggestion in suggestions:
-            if suggestion["id"] == suggestion_id:
-                suggestion["status"] = status
-                suggestion["updated_at"] = _timestamp()
-                self._save_suggestions_to_state(file_id, suggestions)
-                return suggestion
-        
-        return None
+        def _update(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            pos = find_by_id(state, "ai_suggestions", suggestion_id)
+            if pos is None:
+                return None
+            suggestion = state["ai_suggestions"][pos]
+            suggestion["status"] = status
+            suggestion["updated_at"] = utc_timestamp()
+            return suggestion
+        
+        return self._mutate(file_id, _update)
     
     def delete_suggestion(self, file_id: str, suggestion_id: str) -> bool:
         """
@@ -150,16 +152,14 @@ class AISuggestionsManager:
         Returns:
             True if deleted, False if not found
         """
-        suggestions = self._get_suggestions_from_state(file_id)
-        original_count = len(suggestions)
-        
-        suggestions = [s for s in suggestions if s["id"] != suggestion_id]
-        
-        if len(suggestions) < original_count:
-            self._save_suggestions_to_state(file_id, suggestions)
+        def _delete(state: Dict[str, Any]) -> bool:
+            pos = find_by_id(state, "ai_suggestions", suggestion_id)
+            if pos is None:
+                return False
+            state["ai_suggestions"].pop(pos)
             return True
         
-        return False
+        return self._mutate(file_id, _delete)
     
     def get_suggestion(self, file_id: str, suggestion_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -172,11 +172,7 @@ class AISuggestionsManager:
         Returns:
             Suggestion dictionary or None if not found
         """
-        suggestions = self._get_suggestions_from_state(file_id)
-        
-        for suggestion in suggestions:
-            if suggestion["id"] == suggestion_id:
-                return suggestion
-        
-        return None
+        state = self._get_state(file_id)
+        pos = find_by_id(state, "ai_suggestions", suggestion_id)
+        return None if pos is None else state["ai_suggestions"][pos]
 
@@ -2,49 +2,42 @@
 Chat history management for document review.
 Handles storage and retrieval of chat messages between user and RiskGPT.
 """
-from datetime import datetime
-from typing import List, Dict, Any
-from pathlib import Path
-import json
+import time
+from typing import Any, Dict, List, Optional
 
-from core.store import DocReviewStore
+from core.models import ChatMessage
+from core.store import StateCollectionManager, make_id
+from tools.time_utils import utc_timestamp
 
 
-def _timestamp() -> str:
-    return datetime.utcnow().isoformat() + "Z"
+def build_messages(items: List[Dict[str, Any]], first_seq: int) -> List[ChatMessage]:
+    """Build message records numbered from ``first_seq`` (one clock read for the batch)."""
+    now = time.time()
+    timestamp = utc_timestamp(now)
+    ts_ms = int(now * 1000)
+
+    messages: List[ChatMessage] = []
+    for seq, item in enumerate(items, start=first_seq):
+        message: ChatMessage = {
+            "id": make_id("msg", seq, ts_ms),
+            "role": item["role"],
+            "content": item["content"],
+            "timestamp": timestamp,
+        }
+
+        if item.get("context"):
+            message["context"] = item["context"]
+
+        messages.append(message)
+    return messages
 
 
-class ChatHistoryManager:
+class ChatHistoryManager(StateCollectionManager):
     """Manages chat history for document review."""
     
-    def __init__(self, store: DocReviewStore):
-        self.store = store
-    
     def _get_messages_from_state(self, file_id: str) -> List[Dict[str, Any]]:
         """Get chat messages array from document state."""
-        record = self.store.load(file_id)
-        if not record:
-            return []
-        
-        state = record.get("state", {})
-        return state.get("chat_messages", [])
-    
-    def _save_messages_to_state(self, file_id: str, messages: List[Dict[str, Any]]) -> bool:
-        """Save chat messages array to document state."""
-        record = self.store.load(file_id)
-        if not record:
-            return False
-        
-        state = record.get("state", {})
-        state["chat_messages"] = messages
-        record["state"] = state
-        record["updated_at"] = _timestamp()
-        
-        path = self.store._state_path(file_id)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(record, f, indent=2)
-        
-        return True
+        return self._get_state(file_id).get("chat_messages", [])
     
     def list_messages(self, file_id: str) -> List[Dict[str, Any]]:
         """
@@ -63,8 +56,8 @@ class ChatHistoryManager:
         file_id: str,
         role: str,  # 'user' or 'assistant'
         content: str,
-        context: str = None  # Optional selected text context
-    ) -> Dict[str, Any]:
+        context: Optional[str] = None  # Optional selected text context
+    ) -> Optional[Dict[str, Any]]:
         """
         Add a new chat message.
         
@@ -75,24 +68,27 @@ class ChatHistoryManager:
             context: Optional selected text context
             
         Returns:
-            The created message dictionary
+            The created message dictionary, or None if the document does not exist
         """
-        messages = self._get_messages_from_state(file_id)
-        
-        message = {
-            "id": f"msg{len(messages) + 1}_{int(datetime.utcnow().timestamp() * 1000)}",
-            "role": role,
-            "content": content,
-            "timestamp": _timestamp(),
-        }
-        
-        if context:
-            message["context"] = context
-        
-        messages.append(message)
-        self._save_messages_to_state(file_id, messages)
+        item = {"role": role, "content": content, "context": context}
+        created = self.add_messages_bulk(file_id, [item])
+        return None if created is None else created[0]
+    
+    def add_messages_bulk(self, file_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Add several chat messages with a single write.
         
-        return message
+        Args:
+            file_id: Document ID
+            items: Dicts with role, content and optionally context
+            
+        Returns:
+            The created message dictionaries, in input order, or None if the
+            document does not exist
+        """
+        return self.store.append_new_items(
+            file_id, "chat_messages", lambda first_seq: build_messages(items, first_seq)
+        )
     
     def clear_messages(self, file_id: str) -> bool:
         """
@@ -104,6 +100,12 @@ class ChatHistoryManager:
         Returns:
             True if successful
         """
-        return self._save_messages_to_state(file_id, [])
+        record = self.store.load(file_id)
+        if not record:
+            return False
+        
+        record.setdefault("state", {})["chat_messages"] = []
+        self.store.mark_dirty(file_id, record)
+        return True
 
 
@@ -2,55 +2,53 @@
 Comments management for document review.
 Handles CRUD operations for block-level comments and replies.
 """
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from pathlib import Path
-import json
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
-from core.store import DocReviewStore
-from tools.file_utils import ensure_directory
+from core.models import Comment
+from core.store import StateCollectionManager, find_by_id, items_for_block, make_id
+from tools.time_utils import utc_timestamp
 
 
-def _timestamp() -> str:
-    return datetime.utcnow().isoformat() + "Z"
+def build_comments(items: List[Dict[str, Any]], first_seq: int) -> List[Comment]:
+    """Build comment records numbered from ``first_seq`` (one clock read for the batch)."""
+    now = time.time()
+    timestamp = utc_timestamp(now)
+    ts_ms = int(now * 1000)
 
+    comments: List[Comment] = []
+    for seq, item in enumerate(items, start=first_seq):
+        comment: Comment = {
+            "id": make_id("c", seq, ts_ms),
+            "block_id": item["block_id"],
+            "block_title": item["block_title"],
+            "author": item.get("author") or "User",
+            "timestamp": timestamp,
+            "content": item["content"],
+            "resolved": False,
+            "replies": [],
+        }
+
+        if item.get("selection_text"):
+            comment["selection_text"] = item["selection_text"]
 
-class CommentsManager:
+        if item.get("start_offset") is not None:
+            comment["start_offset"] = item["start_offset"]
+
+        if item.get("end_offset") is not None:
+            comment["end_offset"] = item["end_offset"]
+
+        comments.append(comment)
+    return comments
+
+
+class CommentsManager(StateCollectionManager):
     """Manages comments for document review blocks."""
     
-    def __init__(self, store: DocReviewStore):
-        self.store = store
-    
     def _get_comments_from_state(self, file_id: str) -> List[Dict[str, Any]]:
         """Get comments array from document state."""
-        record = self.store.load(file_id)
-        if not record:
-            return []
-        
-        state = record.get("state", {})
-        return state.get("comments", [])
-    
-    def _save_comments_to_state(self, file_id: str, comments: List[Dict[str, Any]]) -> bool:
-        """Save comments array to document state."""
-        record = self.store.load(file_id)
-        if not record:
-            return False
-        
-        state = record.get("state", {})
-        state["comments"] = comments
-        record["state"] = state
-        record["updated_at"] = _timestamp()
-        
-        # Use the store's _doc_file method to get the correct path
-        path = self.store._doc_file(file_id)
-        ensure_directory(path.parent)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(record, f, indent=2)
-        
-        # Update index
-        self.store._update_index(file_id, record)
-        
-        return True
+        return self._get_state(file_id).get("comments", [])
     
     def list_comments(self, file_id: str, block_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
@@ -63,12 +61,10 @@ class CommentsManager:
         Returns:
             List of comment dictionaries
         """
-        comments = self._get_comments_from_state(file_id)
-        
         if block_id:
-            comments = [c for c in comments if c.get("block_id") == block_id]
+            return items_for_block(self._get_state(file_id), "comments", block_id)
         
-        return comments
+        return self._get_comments_from_state(file_id)
     
     def add_comment(
         self,
@@ -80,7 +76,7 @@ class CommentsManager:
         selection_text: Optional[str] = None,
         start_offset: Optional[int] = None,
         end_offset: Optional[int] = None,
-    ) -> Dict[str, Any]:
+    ) -> Optional[Dict[str, Any]]:
         """
         Add a new comment to a block.
         
@@ -95,34 +91,36 @@ class CommentsManager:
             end_offset: Optional character offset where selection ends in block
             
         Returns:
-            The created comment dictionary
+            The created comment dictionary, or None if the document does not exist
         """
-        comments = self._get_comments_from_state(file_id)
-        
-        comment = {
-            "id": f"c{len(comments) + 1}_{int(datetime.utcnow().timestamp() * 1000)}",
+        item: Dict[str, Any] = {
             "block_id": block_id,
             "block_title": block_title,
-            "author": author,
-            "timestamp": _timestamp(),
             "content": content,
-            "resolved": False,
-            "replies": [],
+            "author": author,
+            "selection_text": selection_text,
+            "start_offset": start_offset,
+            "end_offset": end_offset,
         }
+        created = self.add_comments_bulk(file_id, [item])
+        return None if created is None else created[0]
+    
+    def add_comments_bulk(self, file_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Add several comments with a single write.
         
-        if selection_text:
-            comment["selection_text"] = selection_text
-        
-        if start_offset is not None:
-            comment["start_offset"] = start_offset
-        
-        if end_offset is not None:
-            comment["end_offset"] = end_offset
-        
-        comments.append(comment)
-        self._save_comments_to_state(file_id, comments)
-        
-        return comment
+        Args:
+            file_id: Document ID
+            items: Dicts with the add_comment fields (block_id, block_title, content
+                and optionally author, selection_text, start_offset, end_offset)
+            
+        Returns:
+            The created comment dictionaries, in input order, or None if the
+            document does not exist
+        """
+        return self.store.append_new_items(
+            file_id, "comments", lambda first_seq: build_comments(items, first_seq)
+        )
     
     def add_reply(
         self,
@@ -143,21 +141,22 @@ class CommentsManager:
         Returns:
             The updated comment with the new reply, or None if comment not found
         """
-        comments = self._get_comments_from_state(file_id)
-        
-        for comment in comments:
-            if comment["id"] == comment_id:
-                reply = {
-                    "id": f"r{len(comment['replies']) + 1}_{int(datetime.utcnow().timestamp() * 1000)}",
-                    "author": author,
-                    "timestamp": _timestamp(),
-                    "content": content,
-                }
-                comment["replies"].append(reply)
-                self._save_comments_to_state(file_id, comments)
-                return comment
-        
-        return None
+        def _reply(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            pos = find_by_id(state, "comments", comment_id)
+            if pos is None:
+                return None
+            comment = state["comments"][pos]
+            now = time.time()
+            reply = {
+                "id": make_id("r", len(comment["replies"]) + 1, int(now * 1000)),
+                "author": author,
+                "timestamp": utc_timestamp(now),
+                "content": content,
+            }
+            comment["replies"].append(reply)
+            return comment
+        
+        return self._mutate(file_id, _reply)
     
     def resolve_comment(self, file_id: str, comment_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -170,15 +169,15 @@ class CommentsManager:
         Returns:
             The updated comment, or None if not found
         """
-        comments = self._get_comments_from_state(file_id)
-        
-        for comment in comments:
-            if comment["id"] == comment_id:
-                comment["resolved"] = not comment.get("resolved", False)
-                self._save_comments_to_state(file_id, comments)
-                return comment
-        
-        return None
+        def _resolve(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            pos = find_by_id(state, "comments", comment_id)
+            if pos is None:
+                return None
+            comment = state["comments"][pos]
+            comment["resolved"] = not comment.get("resolved", False)
+            return comment
+        
+        return self._mutate(file_id, _resolve)
     
     def delete_comment(self, file_id: str, comment_id: str) -> bool:
         """
@@ -191,16 +190,14 @@ class CommentsManager:
         Returns:
             True if comment was deleted, False if not found
         """
-        comments = self._get_comments_from_state(file_id)
-        original_count = len(comments)
-        
-        comments = [c for c in comments if c["id"] != comment_id]
-        
-        if len(comments) < original_count:
-            self._save_comments_to_state(file_id, comments)
+        def _delete(state: Dict[str, Any]) -> bool:
+            pos = find_by_id(state, "comments", comment_id)
+            if pos is None:
+                return False
+            state["comments"].pop(pos)
             return True
         
-        return False
+        return self._mutate(file_id, _delete)
     
     def update_comment(
         self,
@@ -222,16 +219,16 @@ class CommentsManager:
         if content is None:
             return None
         
-        comments = self._get_comments_from_state(file_id)
-        
-        for comment in comments:
-            if comment["id"] == comment_id:
-                comment["content"] = content
-                comment["updated_at"] = _timestamp()
-                self._save_comments_to_state(file_id, comments)
-                return comment
+        def _update(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            pos = find_by_id(state, "comments", comment_id)
+            if pos is None:
+                return None
+            comment = state["comments"][pos]
+            comment["content"] = content
+            comment["updated_at"] = utc_timestamp()
+            return comment
         
-        return None
+        return self._mutate(file_id, _update)
     
     def get_comment_count_by_block(self, file_id: str) -> Dict[str, int]:
         """
@@ -241,15 +238,14 @@ class CommentsManager:
             file_id: Document ID
             
         Returns:
-            Dictionary mapping block_id to unresolved comment count
+            Dictionary mapping block_id to unresolved comment count (comments
+            without a block_id are not counted)
         """
         comments = self._get_comments_from_state(file_id)
-        count_map: Dict[str, int] = {}
-        
-        for comment in comments:
-            if not comment.get("resolved", False):
-                block_id = comment.get("block_id", "")
-                count_map[block_id] = count_map.get(block_id, 0) + 1
-        
-        return count_map
+        counts = Counter(
+            comment["block_id"]
+            for comment in comments
+            if not comment.get("resolved", False) and comment.get("block_id")
+        )
+        return dict(counts)
 
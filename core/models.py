@@ -1,3 +1,13 @@
+"""
+Typed shapes for the document review agent state.
+
+These stay TypedDicts rather than slotted dataclasses: AgentState is stored
+verbatim in the document JSON, returned by the API, and edited through the
+VFS adapter and routes with dict access, so the runtime objects have to be
+plain dicts. The same holds for the comment, AI suggestion and chat message
+records below, which are returned to the API as-is by their managers.
+"""
+
 from __future__ import annotations
 
 from typing import Any, Dict, List, Literal, Optional, TypedDict
@@ -59,7 +69,7 @@ class StructureData(TypedDict, total=False):
 class TemplateMeta(TypedDict, total=False):
     template_id: str
     template_label: Optional[str]
-    template_text: Optional[str]
+    template_text: Optional[str]  # legacy; sections now resolve via template_id
     template_categories: List[str]
     max_section_words: int
 
@@ -183,6 +193,7 @@ class ChangesData(TypedDict, total=False):
     change_selection_plan: Optional[ChangeSelectionPlan]
     skipped_changes: List[Dict[str, Any]]
     new_raw_text: Optional[str]
+    revision: int  # bumped whenever suggested_changes is replaced or updated
 
 
 class UserInteractionState(TypedDict, total=False):
@@ -197,6 +208,48 @@ class VfsArtifact(TypedDict, total=False):
     last_updated: Optional[str]
 
 
+class CommentReply(TypedDict):
+    id: str
+    author: str
+    timestamp: str
+    content: str
+
+
+class Comment(TypedDict, total=False):
+    id: str
+    block_id: str
+    block_title: str
+    author: str
+    timestamp: str
+    content: str
+    resolved: bool
+    replies: List[CommentReply]
+    selection_text: str
+    start_offset: int
+    end_offset: int
+    updated_at: str
+
+
+class AISuggestion(TypedDict, total=False):
+    id: str
+    block_id: str
+    selection_text: str
+    improved_text: str
+    status: Literal["pending", "accepted", "rejected"]
+    timestamp: str
+    start_offset: int
+    end_offset: int
+    updated_at: str
+
+
+class ChatMessage(TypedDict, total=False):
+    id: str
+    role: Literal["user", "assistant"]
+    content: str
+    timestamp: str
+    context: str
+
+
 class AgentState(TypedDict, total=False):
     run_id: str
     doc_id: str
@@ -217,6 +270,7 @@ class AgentState(TypedDict, total=False):
     user_interaction: UserInteractionState
     file_metadata: Optional[Dict[str, Any]]
     vfs_artifacts: List[VfsArtifact]
+    vfs_artifact_index: Dict[str, int]  # path -> position in vfs_artifacts
     logs: List[str]
     agent_transcript: List[Dict[str, Any]]
 
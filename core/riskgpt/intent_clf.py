@@ -0,0 +1,83 @@
+"""
+Local intent classifier for RiskGPT.
+
+Keyword rules for the four intents the intent classifier node routes on. Most
+requests are phrased with a handful of telltale verbs ("improve", "find",
+"check compliance", "what is"), so these are answered locally; anything that
+matches weakly or ambiguously is left to the LLM classifier.
+"""
+import re
+from typing import Dict, List, NamedTuple, Pattern, Tuple
+
+from core.riskgpt.schemas import IntentType
+
+_INTENT_PATTERNS: Dict[str, List[Pattern[str]]] = {
+    "improve_blocks": [
+        re.compile(p) for p in (
+            r"\b(improve|rewrite|rephrase|reword|simplify|shorten|expand|polish|tighten|edit)\b",
+            r"\bmake (this|it|these|them|the \w+) (clearer|shorter|longer|simpler|better|more|less)\b",
+            r"\b(fix|correct)\b.*\b(grammar|spelling|typos?|wording|this|it)\b",
+            r"\badd (more )?(detail|details|context|examples?)\b",
+        )
+    ],
+    "search_document": [
+        re.compile(p) for p in (
+            r"\b(find|search|locate)\b",
+            r"\bwhere (does|do|is|are|in)\b",
+            r"\bshow me\b",
+            r"\bwhich (section|sections|part|parts|page|pages)\b",
+            r"\b(mention|mentions|mentioned|refer to|refers to)\b",
+        )
+    ],
+    "compliance_check": [
+        re.compile(p) for p in (
+            r"\b(compliance|compliant)\b",
+            r"\bgaps?\b",
+            r"\bassess(ment)? against\b",
+            r"\b(regulatory|regulation|regulations)\b",
+            r"\bagainst the template\b",
+        )
+    ],
+    "general_question": [
+        re.compile(p) for p in (
+            r"^(what|why|how|who|when|is|are|does|do|can|should)\b",
+            r"\b(explain|summari[sz]e|summary|overview|describe)\b",
+            r"\bwhat('s| is) missing\b",
+            r"\babout\??$",
+        )
+    ],
+}
+
+
+class IntentPrediction(NamedTuple):
+    intent: IntentType
+    confidence: float
+    matched: Tuple[str, ...]
+
+
+def predict(user_prompt: str) -> IntentPrediction:
+    """Best-matching intent with a confidence in [0, 1].
+
+    Confidence is high only when one intent clearly outscores the others; a
+    prompt that matches nothing comes back as a low-confidence general question.
+    """
+    text = " ".join(user_prompt.lower().split())
+    hits: Dict[str, List[str]] = {}
+    for intent, patterns in _INTENT_PATTERNS.items():
+        matched = [m.group(0) for m in (p.search(text) for p in patterns) if m]
+        if matched:
+            hits[intent] = matched
+
+    if not hits:
+        return IntentPrediction("general_question", 0.3, ())
+
+    ranked = sorted(hits.items(), key=lambda item: len(item[1]), reverse=True)
+    best_intent, best = ranked[0]
+    runner_up = len(ranked[1][1]) if len(ranked) > 1 else 0
+    if runner_up == len(best):
+        confidence = 0.5
+    else:
+        # One clear match ~0.75, two or more unopposed matches ~0.9
+        margin = (len(best) - runner_up) / len(best)
+        confidence = round(min(0.95, 0.6 + 0.15 * min(len(best), 2) * margin), 2)
+    return IntentPrediction(best_intent, confidence, tuple(best))
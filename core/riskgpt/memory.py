@@ -0,0 +1,83 @@
+"""
+Conversation memory for RiskGPT prompts.
+
+Long sessions are rendered as a short summary of the older messages followed by
+the most recent ones verbatim, so prompt size stays bounded however long the
+conversation gets.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Rough chars-per-token estimate used to turn token budgets into string lengths
+CHARS_PER_TOKEN = 4
+# Longest excerpt kept from any single summarised message
+SUMMARY_EXCERPT_CHARS = 160
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _speaker(message: Dict[str, str]) -> str:
+    return "Q" if message.get("role") == "user" else "A"
+
+
+def _excerpt(content: str) -> str:
+    """First sentence of a message, collapsed to one line and capped in length."""
+    text = " ".join(content.split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    if len(first) > SUMMARY_EXCERPT_CHARS:
+        first = first[:SUMMARY_EXCERPT_CHARS - 3].rstrip() + "..."
+    return first
+
+
+@lru_cache(maxsize=256)
+def _summarize(messages: Tuple[Tuple[str, str], ...], char_budget: int) -> str:
+    """Extractive summary: newest excerpts first until the budget is used, then
+    put back in conversation order."""
+    parts: List[str] = []
+    used = 0
+    for speaker, content in reversed(messages):
+        excerpt = _excerpt(content)
+        if not excerpt:
+            continue
+        line = f"{speaker}: {excerpt}"
+        if used + len(line) > char_budget:
+            break
+        parts.append(line)
+        used += len(line) + 1
+    parts.reverse()
+    return "\n".join(parts)
+
+
+def rolling_summary(
+    history: List[Dict[str, str]],
+    max_recent: int = 4,
+    token_budget: int = 200,
+) -> Optional[str]:
+    """Summary of everything except the last ``max_recent`` messages, or None.
+
+    Summaries are cached on the older messages' content, so consecutive turns
+    of a session only re-summarise when the window moves.
+    """
+    older = history[:-max_recent] if max_recent else history
+    if not older:
+        return None
+    key = tuple((_speaker(msg), msg.get("content", "")) for msg in older)
+    return _summarize(key, token_budget * CHARS_PER_TOKEN) or None
+
+
+def render_history(
+    history: List[Dict[str, str]],
+    max_recent: int = 4,
+    token_budget: int = 200,
+) -> str:
+    """``[SUMMARY: ...]`` of the older messages plus the last ``max_recent`` as Q:/A: lines."""
+    if not history:
+        return ""
+    lines = []
+    summary = rolling_summary(history, max_recent, token_budget)
+    if summary:
+        lines.append(f"[SUMMARY OF EARLIER CONVERSATION:\n{summary}]")
+    recent = history[-max_recent:] if max_recent else []
+    lines.extend(f"{_speaker(msg)}: {msg.get('content', '')}" for msg in recent)
+    return "\n".join(lines)
@@ -2,13 +2,26 @@
 Nodes for RiskGPT Agent.
 Each node is a pure function that takes state and returns partial state updates.
 """
-import json
 import logging
-from datetime import datetime
-from typing import Dict, Any, List, Optional
-
-from core.riskgpt.schemas import RiskGPTAgentState, PartialState
-from tools.llm_client import get_llm_client, is_llm_available
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+from core.riskgpt import intent_clf
+from core.riskgpt.memory import render_history
+from core.riskgpt.retrieval import block_index, relevant_excerpts
+from core.riskgpt.schemas import LogEntry, RiskGPTAgentState, PartialState
+from tools import json_utils
+from tools.llm_client import (
+    EPHEMERAL_CACHE_CONTROL,
+    MIN_CACHEABLE_PROMPT_CHARS,
+    get_llm_client,
+    is_llm_available,
+)
 
 
 class LLMNotAvailableError(RuntimeError):
@@ -18,8 +31,11 @@ class LLMNotAvailableError(RuntimeError):
 logger = logging.getLogger(__name__)
 
 
-def _now_iso() -> str:
-    return datetime.utcnow().isoformat() + "Z"
+def _require_client():
+    """Shared LLM client wrapper, or LLMNotAvailableError if no API key is set."""
+    if not is_llm_available():
+        raise LLMNotAvailableError("LLM not configured")
+    return get_llm_client()
 
 
 def _make_node_result(
@@ -29,20 +45,16 @@ def _make_node_result(
     reasoning: str,
     state_updates: Optional[Dict[str, Any]] = None
 ) -> PartialState:
-    """Standardized node return format."""
-    logs = state.get("logs", [])
-    logs.append({
-        "node": node_name,
-        "timestamp": _now_iso(),
-        "msg": reasoning,
-        "control": control
-    })
+    """Standardized node return format.
     
+    The node's log entry is returned under ``_log_entry``; the agent collects
+    entries itself instead of nodes appending to a list shared through state.
+    """
     result = {
         "last_node": node_name,
         "control": control,
         "node_reasoning": reasoning,
-        "logs": logs,
+        "_log_entry": LogEntry(node_name, time.time_ns(), reasoning, control),
     }
     
     if state_updates:
@@ -51,10 +63,345 @@ def _make_node_result(
     return result
 
 
+# System prompts are kept byte-identical across calls so the provider can serve
+# them (and any cached prefix that follows) from its prompt cache.
+_INTENT_SYSTEM_PROMPT = """You are an intent classifier for RiskGPT, a document review assistant.
+
+Analyze the user's request and classify it into ONE primary intent:
+
+1. **improve_blocks** - User wants to improve/modify selected blocks
+   Examples: "make this clearer", "add more detail", "fix grammar", "improve this section"
+   
+2. **general_question** - User asking about the document, template, or process
+   Examples: "what is this document about?", "explain section 3", "what's missing?", "is this compliant?"
+   
+3. **search_document** - User asking about parts NOT currently selected
+   Examples: "find risk disclosures", "where does it mention X?", "show me sections about Y"
+   
+4. **compliance_check** - User wants compliance/gap analysis
+   Examples: "check compliance", "what gaps exist?", "assess against template"
+
+Respond ONLY with valid JSON:
+{
+  "intent": "improve_blocks|general_question|search_document|compliance_check",
+  "confidence": 0.0-1.0,
+  "reasoning": "brief explanation",
+  "requires_block_context": true/false,
+  "requires_doc_search": true/false
+}"""
+
+_BLOCK_IMPROVER_SYSTEM_PROMPT = """You are RiskGPT Block Improver - a specialized assistant for improving policy document blocks.
+
+YOUR TASK:
+Generate SPECIFIC, ACTIONABLE improvements for the selected blocks based on user's request.
+
+OUTPUT FORMAT (valid JSON only):
+{
+  "analysis": "Brief explanation of what needs improvement and why",
+  "suggestions": [
+    {
+      "block_id": "block_id_here",
+      "original": "original text",
+      "suggested": "improved text",
+      "reason": "specific reason for this change",
+      "confidence": "high|medium|low"
+    }
+  ]
+}
+
+GUIDELINES:
+1. Be specific - reference exact text and changes
+2. Provide clear reasoning for each suggestion
+3. Consider template requirements if available
+4. Don't contradict previously accepted suggestions
+5. Focus on the user's specific request"""
+
+_CHAT_RESPONDER_SYSTEM_PROMPT = """You are RiskGPT - a helpful document review assistant.
+
+YOUR ROLE:
+- Answer questions about the document, template, and review process
+- Provide guidance and explanations
+- Reference specific sections when helpful
+- Stay focused on document review
+
+RESPONSE STYLE:
+- Conversational and helpful
+- Use markdown formatting (headings, lists, bold, code blocks)
+- Cite specific sections/pages when relevant
+- Be concise but complete
+
+RULES:
+1. ONLY help with document review - politely decline unrelated requests
+2. Use conversation history for context (marked with Q: and A: prefixes)
+3. Be specific and cite document sections
+4. Keep responses under 500 words unless detailed analysis is needed
+5. NEVER include conversation formatting (Q:, A:, USER:, ASSISTANT:) in your response"""
+
+_DOC_SEARCHER_SYSTEM_PROMPT = """You are RiskGPT Document Searcher.
+
+YOUR TASK:
+1. Identify what the user is looking for in the document
+2. Search through the document content
+3. Provide relevant excerpts and answer their question
+
+OUTPUT: Natural markdown response that:
+- Directly answers the user's question
+- Quotes relevant sections with page/block references
+- Explains what was found (or not found)
+- Uses clear formatting"""
+
+# Characters of the document sent to the chat responder / doc searcher
+CHAT_DOCUMENT_CHARS = 15000
+SEARCH_DOCUMENT_CHARS = 20000
+# Longest document / template prefixes any node sends; context_loader_node
+# slices these once per run
+MARKDOWN_HEAD_CHARS = max(CHAT_DOCUMENT_CHARS, SEARCH_DOCUMENT_CHARS)
+TEMPLATE_HEAD_CHARS = 3000
+# Messages quoted verbatim; anything older is summarised (see core.riskgpt.memory)
+INTENT_RECENT_MESSAGES = 3
+CHAT_RECENT_MESSAGES = 4
+# Local intent predictions at or above this confidence skip the LLM classifier
+INTENT_CONFIDENCE_THRESHOLD = 0.6
+
+
+def _markdown_head(state: RiskGPTAgentState) -> str:
+    head = state.get("markdown_head")
+    return head if head is not None else state.get("full_markdown", "")[:MARKDOWN_HEAD_CHARS]
+
+
+def _template_head(state: RiskGPTAgentState) -> str:
+    head = state.get("template_head")
+    return head if head is not None else (state.get("template_content") or "")[:TEMPLATE_HEAD_CHARS]
+
+
+@lru_cache(maxsize=32)
+def _document_context(markdown_head: str, limit: int, template_head: str = "") -> str:
+    """Document (and template) prefix for a prompt; identical inputs give identical bytes."""
+    text = f"DOCUMENT CONTENT:\n{markdown_head[:limit]}"
+    if template_head:
+        text += f"\n\nTEMPLATE:\n{template_head}"
+    return text
+
+
+def _document_prompt(state: RiskGPTAgentState, limit: int, template_head: str = "") -> str:
+    """Document context for the chat responder / doc searcher.
+
+    Documents that fit in ``limit`` are sent whole (a stable, cacheable prefix).
+    Longer ones are represented by the blocks most relevant to the question, so
+    content past the cut-off is still reachable; if nothing matches, the
+    document is truncated as before.
+    """
+    full_markdown = state.get("full_markdown", "")
+    block_metadata = state.get("block_metadata") or []
+    if len(full_markdown) > limit and block_metadata:
+        index = block_index(block_metadata, state.get("file_id"), state.get("doc_version"))
+        excerpts = relevant_excerpts(index, state.get("user_prompt", ""), limit)
+        if excerpts:
+            text = f"RELEVANT DOCUMENT EXCERPTS ([block_id] content, in document order):\n{excerpts}"
+            if template_head:
+                text += f"\n\nTEMPLATE:\n{template_head}"
+            return text
+    return _document_context(_markdown_head(state), limit, template_head)
+
+
+def _user_message(cached_prefix: str, *parts: str) -> Dict[str, Any]:
+    """User message with the stable prefix first, as its own cache breakpoint,
+    followed by the per-turn parts (empty parts are dropped)."""
+    prefix: Dict[str, Any] = {"type": "text", "text": cached_prefix}
+    if len(cached_prefix) >= MIN_CACHEABLE_PROMPT_CHARS:
+        prefix["cache_control"] = EPHEMERAL_CACHE_CONTROL
+    content = [prefix]
+    content.extend({"type": "text", "text": part} for part in parts if part)
+    return {"role": "user", "content": content}
+
+# Answers from the chat responder / doc searcher for recent (document version,
+# question) pairs; repeated questions skip the LLM call
+RESPONSE_CACHE_MAX_ENTRIES = 256
+_RESPONSE_CACHE: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def _normalize_prompt(prompt: str) -> str:
+    """Case, whitespace and trailing punctuation insensitive form of a question."""
+    return " ".join(prompt.lower().split()).rstrip("?.! ")
+
+
+def _response_cache_key(state: RiskGPTAgentState, node_name: str, *context: Any) -> Optional[Tuple[Any, ...]]:
+    """Cache key for a node's answer, or None if the document version is unknown.
+
+    ``context`` holds whatever else the prompt depends on (e.g. the rendered
+    conversation history), so follow-up questions are only reused verbatim.
+    """
+    file_id = state.get("file_id")
+    doc_version = state.get("doc_version")
+    if not file_id or not doc_version:
+        return None
+    return (node_name, file_id, doc_version, _normalize_prompt(state.get("user_prompt", "")), *context)
+
+
+def _invoke_cached(
+    state: RiskGPTAgentState,
+    client: Any,
+    cache_key: Optional[Tuple[Any, ...]],
+    **invoke_kwargs: Any,
+) -> Union[str, Iterator[str]]:
+    """client.invoke(), answered from the response cache when cache_key was seen.
+
+    With ``state["stream"]`` set, returns an iterator of text chunks instead
+    (see client.stream); a completed stream is added to the cache.
+    """
+    streaming = bool(state.get("stream"))
+    if cache_key is not None:
+        with _RESPONSE_CACHE_LOCK:
+            cached = _RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                _RESPONSE_CACHE.move_to_end(cache_key)
+        if cached is not None:
+            metrics = state.get("metrics")
+            if metrics is not None:
+                metrics["response_cache_hits"] = metrics.get("response_cache_hits", 0) + 1
+            return iter((cached,)) if streaming else cached
+    
+    if streaming:
+        return _stream_into_cache(state, client, cache_key, client.stream(**invoke_kwargs))
+    
+    response = client.invoke(**invoke_kwargs)
+    _record_llm_usage(state, client)
+    _cache_response(cache_key, response)
+    return response
+
+
+def _cache_response(cache_key: Optional[Tuple[Any, ...]], response: str) -> None:
+    if cache_key is None or not response:
+        return
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[cache_key] = response
+        if len(_RESPONSE_CACHE) > RESPONSE_CACHE_MAX_ENTRIES:
+            _RESPONSE_CACHE.popitem(last=False)
+
+
+def _stream_into_cache(
+    state: RiskGPTAgentState,
+    client: Any,
+    cache_key: Optional[Tuple[Any, ...]],
+    chunks: Iterator[str],
+) -> Iterator[str]:
+    """Pass chunks through, caching the full text once the stream completes.
+
+    Token usage is recorded when the stream ends, like a non-streamed call.
+    """
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    finally:
+        # Closing chunks first lets client.stream() record usage for an early stop
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        _record_llm_usage(state, client)
+    _cache_response(cache_key, "".join(parts))
+
+
+# Speculative handlers record usage into the same metrics as the classifier
+_USAGE_LOCK = threading.Lock()
+
+
+def _record_llm_usage(state: RiskGPTAgentState, client: Any) -> None:
+    """Add the last call's token usage, including prompt-cache reads, to state["metrics"]."""
+    _add_llm_usage(state, client.last_usage())
+
+
+def _add_llm_usage(state: RiskGPTAgentState, usage: Any) -> None:
+    metrics = state.get("metrics")
+    if metrics is None or usage is None:
+        return
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    with _USAGE_LOCK:
+        llm = metrics.setdefault("llm", {
+            "calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        })
+        llm["calls"] += 1
+        llm["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+        llm["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+        llm["cache_read_input_tokens"] += cache_read
+        llm["cache_creation_input_tokens"] += getattr(usage, "cache_creation_input_tokens", None) or 0
+        llm["cache_hits" if cache_read else "cache_misses"] += 1
+
+
 # ============================================================================
 # NODE 1: Context Loader (MCP - pure data loading)
 # ============================================================================
 
+# Derived context (selected blocks, suggestion statuses) for recent document
+# versions, so consecutive turns on an unchanged document skip the rebuild
+CONTEXT_CACHE_MAX_ENTRIES = 128
+_CONTEXT_CACHE: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+_CONTEXT_CACHE_LOCK = threading.Lock()
+
+
+def _derive_context(document_state: Dict[str, Any], selected_block_ids: List[str]) -> Dict[str, Any]:
+    """Selected blocks and the status-annotated suggestion list for a document state."""
+    block_metadata = document_state.get("block_metadata", [])
+    
+    # Filter selected blocks
+    selected_blocks = []
+    if selected_block_ids and block_metadata:
+        wanted = frozenset(selected_block_ids)
+        selected_blocks = [b for b in block_metadata if b.get("id") in wanted]
+    
+    # Build suggestions list; accepted wins over rejected, as before
+    status_map = dict.fromkeys(document_state.get("rejected_suggestions", []), "rejected")
+    status_map.update(dict.fromkeys(document_state.get("accepted_suggestions", []), "accepted"))
+    all_suggestions = [
+        {
+            "block_id": imp.get("block_id"),
+            "status": status_map.get(imp.get("block_id"), "pending"),
+            "reasoning": imp.get("reasoning", ""),
+            "changes_made": imp.get("changes_made", [])
+        }
+        for imp in document_state.get("template_improvements", [])
+    ]
+    
+    return {"selected_blocks": selected_blocks, "all_suggestions": all_suggestions}
+
+
+def _load_context_cached(
+    file_id: Optional[str],
+    doc_version: Optional[str],
+    document_state: Dict[str, Any],
+    selected_block_ids: List[str],
+) -> Dict[str, Any]:
+    """_derive_context(), reused while (file_id, doc_version, selection) is unchanged.
+
+    Without a doc_version there is nothing to tell document edits apart, so the
+    context is rebuilt. Cached values are shared and must not be modified.
+    """
+    if not file_id or not doc_version:
+        return _derive_context(document_state, selected_block_ids)
+    
+    key = (file_id, doc_version, tuple(selected_block_ids))
+    with _CONTEXT_CACHE_LOCK:
+        cached = _CONTEXT_CACHE.get(key)
+        if cached is not None:
+            _CONTEXT_CACHE.move_to_end(key)
+            return cached
+    
+    context = _derive_context(document_state, selected_block_ids)
+    with _CONTEXT_CACHE_LOCK:
+        _CONTEXT_CACHE[key] = context
+        if len(_CONTEXT_CACHE) > CONTEXT_CACHE_MAX_ENTRIES:
+            _CONTEXT_CACHE.popitem(last=False)
+    return context
+
+
 def context_loader_node(
     state: RiskGPTAgentState,
     document_state: Dict[str, Any],
@@ -65,7 +412,9 @@ def context_loader_node(
     Pure data loading - no LLM.
     
     Args:
-        state: Current agent state with file_id, selected_block_ids
+        state: Current agent state with file_id, selected_block_ids and
+            (optionally) doc_version, which enables reuse of the derived
+            context across turns
         document_state: Document state from store
         template_content: Template markdown (optional)
     
@@ -76,31 +425,14 @@ def context_loader_node(
     block_metadata = document_state.get("block_metadata", [])
     template_name = document_state.get("template_name")
     
-    # Filter selected blocks
-    selected_block_ids = state.get("selected_block_ids", [])
-    selected_blocks = []
-    if selected_block_ids and block_metadata:
-        selected_blocks = [b for b in block_metadata if b.get("id") in selected_block_ids]
-    
-    # Build suggestions list
-    template_improvements = document_state.get("template_improvements", [])
-    accepted_suggestions = set(document_state.get("accepted_suggestions", []))
-    rejected_suggestions = set(document_state.get("rejected_suggestions", []))
-    
-    all_suggestions = []
-    for imp in template_improvements:
-        block_id = imp.get("block_id")
-        status = "pending"
-        if block_id in accepted_suggestions:
-            status = "accepted"
-        elif block_id in rejected_suggestions:
-            status = "rejected"
-        all_suggestions.append({
-            "block_id": block_id,
-            "status": status,
-            "reasoning": imp.get("reasoning", ""),
-            "changes_made": imp.get("changes_made", [])
-        })
+    context = _load_context_cached(
+        state.get("file_id"),
+        state.get("doc_version"),
+        document_state,
+        state.get("selected_block_ids", []),
+    )
+    selected_blocks = context["selected_blocks"]
+    all_suggestions = context["all_suggestions"]
     
     return _make_node_result(
         state,
@@ -113,6 +445,8 @@ def context_loader_node(
             "selected_blocks": selected_blocks,
             "template_name": template_name,
             "template_content": template_content,
+            "markdown_head": full_markdown[:MARKDOWN_HEAD_CHARS],
+            "template_head": (template_content or "")[:TEMPLATE_HEAD_CHARS],
             "all_suggestions": all_suggestions,
         }
     )
@@ -131,48 +465,31 @@ def intent_classifier_node(state: RiskGPTAgentState) -> PartialState:
     - general_question: User asking about doc/template/process
     - search_document: User asking about unselected parts of doc
     - compliance_check: User wants compliance assessment
+    
+    Clear-cut requests are classified locally (core.riskgpt.intent_clf); the
+    LLM is only asked when the local prediction is below
+    INTENT_CONFIDENCE_THRESHOLD.
     """
-    if not is_llm_available():
-        raise LLMNotAvailableError("LLM not configured")
+    client = _require_client()
     
-    client = get_llm_client()
     user_prompt = state.get("user_prompt", "")
     selected_blocks = state.get("selected_blocks", [])
     conversation_history = state.get("conversation_history", [])
-    
-    # Build context
     has_selected_blocks = len(selected_blocks) > 0
-    recent_chat = ""
-    if conversation_history:
-        recent_chat = "\n".join([
-            f"{'Q' if msg.get('role') == 'user' else 'A'}: {msg.get('content', '')}"
-            for msg in conversation_history[-3:]
-        ])
     
-    system_prompt = """You are an intent classifier for RiskGPT, a document review assistant.
-
-Analyze the user's request and classify it into ONE primary intent:
-
-1. **improve_blocks** - User wants to improve/modify selected blocks
-   Examples: "make this clearer", "add more detail", "fix grammar", "improve this section"
-   
-2. **general_question** - User asking about the document, template, or process
-   Examples: "what is this document about?", "explain section 3", "what's missing?", "is this compliant?"
-   
-3. **search_document** - User asking about parts NOT currently selected
-   Examples: "find risk disclosures", "where does it mention X?", "show me sections about Y"
-   
-4. **compliance_check** - User wants compliance/gap analysis
-   Examples: "check compliance", "what gaps exist?", "assess against template"
-
-Respond ONLY with valid JSON:
-{
-  "intent": "improve_blocks|general_question|search_document|compliance_check",
-  "confidence": 0.0-1.0,
-  "reasoning": "brief explanation",
-  "requires_block_context": true/false,
-  "requires_doc_search": true/false
-}"""
+    prediction = intent_clf.predict(user_prompt)
+    if prediction.confidence >= INTENT_CONFIDENCE_THRESHOLD:
+        return _route_intent(
+            state,
+            prediction.intent,
+            prediction.confidence,
+            f"Local classifier matched: {', '.join(prediction.matched)}",
+            has_selected_blocks,
+            prediction.intent == "search_document",
+        )
+    
+    # Build context
+    recent_chat = render_history(conversation_history, max_recent=INTENT_RECENT_MESSAGES)
     
     user_content = f"""USER REQUEST: {user_prompt}
 
@@ -185,43 +502,24 @@ Classify the intent."""
     try:
         response = client.invoke(
             messages=[{"role": "user", "content": user_content}],
-            system=system_prompt,
+            system=_INTENT_SYSTEM_PROMPT,
+            cache_system=True,
             temperature=0.1,
             max_tokens=300,
             response_format="json"
         )
+        _record_llm_usage(state, client)
         
         # Parse JSON response  
-        result = json.loads(response)
-        
-        intent = result.get("intent", "general_question")
-        confidence = result.get("confidence", 0.5)
-        reasoning = result.get("reasoning", "")
-        requires_block_context = result.get("requires_block_context", has_selected_blocks)
-        requires_doc_search = result.get("requires_doc_search", False)
+        result = json_utils.loads(response)
         
-        # Route to appropriate node
-        if intent == "improve_blocks" and has_selected_blocks:
-            next_control = "block_improver"
-        elif intent == "search_document" or requires_doc_search:
-            next_control = "doc_searcher"
-        else:
-            next_control = "chat_responder"
-        
-        logger.info(f"[IntentClassifier] Classified as '{intent}' (confidence: {confidence:.2f}) -> {next_control}")
-        
-        return _make_node_result(
+        return _route_intent(
             state,
-            "intent_classifier",
-            next_control,
-            f"Intent: {intent} (confidence: {confidence:.2f})",
-            {
-                "intent": intent,
-                "intent_confidence": confidence,
-                "intent_reasoning": reasoning,
-                "requires_block_context": requires_block_context,
-                "requires_doc_search": requires_doc_search,
-            }
+            result.get("intent", "general_question"),
+            result.get("confidence", 0.5),
+            result.get("reasoning", ""),
+            result.get("requires_block_context", has_selected_blocks),
+            result.get("requires_doc_search", False),
         )
         
     except Exception as e:
@@ -243,88 +541,147 @@ Classify the intent."""
         )
 
 
+def _route_intent(
+    state: RiskGPTAgentState,
+    intent: str,
+    confidence: float,
+    reasoning: str,
+    requires_block_context: bool,
+    requires_doc_search: bool,
+) -> PartialState:
+    """Pick the handler node for a classified intent."""
+    has_selected_blocks = len(state.get("selected_blocks", [])) > 0
+    if intent == "improve_blocks" and has_selected_blocks:
+        next_control = "block_improver"
+    elif intent == "search_document" or requires_doc_search:
+        next_control = "doc_searcher"
+    else:
+        next_control = "chat_responder"
+    
+    logger.info(f"[IntentClassifier] Classified as '{intent}' (confidence: {confidence:.2f}) -> {next_control}")
+    
+    return _make_node_result(
+        state,
+        "intent_classifier",
+        next_control,
+        f"Intent: {intent} (confidence: {confidence:.2f})",
+        {
+            "intent": intent,
+            "intent_confidence": confidence,
+            "intent_reasoning": reasoning,
+            "requires_block_context": requires_block_context,
+            "requires_doc_search": requires_doc_search,
+        }
+    )
+
+
+def speculative_handler(state: RiskGPTAgentState) -> Optional[str]:
+    """Handler worth starting alongside the LLM intent classifier, or None.
+    
+    When the local classifier is not confident enough to route on its own but
+    its guess is block improvement (with blocks selected) or document search,
+    the agent runs that handler concurrently with the LLM classifier instead of
+    after it. The result is kept only if the classifier picks the same node;
+    otherwise it is discarded and the classifier's route runs as usual.
+    """
+    prediction = intent_clf.predict(state.get("user_prompt", ""))
+    if prediction.confidence >= INTENT_CONFIDENCE_THRESHOLD or not prediction.matched:
+        return None  # routed locally, or no guess worth acting on
+    if prediction.intent == "improve_blocks" and state.get("selected_blocks"):
+        return "block_improver"
+    if prediction.intent == "search_document" and not state.get("stream"):
+        # A streamed answer does no work until it is read, so there is nothing to overlap
+        return "doc_searcher"
+    return None
+
+
 # ============================================================================
 # NODE 3: Block Improver (LLM - generate block improvements)
 # ============================================================================
 
+# Selected blocks sent per improvement request; larger selections are split
+# into batches that run concurrently
+BLOCK_IMPROVER_BATCH_SIZE = 5
+
+
+def _riskgpt_max_concurrency() -> int:
+    """Concurrent LLM calls per request (same setting as the review agent)."""
+    try:
+        return max(1, int(os.getenv("DOC_REVIEW_LLM_MAX_CONCURRENCY") or 4))
+    except ValueError:
+        return 1
+
+
 def block_improver_node(state: RiskGPTAgentState) -> PartialState:
     """
     Generate structured suggestions for selected blocks.
     """
-    if not is_llm_available():
-        raise LLMNotAvailableError("LLM not configured")
-    
-    client = get_llm_client()
+    client = _require_client()
     selected_blocks = state.get("selected_blocks", [])
     user_prompt = state.get("user_prompt", "")
-    template_content = state.get("template_content")
+    template_head = _template_head(state)
     all_suggestions = state.get("all_suggestions", [])
     
-    system_prompt = """You are RiskGPT Block Improver - a specialized assistant for improving policy document blocks.
-
-YOUR TASK:
-Generate SPECIFIC, ACTIONABLE improvements for the selected blocks based on user's request.
-
-OUTPUT FORMAT (valid JSON only):
-{
-  "analysis": "Brief explanation of what needs improvement and why",
-  "suggestions": [
-    {
-      "block_id": "block_id_here",
-      "original": "original text",
-      "suggested": "improved text",
-      "reason": "specific reason for this change",
-      "confidence": "high|medium|low"
-    }
-  ]
-}
-
-GUIDELINES:
-1. Be specific - reference exact text and changes
-2. Provide clear reasoning for each suggestion
-3. Consider template requirements if available
-4. Don't contradict previously accepted suggestions
-5. Focus on the user's specific request"""
-    
     # Build context
-    blocks_json = json.dumps([
-        {
-            "block_id": b.get("id"),
-            "content": b.get("content"),
-            "type": b.get("type", "paragraph")
-        }
-        for b in selected_blocks
-    ], indent=2)
-    
     template_context = ""
-    if template_content:
-        template_context = f"\n\nTEMPLATE REQUIREMENTS:\n{template_content[:2000]}"
+    if template_head:
+        template_context = f"\n\nTEMPLATE REQUIREMENTS:\n{template_head[:2000]}"
     
     suggestions_context = ""
     if all_suggestions:
-        pending = [s for s in all_suggestions if s.get('status') == 'pending']
-        suggestions_context = f"\n\nEXISTING SUGGESTIONS: {len(all_suggestions)} total ({len(pending)} pending)"
+        pending_count = sum(1 for s in all_suggestions if s.get('status') == 'pending')
+        suggestions_context = f"\n\nEXISTING SUGGESTIONS: {len(all_suggestions)} total ({pending_count} pending)"
     
-    user_content = f"""USER REQUEST: {user_prompt}
+    batches = [
+        selected_blocks[i:i + BLOCK_IMPROVER_BATCH_SIZE]
+        for i in range(0, len(selected_blocks), BLOCK_IMPROVER_BATCH_SIZE)
+    ] or [[]]
+    
+    def _improve(blocks: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Any]:
+        # Compact output: the prompt is read by the model, not a person
+        blocks_json = json_utils.dumps([
+            {
+                "block_id": b.get("id"),
+                "content": b.get("content"),
+                "type": b.get("type", "paragraph")
+            }
+            for b in blocks
+        ])
+        
+        user_content = f"""USER REQUEST: {user_prompt}
 
 SELECTED BLOCKS:
 {blocks_json}{template_context}{suggestions_context}
 
 Generate improvements."""
-    
-    try:
+        
         response = client.invoke(
             messages=[{"role": "user", "content": user_content}],
-            system=system_prompt,
+            system=_BLOCK_IMPROVER_SYSTEM_PROMPT,
+            cache_system=True,
             temperature=0.3,
             max_tokens=2000,
             response_format="json"
         )
+        # Usage is per thread, so read it in the thread that made the call
+        return json_utils.loads(response), client.last_usage()
+    
+    try:
+        if len(batches) == 1:
+            outcomes = [_improve(batches[0])]
+        else:
+            # Batches are independent; the shared system prompt is cached once
+            with ThreadPoolExecutor(max_workers=min(len(batches), _riskgpt_max_concurrency())) as pool:
+                outcomes = list(pool.map(_improve, batches))
         
-        result = json.loads(response)
-        
-        analysis = result.get("analysis", "")
-        suggestions = result.get("suggestions", [])
+        analyses = []
+        suggestions = []
+        for result, usage in outcomes:
+            _add_llm_usage(state, usage)
+            if result.get("analysis"):
+                analyses.append(result["analysis"])
+            suggestions.extend(result.get("suggestions", []))
+        analysis = "\n\n".join(analyses)
         
         logger.info(f"[BlockImprover] Generated {len(suggestions)} suggestions")
         
@@ -361,71 +718,48 @@ def chat_responder_node(state: RiskGPTAgentState) -> PartialState:
     """
     Provide conversational responses about the document, template, or process.
     """
-    if not is_llm_available():
-        raise LLMNotAvailableError("LLM not configured")
-    
-    client = get_llm_client()
+    client = _require_client()
     user_prompt = state.get("user_prompt", "")
-    full_markdown = state.get("full_markdown", "")
-    template_content = state.get("template_content")
+    template_head = _template_head(state)
     all_suggestions = state.get("all_suggestions", [])
     conversation_history = state.get("conversation_history", [])
     
-    system_prompt = """You are RiskGPT - a helpful document review assistant.
-
-YOUR ROLE:
-- Answer questions about the document, template, and review process
-- Provide guidance and explanations
-- Reference specific sections when helpful
-- Stay focused on document review
-
-RESPONSE STYLE:
-- Conversational and helpful
-- Use markdown formatting (headings, lists, bold, code blocks)
-- Cite specific sections/pages when relevant
-- Be concise but complete
-
-RULES:
-1. ONLY help with document review - politely decline unrelated requests
-2. Use conversation history for context (marked with Q: and A: prefixes)
-3. Be specific and cite document sections
-4. Keep responses under 500 words unless detailed analysis is needed
-5. NEVER include conversation formatting (Q:, A:, USER:, ASSISTANT:) in your response"""
-    
-    # Build context
+    # Build context: document + template first (stable across turns), then the
+    # parts that change every turn
     history_text = ""
     if conversation_history:
-        history_text = "[PREVIOUS CONVERSATION CONTEXT]\n" + "\n".join([
-            f"{'Q' if msg.get('role') == 'user' else 'A'}: {msg.get('content', '')}"
-            for msg in conversation_history[-5:]
-        ]) + "\n[END CONTEXT]\n\n"
-    
-    template_text = ""
-    if template_content:
-        template_text = f"\n\nTEMPLATE:\n{template_content[:3000]}"
+        history_text = (
+            "[PREVIOUS CONVERSATION CONTEXT]\n"
+            + render_history(conversation_history, max_recent=CHAT_RECENT_MESSAGES)
+            + "\n[END CONTEXT]"
+        )
     
     suggestions_text = ""
     if all_suggestions:
-        pending = [s for s in all_suggestions if s.get('status') == 'pending']
-        accepted = [s for s in all_suggestions if s.get('status') == 'accepted']
-        suggestions_text = f"\n\nSUGGESTIONS SUMMARY:\n- Total: {len(all_suggestions)}\n- Pending: {len(pending)}\n- Accepted: {len(accepted)}"
-    
-    user_content = f"""{history_text}USER QUESTION: {user_prompt}
-
-DOCUMENT CONTENT:
-{full_markdown[:15000]}{template_text}{suggestions_text}
-
-Answer the user's question."""
+        status_counts = Counter(s.get('status') for s in all_suggestions)
+        suggestions_text = f"SUGGESTIONS SUMMARY:\n- Total: {len(all_suggestions)}\n- Pending: {status_counts['pending']}\n- Accepted: {status_counts['accepted']}"
+    
+    message = _user_message(
+        _document_prompt(state, CHAT_DOCUMENT_CHARS, template_head),
+        suggestions_text,
+        history_text,
+        f"USER QUESTION: {user_prompt}\n\nAnswer the user's question.",
+    )
     
     try:
-        response = client.invoke(
-            messages=[{"role": "user", "content": user_content}],
-            system=system_prompt,
+        response = _invoke_cached(
+            state,
+            client,
+            _response_cache_key(state, "chat_responder", history_text, bool(template_head)),
+            messages=[message],
+            system=_CHAT_RESPONDER_SYSTEM_PROMPT,
+            cache_system=True,
             temperature=0.5,
             max_tokens=1500
         )
         
-        logger.info(f"[ChatResponder] Generated response ({len(response)} chars)")
+        if isinstance(response, str):
+            logger.info(f"[ChatResponder] Generated response ({len(response)} chars)")
         
         return _make_node_result(
             state,
@@ -460,43 +794,29 @@ def doc_searcher_node(state: RiskGPTAgentState) -> PartialState:
     """
     Search document for relevant content and provide targeted answers.
     """
-    if not is_llm_available():
-        raise LLMNotAvailableError("LLM not configured")
-    
-    client = get_llm_client()
+    client = _require_client()
     user_prompt = state.get("user_prompt", "")
-    full_markdown = state.get("full_markdown", "")
     block_metadata = state.get("block_metadata", [])
     
-    system_prompt = """You are RiskGPT Document Searcher.
-
-YOUR TASK:
-1. Identify what the user is looking for in the document
-2. Search through the document content
-3. Provide relevant excerpts and answer their question
-
-OUTPUT: Natural markdown response that:
-- Directly answers the user's question
-- Quotes relevant sections with page/block references
-- Explains what was found (or not found)
-- Uses clear formatting"""
-    
-    user_content = f"""USER REQUEST: {user_prompt}
-
-DOCUMENT CONTENT:
-{full_markdown[:20000]}
-
-Find and explain relevant sections."""
+    message = _user_message(
+        _document_prompt(state, SEARCH_DOCUMENT_CHARS),
+        f"USER REQUEST: {user_prompt}\n\nFind and explain relevant sections.",
+    )
     
     try:
-        response = client.invoke(
-            messages=[{"role": "user", "content": user_content}],
-            system=system_prompt,
+        response = _invoke_cached(
+            state,
+            client,
+            _response_cache_key(state, "doc_searcher"),
+            messages=[message],
+            system=_DOC_SEARCHER_SYSTEM_PROMPT,
+            cache_system=True,
             temperature=0.4,
             max_tokens=1500
         )
         
-        logger.info(f"[DocSearcher] Generated search response ({len(response)} chars)")
+        if isinstance(response, str):
+            logger.info(f"[DocSearcher] Generated search response ({len(response)} chars)")
         
         return _make_node_result(
             state,
@@ -527,37 +847,41 @@ Find and explain relevant sections."""
 # NODE 6: End (MCP - format final output)
 # ============================================================================
 
+def _text_output(response: Union[str, Iterator[str]]) -> Dict[str, Any]:
+    """Final output for a text answer; a streamed answer goes in analysis_stream."""
+    if isinstance(response, str):
+        return {"analysis": response, "suggestions": []}
+    return {"analysis": "", "analysis_stream": response, "suggestions": []}
+
+
+# Handler node -> (analysis key, suggestions key); text-only handlers have no
+# suggestions key and may have streamed their answer
+END_OUTPUT_KEYS: Dict[str, Tuple[str, Optional[str]]] = {
+    "block_improver": ("block_analysis", "block_suggestions"),
+    "chat_responder": ("chat_response", None),
+    "doc_searcher": ("search_response", None),
+}
+
+
 def end_node(state: RiskGPTAgentState) -> PartialState:
     """
     Format final output based on which processing path was taken.
     """
-    last_node = state.get("last_node", "")
-    
-    # Determine output based on which node ran
-    if "block_improver" in last_node:
-        analysis = state.get("block_analysis", "")
-        suggestions = state.get("block_suggestions", [])
-        final_output = {
-            "analysis": analysis,
-            "suggestions": suggestions
-        }
-    elif "chat_responder" in last_node:
-        chat_response = state.get("chat_response", "")
-        final_output = {
-            "analysis": chat_response,
-            "suggestions": []
-        }
-    elif "doc_searcher" in last_node:
-        search_response = state.get("search_response", "")
-        final_output = {
-            "analysis": search_response,
-            "suggestions": []
-        }
-    else:
+    keys = END_OUTPUT_KEYS.get(state.get("last_node", ""))
+    if keys is None:
         final_output = {
             "analysis": "No response generated",
             "suggestions": []
         }
+    else:
+        analysis_key, suggestions_key = keys
+        if suggestions_key:
+            final_output = {
+                "analysis": state.get(analysis_key, ""),
+                "suggestions": state.get(suggestions_key, [])
+            }
+        else:
+            final_output = _text_output(state.get(analysis_key, ""))
     
     return _make_node_result(
         state,
@@ -0,0 +1,122 @@
+"""
+Block retrieval for RiskGPT prompts.
+
+Documents longer than a node's character budget used to be cut off at the
+budget, so questions about the back half of a document were answered blind.
+For those documents the blocks most relevant to the question are sent instead,
+ranked with BM25 over the block text and quoted in document order with their
+block IDs.
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Blocks quoted per prompt (further capped by the caller's character budget)
+RETRIEVAL_TOP_K = 12
+# Indexed documents kept in memory, keyed by (file_id, doc_version)
+INDEX_CACHE_MAX_ENTRIES = 16
+
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]{3,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has have him his how its may "
+    "new now see two way who did get let put say she too use this that with what when where which "
+    "why will would there their them then than these those from into about does doc document "
+    "section sections tell show find explain please could should also been being more most some "
+    "such only other over under here just like make".split()
+)
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BlockIndex:
+    """BM25 index over a document's blocks."""
+
+    def __init__(self, blocks: List[Dict[str, Any]]):
+        self.blocks = [b for b in blocks if b.get("content")]
+        self._term_freqs = [Counter(_terms(b["content"])) for b in self.blocks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(self.blocks)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> List[Tuple[int, float]]:
+        """(block position, score) of the best matches, best first; empty if nothing matches."""
+        query_terms = [t for t in set(_terms(query)) if t in self._idf]
+        if not query_terms or not self._avg_length:
+            return []
+        scored = []
+        for pos, tf in enumerate(self._term_freqs):
+            norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * self._lengths[pos] / self._avg_length)
+            score = 0.0
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (_BM25_K1 + 1) / (freq + norm)
+            if score > 0:
+                scored.append((pos, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:top_k]
+
+
+_INDEX_CACHE: "OrderedDict[Tuple[str, str], BlockIndex]" = OrderedDict()
+_INDEX_CACHE_LOCK = threading.Lock()
+
+
+def block_index(
+    blocks: List[Dict[str, Any]],
+    file_id: Optional[str] = None,
+    doc_version: Optional[str] = None,
+) -> BlockIndex:
+    """Index for ``blocks``, reused per (file_id, doc_version) when both are known."""
+    if not file_id or not doc_version:
+        return BlockIndex(blocks)
+    key = (file_id, doc_version)
+    with _INDEX_CACHE_LOCK:
+        index = _INDEX_CACHE.get(key)
+        if index is not None:
+            _INDEX_CACHE.move_to_end(key)
+            return index
+    index = BlockIndex(blocks)
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE[key] = index
+        if len(_INDEX_CACHE) > INDEX_CACHE_MAX_ENTRIES:
+            _INDEX_CACHE.popitem(last=False)
+    return index
+
+
+def relevant_excerpts(
+    index: BlockIndex,
+    query: str,
+    char_budget: int,
+    top_k: int = RETRIEVAL_TOP_K,
+) -> Optional[str]:
+    """Best-matching blocks as ``[block_id] content`` lines in document order,
+    within ``char_budget``; None when no block matches the query."""
+    hits = index.search(query, top_k)
+    if not hits:
+        return None
+    chosen = []
+    used = 0
+    for pos, _ in hits:
+        block = index.blocks[pos]
+        line = f"[{block.get('id', pos)}] {block['content']}"
+        if used + len(line) > char_budget:
+            continue
+        chosen.append((pos, line))
+        used += len(line) + 1
+    if not chosen:
+        return None
+    chosen.sort()
+    return "\n".join(line for _, line in chosen)
@@ -1,6 +1,7 @@
 """
 Schema definitions for RiskGPT Agent.
 """
+from dataclasses import dataclass
 from typing import TypedDict, List, Optional, Dict, Any, Literal
 
 
@@ -22,6 +23,15 @@ IntentType = Literal[
 ]
 
 
+@dataclass(slots=True, frozen=True)
+class LogEntry:
+    """One node's log line; converted to a dict only when the run result is built."""
+    node: str
+    ts_ns: int  # epoch ns; format with utc_timestamp(ts_ns / 1e9)
+    msg: str
+    control: str
+
+
 class RiskGPTAgentState(TypedDict, total=False):
     """
     State for RiskGPT Agent workflow.
@@ -40,6 +50,8 @@ class RiskGPTAgentState(TypedDict, total=False):
     user_prompt: str
     selected_block_ids: List[str]  # Empty for general chat
     conversation_history: List[Dict[str, str]]  # Last 5-10 messages
+    doc_version: Optional[str]  # Document record's updated_at; keys per-version caches
+    stream: bool  # Chat/search answers come back as an iterator of text chunks
     
     # ============================================================================
     # CONTEXT (loaded by context_loader node)
@@ -94,7 +106,7 @@ class RiskGPTAgentState(TypedDict, total=False):
     # ============================================================================
     # TELEMETRY
     # ============================================================================
-    logs: Optional[List[Dict[str, Any]]]
+    logs: Optional[List[LogEntry]]  # Collected by RiskGPTAgent.run from each node's _log_entry
     metrics: Optional[Dict[str, Any]]
 
 
@@ -2,10 +2,13 @@
 RiskGPT Agent - LangGraph-style orchestration for document review Q&A.
 """
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+import time
+from collections import deque
+from dataclasses import asdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, Tuple
 
-from core.riskgpt.schemas import RiskGPTAgentState
+from core.riskgpt.schemas import LogEntry, PartialState, RiskGPTAgentState
 from core.riskgpt.nodes import (
     context_loader_node,
     intent_classifier_node,
@@ -13,10 +16,30 @@ from core.riskgpt.nodes import (
     chat_responder_node,
     doc_searcher_node,
     end_node,
+    speculative_handler,
 )
+from tools.time_utils import utc_timestamp
 
 logger = logging.getLogger(__name__)
 
+# Most recent node log entries kept per run
+RUN_LOG_MAX_ENTRIES = 64
+
+# control signal -> node; context_loader also needs the document and is bound per run
+NodeFn = Callable[[RiskGPTAgentState], PartialState]
+_NODES: Dict[str, NodeFn] = {
+    "intent_classifier": intent_classifier_node,
+    "block_improver": block_improver_node,
+    "chat_responder": chat_responder_node,
+    "doc_searcher": doc_searcher_node,
+}
+
+
+def _timed(node: NodeFn, state: RiskGPTAgentState) -> Tuple[PartialState, float]:
+    start = time.perf_counter()
+    updates = node(state)
+    return updates, (time.perf_counter() - start) * 1000
+
 
 class RiskGPTAgent:
     """
@@ -30,6 +53,10 @@ class RiskGPTAgent:
        - Chat Responder → Answer general questions
        - Doc Searcher → Search and answer about document
     4. End → Format final output
+    
+    When the intent has to be classified by the LLM but the local classifier
+    already has a likely handler (nodes.speculative_handler), that handler runs
+    concurrently with the classifier rather than after it.
     """
     
     def __init__(self):
@@ -42,7 +69,9 @@ class RiskGPTAgent:
         selected_block_ids: list,
         conversation_history: list,
         document_state: Dict[str, Any],
-        template_content: Optional[str] = None
+        template_content: Optional[str] = None,
+        doc_version: Optional[str] = None,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         Execute the RiskGPT workflow.
@@ -54,24 +83,32 @@ class RiskGPTAgent:
             conversation_history: Last 5-10 messages for context
             document_state: Full document state from store
             template_content: Template markdown (optional)
+            doc_version: Version of document_state (e.g. the record's updated_at),
+                used to reuse loaded context and responses across turns
+            stream: Stream chat/search answers; the text is then returned as an
+                iterator in analysis_stream (block suggestions are never streamed)
         
         Returns:
             Dict with:
                 - analysis: Text response
+                - analysis_stream: Iterator of response text chunks (stream=True only)
                 - suggestions: List of structured suggestions (if blocks selected)
-                - logs: Processing logs
+                - logs: Processing logs (one dict per node: node, ts_ns, msg, control)
                 - metrics: Timing metrics
         """
+        run_start = time.perf_counter()
+        
         # Initialize state
         state: RiskGPTAgentState = {
             "file_id": file_id,
             "user_prompt": user_prompt,
             "selected_block_ids": selected_block_ids or [],
             "conversation_history": conversation_history or [],
+            "doc_version": doc_version,
+            "stream": stream,
             "control": "context_loader",
-            "logs": [],
             "metrics": {
-                "start_time": datetime.utcnow().isoformat() + "Z",
+                "start_time": utc_timestamp(),
                 "node_timings": {}
             }
         }
@@ -79,6 +116,10 @@ class RiskGPTAgent:
         logger.info(f"[RiskGPTAgent] Starting workflow for file_id={file_id}, "
                    f"selected_blocks={len(selected_block_ids)}, prompt_len={len(user_prompt)}")
         
+        logs: "deque[LogEntry]" = deque(maxlen=RUN_LOG_MAX_ENTRIES)
+        nodes: Dict[str, NodeFn] = dict(_NODES)
+        nodes["context_loader"] = lambda s: context_loader_node(s, document_state, template_content)
+        
         try:
             step = 0
             while step < self.max_steps:
@@ -88,48 +129,46 @@ class RiskGPTAgent:
                 if control == "end":
                     break
                 
-                node_start = datetime.utcnow()
-                
-                # Route to appropriate node
-                if control == "context_loader":
-                    updates = context_loader_node(state, document_state, template_content)
-                
-                elif control == "intent_classifier":
-                    updates = intent_classifier_node(state)
-                
-                elif control == "block_improver":
-                    updates = block_improver_node(state)
-                
-                elif control == "chat_responder":
-                    updates = chat_responder_node(state)
-                
-                elif control == "doc_searcher":
-                    updates = doc_searcher_node(state)
-                
-                else:
+                node = nodes.get(control)
+                if node is None:
                     logger.warning(f"[RiskGPTAgent] Unknown control signal: {control}")
                     break
                 
-                # Update state
-                state.update(updates)
-                
-                # Track timing
-                node_time = (datetime.utcnow() - node_start).total_seconds() * 1000
-                state["metrics"]["node_timings"][control] = node_time
+                speculative = None
+                guess = speculative_handler(state) if control == "intent_classifier" else None
+                if guess is not None:
+                    speculative = self._start_speculative(nodes[guess], state)
                 
+                updates, node_time = _timed(node, state)
+                self._apply(state, logs, control, updates, node_time)
                 logger.info(f"[RiskGPTAgent] Step {step}: {control} → {state.get('control')} "
                            f"({node_time:.1f}ms)")
+                
+                if speculative is not None:
+                    # Speculation only saves time; routing is always the classifier's
+                    if state.get("control") == guess:
+                        step += 1
+                        updates, node_time = speculative.result()
+                        self._apply(state, logs, guess, updates, node_time)
+                        logger.info(f"[RiskGPTAgent] Step {step}: {guess} (speculative) → "
+                                   f"{state.get('control')} ({node_time:.1f}ms)")
+                    else:
+                        # Can't be cancelled mid-call; the result is simply dropped
+                        logger.info(f"[RiskGPTAgent] Discarded speculative {guess}, "
+                                   f"classifier chose {state.get('control')}")
             
             # Run end node to format output
             if state.get("control") != "end":
                 logger.warning(f"[RiskGPTAgent] Reached max steps ({self.max_steps})")
             
             end_updates = end_node(state)
+            log_entry = end_updates.pop("_log_entry", None)
+            if log_entry is not None:
+                logs.append(log_entry)
             state.update(end_updates)
             
             # Calculate total time
-            start_time = datetime.fromisoformat(state["metrics"]["start_time"].replace("Z", ""))
-            total_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
+            total_ms = (time.perf_counter() - run_start) * 1000
             state["metrics"]["total_ms"] = total_ms
             state["metrics"]["steps"] = step
             
@@ -143,8 +182,9 @@ class RiskGPTAgent:
             
             return {
                 "analysis": final_output.get("analysis", ""),
+                "analysis_stream": final_output.get("analysis_stream"),
                 "suggestions": final_output.get("suggestions", []),
-                "logs": state.get("logs", []),
+                "logs": [asdict(entry) for entry in logs],
                 "metrics": state.get("metrics", {}),
                 "intent": state.get("intent"),
                 "intent_confidence": state.get("intent_confidence")
@@ -155,11 +195,35 @@ class RiskGPTAgent:
             return {
                 "analysis": f"Error processing request: {str(e)}",
                 "suggestions": [],
-                "logs": state.get("logs", []),
+                "logs": [asdict(entry) for entry in logs],
                 "metrics": state.get("metrics", {}),
                 "error": str(e)
             }
     
+    @staticmethod
+    def _start_speculative(node: NodeFn, state: RiskGPTAgentState) -> "Future[Tuple[PartialState, float]]":
+        """Run ``node`` on a snapshot of ``state`` in a background thread."""
+        pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            return pool.submit(_timed, node, dict(state))
+        finally:
+            pool.shutdown(wait=False)
+    
+    @staticmethod
+    def _apply(
+        state: RiskGPTAgentState,
+        logs: "deque[LogEntry]",
+        control: str,
+        updates: PartialState,
+        node_time: float,
+    ) -> None:
+        """Merge a node's updates into state and record its log entry and timing."""
+        log_entry = updates.pop("_log_entry", None)
+        if log_entry is not None:
+            logs.append(log_entry)
+        state.update(updates)
+        state["metrics"]["node_timings"][control] = node_time
+    
     def _merge(self, base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
         """Merge updates into base state."""
         base.update(updates)
@@ -2,101 +2,730 @@
 
 from __future__ import annotations
 
+import atexit
+import copy
 import json
 import logging
+import os
+import re
 import shutil
-from datetime import datetime
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from core.models import AgentState
+from tools import json_utils
 from tools.file_utils import ensure_directory
+from tools.time_utils import utc_timestamp
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+# Appended items are folded back into the main record once the sidecar log
+# grows past this size.
+APPEND_LOG_COMPACT_BYTES = 256 * 1024
+# Append logs kept open between writes (chatty documents append every message)
+APPEND_HANDLE_POOL_SIZE = 8
+# Records passed to mark_dirty() are written once no edit arrived for this long
+DIRTY_FLUSH_DELAY_S = 0.05
+# index.json is rewritten once no index change arrived for this long
+INDEX_FLUSH_DELAY_S = 0.05
+# Parsed records kept in memory, least recently used evicted first
+RECORD_CACHE_MAX_ENTRIES = 32
+# index.json layout; an index written by an older version is rebuilt on startup
+INDEX_VERSION = 2
+# zstd level for compressed state files (fast, ~3-5x smaller than the JSON)
+STATE_ZSTD_LEVEL = 3
+
+
+# fdatasync skips the metadata-only flush where the platform has it
+_datasync = getattr(os, "fdatasync", os.fsync)
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write ``data`` to a temp file next to ``path`` and rename it into place.
+
+    The serialized bytes go to the raw descriptor in one os.write() (looping
+    only on a short write), with no Python-level file buffering in between,
+    and are synced to disk before the rename so a crash leaves either the old
+    file or the complete new one.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            _datasync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _compress(data: bytes) -> bytes:
+    # Compressor objects are not thread-safe; one per call is cheap at this level
+    return zstandard.ZstdCompressor(level=STATE_ZSTD_LEVEL).compress(data)
+
+
+def _decompress(data: bytes) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed document state")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _from_simdjson(value: Any) -> Any:
+    """Copy a simdjson proxy out into plain Python objects (scalars pass through)."""
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    return value
+
+
+_INDEX_RECORD_FIELDS = ("id", "file_id", "title", "source_path", "status", "uploaded_at", "updated_at")
+# Indexed values inside ``state``, as JSON pointers relative to the state object
+_INDEX_STATE_POINTERS = ("/file_metadata", "/structure/ingestion_stats")
+
+
+def _index_entry(record: Dict[str, Any], file_id: Optional[str] = None) -> Dict[str, Any]:
+    """index.json entry for a record: the fields list_documents() serves."""
+    state = record.get("state") or {}
+    return {
+        "id": file_id or record.get("id") or record.get("file_id"),
+        "title": record.get("title", "Untitled"),
+        "status": record.get("status", "unknown"),
+        "uploaded_at": record.get("uploaded_at"),
+        "updated_at": record.get("updated_at"),
+        "source_path": record.get("source_path"),
+        "file_metadata": state.get("file_metadata"),
+        "ingestion_stats": (state.get("structure") or {}).get("ingestion_stats"),
+    }
+
+
+def _scan_fields(data: bytes, parser: Any, pointers: Tuple[str, ...]) -> Dict[str, Any]:
+    """Values at the given JSON pointers of a serialized object (missing ones left out).
+
+    With a simdjson parser only those values are materialized; the rest of the
+    document is never turned into Python objects. No proxy outlives this call,
+    so the parser can be reused for the next file.
+    """
+    found: Dict[str, Any] = {}
+    if parser is None:
+        obj = json_utils.loads(data)
+        for pointer in pointers:
+            value = obj
+            for part in pointer[1:].split("/"):
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is not None:
+                found[pointer] = value
+        return found
+    doc = parser.parse(data)
+    for pointer in pointers:
+        try:
+            value = _from_simdjson(doc.at_pointer(pointer))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if value is not None:
+            found[pointer] = value
+    del doc
+    return found
+
+
+def _scan_index_entry(meta_data: bytes, state_data: Optional[bytes], parser: Any = None) -> Dict[str, Any]:
+    """_index_entry() for a serialized record: its metadata file plus, for split
+    records, its state file (older records keep ``state`` in the metadata file)."""
+    found = _scan_fields(
+        meta_data,
+        parser,
+        tuple("/" + key for key in _INDEX_RECORD_FIELDS)
+        + tuple("/state" + pointer for pointer in _INDEX_STATE_POINTERS),
+    )
+    if state_data is not None:
+        for pointer, value in _scan_fields(state_data, parser, _INDEX_STATE_POINTERS).items():
+            found["/state" + pointer] = value
+    record: Dict[str, Any] = {key: found["/" + key] for key in _INDEX_RECORD_FIELDS if "/" + key in found}
+    record["state"] = {
+        "file_metadata": found.get("/state/file_metadata"),
+        "structure": {"ingestion_stats": found.get("/state/structure/ingestion_stats")},
+    }
+    return _index_entry(record)
+
+
+def _listing(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """list_documents() shape of an index entry."""
+    ingestion_stats = entry.get("ingestion_stats")
+    # Only include essential fields to reduce response size
+    return {
+        "file_id": entry["id"],
+        "source_path": entry.get("source_path"),
+        "status": entry.get("status", "unknown"),
+        "updated_at": entry.get("updated_at"),
+        "file_metadata": entry.get("file_metadata"),
+        # Include minimal state for Phase 2 filtering
+        "state": {
+            "structure": {
+                "ingestion_stats": ingestion_stats,
+            },
+        } if ingestion_stats else {},
+    }
+
+
+# Item lists in document state that carry ids (and block ids)
+ITEM_COLLECTIONS = ("comments", "ai_suggestions", "chat_messages")
+# Derived keys older versions stored next to those lists; dropped when a record is read
+_LEGACY_DERIVED_SUFFIXES = ("_index", "_by_block", "_seq")
+# Item lists whose id and block lookups are kept in memory
+DERIVED_INDEX_MAX_ENTRIES = 256
+
+# id(list) -> (list, length, item id -> position). Derived lookups live here and
+# never in the state that is saved or served; the list is held so its id cannot
+# be reused while it is cached.
+_ID_INDEXES: "OrderedDict[int, Tuple[List[Dict[str, Any]], int, Dict[str, int]]]" = OrderedDict()
+# id(list) -> (list, length, block id -> positions)
+_BLOCK_INDEXES: "OrderedDict[int, Tuple[List[Dict[str, Any]], int, Dict[str, List[int]]]]" = OrderedDict()
+_DERIVED_INDEX_LOCK = threading.Lock()
+
+_ID_SEQ = re.compile(r"[a-z]+(\d+)_")
+
+
+def _derived_index(
+    cache: "OrderedDict[int, Tuple[Any, int, Any]]",
+    items: List[Dict[str, Any]],
+    build: Callable[[List[Dict[str, Any]]], Any],
+    rebuild: bool = False,
+) -> Any:
+    """Cached ``build(items)`` for this list object, rebuilt when its length changed."""
+    key = id(items)
+    if not rebuild:
+        with _DERIVED_INDEX_LOCK:
+            cached = cache.get(key)
+            if cached is not None and cached[0] is items and cached[1] == len(items):
+                cache.move_to_end(key)
+                return cached[2]
+    index = build(items)
+    with _DERIVED_INDEX_LOCK:
+        cache[key] = (items, len(items), index)
+        cache.move_to_end(key)
+        while len(cache) > DERIVED_INDEX_MAX_ENTRIES:
+            cache.popitem(last=False)
+    return index
+
+
+def _build_id_index(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    index: Dict[str, int] = {}
+    for pos, item in enumerate(items):
+        index.setdefault(item.get("id"), pos)
+    return index
+
+
+def drop_derived_keys(state: Dict[str, Any]) -> None:
+    """Remove derived lookups that older versions persisted into ``state``."""
+    for key in ITEM_COLLECTIONS:
+        for suffix in _LEGACY_DERIVED_SUFFIXES:
+            state.pop(f"{key}{suffix}", None)
+
+
+def find_by_id(state: Dict[str, Any], key: str, item_id: str) -> Optional[int]:
+    """Return the position of ``item_id`` in ``state[key]``, or None.
+
+    Uses an in-memory id index per list. The index is checked against the item
+    it points at, and rebuilt when the list was edited in place since it was
+    built (or the id is not in it).
+    """
+    items = state.get(key)
+    if not items:
+        return None
+    pos = _derived_index(_ID_INDEXES, items, _build_id_index).get(item_id)
+    if pos is not None and pos < len(items) and items[pos].get("id") == item_id:
+        return pos
+    return _derived_index(_ID_INDEXES, items, _build_id_index, rebuild=True).get(item_id)
 
-def _timestamp() -> str:
-    """Get current timestamp in ISO format."""
-    return datetime.utcnow().isoformat() + "Z"
+
+def _build_block_index(items: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    by_block: Dict[str, List[int]] = {}
+    for pos, item in enumerate(items):
+        by_block.setdefault(item.get("block_id") or "", []).append(pos)
+    return by_block
+
+
+def items_for_block(state: Dict[str, Any], key: str, block_id: str) -> List[Dict[str, Any]]:
+    """Items of ``state[key]`` on ``block_id``, in list order.
+
+    Uses an in-memory block index per list, rebuilt when the list changed
+    length or an indexed position no longer holds an item on that block.
+    """
+    items = state.get(key)
+    if not items:
+        return []
+    positions = _derived_index(_BLOCK_INDEXES, items, _build_block_index).get(block_id, ())
+    found = [items[pos] for pos in positions if pos < len(items)]
+    if len(found) != len(positions) or any((item.get("block_id") or "") != block_id for item in found):
+        positions = _derived_index(_BLOCK_INDEXES, items, _build_block_index, rebuild=True).get(block_id, ())
+        found = [items[pos] for pos in positions]
+    return found
+
+
+def next_seq(state: Dict[str, Any], key: str) -> int:
+    """Next id sequence number for ``state[key]``: one past the highest number
+    in the existing ids (see make_id()).
+
+    A number freed by deleting the newest item can be handed out again, but
+    the id still differs by its millisecond timestamp.
+    """
+    highest = 0
+    for item in state.get(key) or []:
+        match = _ID_SEQ.match(str(item.get("id") or ""))
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest + 1
+
+
+def make_id(prefix: str, seq: int, ts_ms: int) -> str:
+    """Build an item id such as ``c12_1700000000000``."""
+    return f"{prefix}{seq}_{ts_ms}"
+
+
+def _with_appended(record: Dict[str, Any], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copy of ``record`` with the append-log ``entries`` added; ``record`` and
+    the lists in its state are left untouched (items themselves are shared)."""
+    original = record.get("state") or {}
+    state = dict(original)
+    for key in {entry["key"] for entry in entries}:
+        state[key] = list(original.get(key) or [])
+    for entry in entries:
+        state[entry["key"]].append(entry["item"])
+    return {**record, "state": state}
+
+
+# Stores with possibly unwritten changes, flushed once at interpreter exit;
+# held weakly so a discarded store is not kept alive for the whole process
+_OPEN_STORES: "weakref.WeakSet[DocReviewStore]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_stores() -> None:
+    for store in list(_OPEN_STORES):
+        # Records first, then the index entries they touch
+        store.flush()
+        store.flush_index()
 
 
 class DocReviewStore:
     """File-based JSON storage for document review runs."""
 
-    def __init__(self, data_dir: str = "data/documents"):
+    def __init__(
+        self,
+        data_dir: str = "data/documents",
+        pretty: bool = False,
+        compress: bool = True,
+        llm_cache_dir: Optional[str] = None,
+    ):
         self.data_dir = Path(data_dir)
+        # Per-document LLM response caches (<llm_cache_dir>/<file_id>/), removed
+        # with the document
+        self.llm_cache_dir = Path(llm_cache_dir) if llm_cache_dir else None
+        # Files are written compact; indent them only when they are meant to be read by hand
+        self.pretty = pretty
+        # State files are written zstd-compressed when zstandard is installed;
+        # either kind is read back regardless of this setting
+        self.compress = compress and zstandard is not None
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.index_file = self.data_dir / "index.json"
+        # file_id -> (_record_version(), parsed record), least recently used first; see load()
+        self._record_cache: "OrderedDict[str, Tuple[Tuple[int, int, int], Dict[str, Any]]]" = OrderedDict()
+        self._record_cache_lock = threading.Lock()
+        # file_id -> open append-log handle, least recently used first
+        self._append_handles: "OrderedDict[str, Any]" = OrderedDict()
+        self._append_handles_lock = threading.Lock()
+        # file_id -> edited record not yet written, and its pending flush timer
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._flush_timers: Dict[str, threading.Timer] = {}
+        self._dirty_lock = threading.RLock()
+        # (file_id, key) -> next id sequence number for append_new_items();
+        # guarded by _dirty_lock and dropped whenever the record is replaced
+        self._next_seqs: Dict[Tuple[str, str], int] = {}
+        # file_id -> index.json entry; loaded once, written back shortly after
+        # each change
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._index_lock = threading.Lock()
+        self._index_dirty = False
+        self._index_timer: Optional[threading.Timer] = None
         self._ensure_index()
+        _OPEN_STORES.add(self)
 
     def _ensure_index(self):
-        """Ensure index.json exists."""
-        if not self.index_file.exists():
-            with open(self.index_file, 'w') as f:
-                json.dump({"documents": []}, f, indent=2)
+        """Load index.json into memory, rebuilding it if missing or outdated."""
+        try:
+            index = json_utils.loads(self.index_file.read_bytes())
+        except FileNotFoundError:
+            index = None
+        except json.JSONDecodeError:
+            logger.warning("Unreadable %s, rebuilding it", self.index_file)
+            index = None
+        if index is None or index.get("version") != INDEX_VERSION:
+            self.rebuild_index()
+            return
+        self._index = {entry["id"]: entry for entry in index.get("documents", [])}
+
+    def _sorted_index(self) -> List[Dict[str, Any]]:
+        """Index entries in file_id order (the old directory scan order); caller holds _index_lock."""
+        return [self._index[file_id] for file_id in sorted(self._index)]
+
+    def _flush_index(self) -> None:
+        """Write the in-memory index; caller holds _index_lock."""
+        if self._index_timer is not None:
+            self._index_timer.cancel()
+            self._index_timer = None
+        self._index_dirty = False
+        index = {"version": INDEX_VERSION, "documents": self._sorted_index()}
+        _atomic_write_bytes(self.index_file, json_utils.dumps_bytes(index, indent=self.pretty))
+
+    def _index_changed(self) -> None:
+        """Schedule an index write; caller holds _index_lock.
+
+        Changes arriving within INDEX_FLUSH_DELAY_S of each other are written
+        together.
+        """
+        self._index_dirty = True
+        if self._index_timer is not None:
+            return
+        self._index_timer = threading.Timer(INDEX_FLUSH_DELAY_S, self.flush_index)
+        self._index_timer.daemon = True
+        self._index_timer.start()
+
+    def flush_index(self) -> None:
+        """Write index.json now if it has unwritten changes."""
+        with self._index_lock:
+            if self._index_dirty:
+                self._flush_index()
+
+    def rebuild_index(self) -> None:
+        """Recreate index.json from the document files (recovery / upgrade)."""
+        entries: Dict[str, Dict[str, Any]] = {}
+        # One parser per call (parsers are not thread-safe), reused across files
+        parser = simdjson.Parser() if simdjson is not None else None
+        for path in sorted(self.data_dir.glob("*.json")):
+            if path.name == "index.json" or path.name.endswith(".state.json"):
+                continue
+            try:
+                state_data = self._read_state_bytes(path.stem)
+                entry = _scan_index_entry(path.read_bytes(), state_data, parser)
+            except Exception as exc:
+                logger.error("Failed to read doc review state %s: %s", path, exc)
+                continue
+            entry["id"] = entry["id"] or path.stem
+            entries[entry["id"]] = entry
+        with self._index_lock:
+            self._index = entries
+            self._flush_index()
 
     def _doc_file(self, file_id: str) -> Path:
-        """Get path to document JSON file."""
+        """Get path to document JSON file (record metadata; the state is kept separately)."""
         return self.data_dir / f"{file_id}.json"
 
+    def _state_file(self, file_id: str, compressed: Optional[bool] = None) -> Path:
+        """Get path to the document's state JSON file (the store's own format by default)."""
+        if compressed is None:
+            compressed = self.compress
+        return self.data_dir / (f"{file_id}.state.json.zst" if compressed else f"{file_id}.state.json")
+
+    def _state_files(self, file_id: str) -> Tuple[Path, Path]:
+        """Both possible state file paths, the store's own format first."""
+        return (self._state_file(file_id), self._state_file(file_id, not self.compress))
+
+    def _read_state_bytes(self, file_id: str) -> Optional[bytes]:
+        """Serialized state JSON (decompressed if need be), or None if there is no state file."""
+        for path in self._state_files(file_id):
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                continue
+            return _decompress(data) if path.suffix == ".zst" else data
+        return None
+
+    def _append_log_file(self, file_id: str) -> Path:
+        """Get path to the append-only sidecar log for a document."""
+        return self.data_dir / f"{file_id}.log.jsonl"
+
     def _source_file(self, file_id: str) -> Path:
         """Get path to source PDF file."""
         return self.data_dir / f"{file_id}_source.pdf"
 
     def _update_index(self, file_id: str, doc_data: Dict[str, Any]):
-        """Update the index.json file."""
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        
-        docs = [d for d in index["documents"] if d["id"] != file_id]
-        docs.append({
-            "id": file_id,
-            "title": doc_data.get("title", "Untitled"),
-            "status": doc_data.get("status", "unknown"),
-            "uploaded_at": doc_data.get("uploaded_at"),
-            "updated_at": doc_data.get("updated_at"),
-        })
-        index["documents"] = sorted(docs, key=lambda x: x.get("updated_at", ""), reverse=True)
-        
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f, indent=2)
+        """Update the index.json file.
+
+        ``doc_data`` may be metadata only (no ``state``), in which case the
+        state-derived fields of the existing entry are kept.
+        """
+        entry = _index_entry(doc_data, file_id)
+        with self._index_lock:
+            previous = self._index.get(file_id)
+            if "state" not in doc_data and previous is not None:
+                entry["file_metadata"] = previous.get("file_metadata")
+                entry["ingestion_stats"] = previous.get("ingestion_stats")
+            self._index[file_id] = entry
+            self._index_changed()
 
     def list_documents(self) -> List[Dict[str, Any]]:
-        """List all documents (returns minimal metadata for performance)."""
-        documents: List[Dict[str, Any]] = []
-        for path in sorted(self.data_dir.glob("*.json")):
-            if path.name == "index.json":
-                continue
-            try:
-                with path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                state = data.get("state", {})
-                # Only include essential fields to reduce response size
-                metadata = {
-                    "file_id": data.get("id") or data.get("file_id"),
-                    "source_path": data.get("source_path"),
-                    "status": data.get("status", "unknown"),
-                    "updated_at": data.get("updated_at"),
-                    "file_metadata": state.get("file_metadata"),
-                    # Include minimal state for Phase 2 filtering
-                    "state": {
-                        "structure": {
-                            "ingestion_stats": state.get("structure", {}).get("ingestion_stats"),
-                        },
-                    } if state.get("structure", {}).get("ingestion_stats") else {},
-                }
-                documents.append(metadata)
-            except Exception as exc:
-                logger.error("Failed to read doc review state %s: %s", path, exc)
-        return documents
+        """List all documents by file_id (minimal metadata, served from the index)."""
+        with self._index_lock:
+            return [_listing(entry) for entry in self._sorted_index()]
+
+    def exists(self, file_id: str) -> bool:
+        """Whether a document record exists for file_id."""
+        return self._doc_file(file_id).exists()
+
+    def load(self, file_id: str, readonly: bool = False) -> Optional[Dict[str, Any]]:
+        """Load a document by file_id.
 
-    def load(self, file_id: str) -> Optional[Dict[str, Any]]:
-        """Load a document by file_id."""
+        A record is stored as a small metadata file plus a state file (records
+        written before the split keep ``state`` inside the metadata file).
+        Parsed records are cached per file and reused while both files' mtimes
+        and the append log are unchanged. With ``readonly=True`` the shared cached
+        record is returned and must not be modified; otherwise the caller gets
+        its own copy. Records waiting in mark_dirty() are served from memory.
+
+        Cached and pending records are never edited once handed out: writers
+        replace them with new objects (see save_record(), mark_dirty() and
+        append_items()), so a readonly record stays a consistent snapshot.
+        """
+        with self._dirty_lock:
+            pending = self._dirty.get(file_id)
+            if pending is not None:
+                return pending if readonly else copy.deepcopy(pending)
+
+        version = self._record_version(file_id)
+        if version is None:
+            self._forget_record(file_id)
+            return None
+
+        record = self._cached_record(file_id, version)
+        if record is None:
+            record = self._read_record(file_id)
+            if version[2]:
+                self._replay_append_log(file_id, record)
+            self._remember_record(file_id, version, record)
+        return record if readonly else copy.deepcopy(record)
+
+    def _read_record(self, file_id: str) -> Dict[str, Any]:
+        """Parse a record from its metadata and state files."""
+        record = json_utils.loads(self._doc_file(file_id).read_bytes())
+        if "state" not in record:
+            state_data = self._read_state_bytes(file_id)
+            record["state"] = json_utils.loads(state_data) if state_data is not None else {}
+        if isinstance(record["state"], dict):
+            drop_derived_keys(record["state"])
+        return record
+
+    def _write_record(self, file_id: str, record: Dict[str, Any]) -> None:
+        """Write the state file, then the metadata file (which marks the record as present)."""
         path = self._doc_file(file_id)
-        if not path.exists():
+        ensure_directory(path.parent)
+        state_data = json_utils.dumps_bytes(record.get("state") or {}, indent=self.pretty)
+        state_path, other_state_path = self._state_files(file_id)
+        _atomic_write_bytes(state_path, _compress(state_data) if self.compress else state_data)
+        # Drop a copy left in the other format, so it can never be read back stale
+        other_state_path.unlink(missing_ok=True)
+        meta = {key: value for key, value in record.items() if key != "state"}
+        _atomic_write_bytes(path, json_utils.dumps_bytes(meta, indent=self.pretty))
+
+    def _record_version(self, file_id: str) -> Optional[Tuple[int, int, int]]:
+        """(metadata st_mtime_ns, state st_mtime_ns, append log size), or None if
+        the document is missing."""
+        try:
+            mtime_ns = self._doc_file(file_id).stat().st_mtime_ns
+        except FileNotFoundError:
             return None
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        state_mtime_ns = 0
+        for state_path in self._state_files(file_id):
+            try:
+                state_mtime_ns = state_path.stat().st_mtime_ns
+                break
+            except FileNotFoundError:
+                continue
+        try:
+            log_size = self._append_log_file(file_id).stat().st_size
+        except FileNotFoundError:
+            log_size = 0
+        return (mtime_ns, state_mtime_ns, log_size)
+
+    def _cached_record(self, file_id: str, version: Tuple[int, int, int]) -> Optional[Dict[str, Any]]:
+        """The cached record for file_id if it was cached at ``version``."""
+        with self._record_cache_lock:
+            cached = self._record_cache.get(file_id)
+            if cached is None or cached[0] != version:
+                return None
+            self._record_cache.move_to_end(file_id)
+            return cached[1]
+
+    def _remember_record(self, file_id: str, version: Tuple[int, int, int], record: Dict[str, Any]) -> None:
+        with self._record_cache_lock:
+            self._record_cache[file_id] = (version, record)
+            self._record_cache.move_to_end(file_id)
+            while len(self._record_cache) > RECORD_CACHE_MAX_ENTRIES:
+                self._record_cache.popitem(last=False)
+
+    def _forget_record(self, file_id: str) -> None:
+        with self._record_cache_lock:
+            self._record_cache.pop(file_id, None)
+
+    def _cache_record(self, file_id: str, record: Dict[str, Any]) -> None:
+        """Write-through: remember a record that matches what is on disk."""
+        version = self._record_version(file_id)
+        if version is not None:
+            self._remember_record(file_id, version, record)
+
+    def append_items(
+        self,
+        file_id: str,
+        key: str,
+        items: List[Dict[str, Any]],
+    ) -> bool:
+        """Append ``items`` to ``state[key]`` without rewriting the whole record.
+
+        Items are written as JSON lines to the document's sidecar log (one write
+        per call), which load() replays and save_record() folds back into the
+        main file. Returns False if the document does not exist.
+        """
+        if not items:
+            return self.exists(file_id)
+
+        ts = utc_timestamp()
+        entries = [{"key": key, "item": item, "ts": ts} for item in items]
+        data = b"".join(json_utils.dumps_bytes(entry) + b"\n" for entry in entries)
+        with self._dirty_lock:
+            version = self._record_version(file_id)
+            if version is None:
+                return False
+            self._write_append_log(file_id, data)
+            # Pending and cached records may be held by load(readonly=True)
+            # callers, so the appended record is a new object, never an edit
+            pending = self._dirty.get(file_id)
+            if pending is not None:
+                # The next flush writes these with the rest of the record
+                self._dirty[file_id] = _with_appended(pending, entries)
+                return True
+            cached = self._cached_record(file_id, version)
+            if cached is not None:
+                self._cache_record(file_id, _with_appended(cached, entries))
+            else:
+                self._forget_record(file_id)
+
+        if version[2] + len(data) > APPEND_LOG_COMPACT_BYTES:
+            record = self.load(file_id)
+            if record is not None:
+                # load() returned a private copy the store can keep
+                self._write_owned_record(file_id, record)
+        return True
+
+    def append_new_items(
+        self,
+        file_id: str,
+        key: str,
+        build: Callable[[int], List[Dict[str, Any]]],
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Append the items ``build(first_seq)`` returns, numbered from the next
+        free id sequence number of ``state[key]`` (see next_seq()).
+
+        Numbering and the append happen under one lock, so concurrent adds never
+        share an id; after the first add the next number comes from a counter
+        rather than a scan of the existing ids. Returns the items, or None if
+        the document does not exist.
+        """
+        with self._dirty_lock:
+            if not self.exists(file_id):
+                return None
+            first_seq = self._next_seqs.get((file_id, key))
+            if first_seq is None:
+                record = self.load(file_id, readonly=True)
+                first_seq = next_seq((record or {}).get("state") or {}, key)
+            items = build(first_seq)
+            if not self.append_items(file_id, key, items):
+                return None
+            self._next_seqs[(file_id, key)] = first_seq + len(items)
+        return items
+
+    def _write_append_log(self, file_id: str, data: bytes) -> None:
+        """Append ``data`` to the document's log through a pooled file handle."""
+        path = self._append_log_file(file_id)
+        with self._append_handles_lock:
+            handle = self._append_handles.pop(file_id, None)
+            if handle is not None:
+                # Reopen if the log was compacted or removed behind this handle
+                try:
+                    current = os.stat(path).st_ino == os.fstat(handle.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if not current:
+                    handle.close()
+                    handle = None
+            if handle is None:
+                handle = path.open("ab")
+            self._append_handles[file_id] = handle
+            while len(self._append_handles) > APPEND_HANDLE_POOL_SIZE:
+                _, evicted = self._append_handles.popitem(last=False)
+                evicted.close()
+            handle.write(data)
+            handle.flush()
+
+    def _drop_append_log(self, file_id: str) -> None:
+        """Close any pooled handle and remove the document's append log."""
+        with self._append_handles_lock:
+            handle = self._append_handles.pop(file_id, None)
+            if handle is not None:
+                handle.close()
+            self._append_log_file(file_id).unlink(missing_ok=True)
+
+    @staticmethod
+    def _apply_appended(record: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        state = record.setdefault("state", {})
+        state.setdefault(entry["key"], []).append(entry["item"])
+
+    def _replay_append_log(self, file_id: str, record: Dict[str, Any]) -> None:
+        """Apply the sidecar log to a freshly parsed record."""
+        try:
+            data = self._append_log_file(file_id).read_bytes()
+        except FileNotFoundError:
+            return
+        state = record.setdefault("state", {})
+        seen: Dict[str, set] = {}
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json_utils.loads(line)
+            except json.JSONDecodeError:
+                # A torn trailing line from an interrupted append
+                logger.warning("Skipping unreadable append log line for %s", file_id)
+                continue
+            key, item = entry["key"], entry["item"]
+            if key not in seen:
+                seen[key] = {existing.get("id") for existing in state.get(key) or []}
+            # save() writes the full state without truncating the log, so an
+            # item can already be present in the main file
+            if item.get("id") in seen[key]:
+                continue
+            seen[key].add(item.get("id"))
+            self._apply_appended(record, entry)
+            record["updated_at"] = entry.get("ts") or record.get("updated_at")
 
     def save(self, file_id: str, source_path: str, state: AgentState, status: str) -> Dict[str, Any]:
         """Save a document."""
@@ -109,8 +738,11 @@ class DocReviewStore:
         title = state.get("doc_meta", {}).get("doc_title", "Untitled")
         
         # Check if document already exists
-        existing = self.load(file_id)
-        uploaded_at = existing.get("uploaded_at") if existing else _timestamp()
+        existing = self.load(file_id, readonly=True)
+        with self._dirty_lock:
+            # The full state written below replaces any pending edit
+            self._discard_dirty(file_id)
+        uploaded_at = existing.get("uploaded_at") if existing else utc_timestamp()
         
         payload = {
             "id": file_id,
@@ -119,14 +751,13 @@ class DocReviewStore:
             "source_path": str(source_path),
             "status": status,
             "uploaded_at": uploaded_at,
-            "updated_at": _timestamp(),
+            "updated_at": utc_timestamp(),
             "state": state,
         }
         
-        path = self._doc_file(file_id)
-        ensure_directory(path.parent)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2)
+        self._write_record(file_id, payload)
+        # The payload shares ``state`` with the caller, so it cannot be cached
+        self._forget_record(file_id)
         
         # Update index
         self._update_index(file_id, payload)
@@ -134,11 +765,90 @@ class DocReviewStore:
         logger.info(f"Saved document {file_id} with status {status}")
         return payload
 
+    def save_record(self, file_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a record that was loaded and edited in place by the caller.
+
+        The store caches its own snapshot of the record, so the caller may keep
+        editing ``record`` afterwards.
+        """
+        record["updated_at"] = utc_timestamp()
+        self._write_owned_record(file_id, copy.deepcopy(record))
+        return record
+
+    def _write_owned_record(self, file_id: str, record: Dict[str, Any]) -> None:
+        """Write ``record`` and cache it; the store takes ownership of the object."""
+        with self._dirty_lock:
+            # This write supersedes any pending edit for the document
+            self._discard_dirty(file_id)
+            self._write_record(file_id, record)
+            # Records passed here were loaded with the append log applied
+            self._drop_append_log(file_id)
+            self._cache_record(file_id, record)
+        
+        self._update_index(file_id, record)
+
+    def mark_dirty(self, file_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Like save_record(), but write after a short idle delay.
+
+        A burst of edits to the same document (resolving several comments,
+        reviewing a batch of suggestions) is coalesced into one write. load()
+        returns the pending record until then; call flush() where the edit has
+        to be on disk before responding. As with save_record(), the pending
+        record is a snapshot and later edits to ``record`` do not reach it.
+        """
+        record["updated_at"] = utc_timestamp()
+        pending = copy.deepcopy(record)
+        with self._dirty_lock:
+            self._forget_seqs(file_id)
+            self._dirty[file_id] = pending
+            timer = self._flush_timers.pop(file_id, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(DIRTY_FLUSH_DELAY_S, self.flush, args=(file_id,))
+            timer.daemon = True
+            self._flush_timers[file_id] = timer
+            timer.start()
+        return record
+
+    def flush(self, file_id: Optional[str] = None) -> None:
+        """Write pending mark_dirty() records (all documents if file_id is None)."""
+        with self._dirty_lock:
+            file_ids = [file_id] if file_id is not None else list(self._dirty)
+            for pending_id in file_ids:
+                record = self._dirty.get(pending_id)
+                if record is None:
+                    continue
+                if not self._doc_file(pending_id).exists():
+                    # Deleted while the edit was pending
+                    self._discard_dirty(pending_id)
+                    continue
+                self._write_owned_record(pending_id, record)
+
+    def _forget_seqs(self, file_id: str) -> None:
+        """Drop id counters for file_id; caller holds _dirty_lock."""
+        for key in ITEM_COLLECTIONS:
+            self._next_seqs.pop((file_id, key), None)
+
+    def _discard_dirty(self, file_id: str) -> None:
+        """Drop a pending record and cancel its flush; caller holds _dirty_lock."""
+        # Every caller is about to replace or remove the record
+        self._forget_seqs(file_id)
+        self._dirty.pop(file_id, None)
+        timer = self._flush_timers.pop(file_id, None)
+        if timer is not None:
+            timer.cancel()
+
     def delete(self, file_id: str) -> bool:
-        """Delete a document and its source file."""
+        """Delete a document, its source file and its cached LLM responses."""
         doc_path = self._doc_file(file_id)
         source_path = self._source_file(file_id)
+        for state_path in self._state_files(file_id):
+            state_path.unlink(missing_ok=True)
         
+        with self._dirty_lock:
+            self._discard_dirty(file_id)
+        self._forget_record(file_id)
+        self._drop_append_log(file_id)
         deleted = False
         if doc_path.exists():
             doc_path.unlink()
@@ -146,32 +856,56 @@ class DocReviewStore:
         
         if source_path.exists():
             source_path.unlink()
+        # file_id comes from the URL; never let it name anything but a child directory
+        if self.llm_cache_dir is not None and file_id not in ("", ".", "..") and Path(file_id).name == file_id:
+            shutil.rmtree(self.llm_cache_dir / file_id, ignore_errors=True)
         
         # Update index
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index["documents"] = [d for d in index["documents"] if d["id"] != file_id]
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f, indent=2)
+        with self._index_lock:
+            if self._index.pop(file_id, None) is not None:
+                self._index_changed()
         
         return deleted
 
     def update_status(self, file_id: str, status: str) -> bool:
-        """Update document status."""
+        """Update document status.
+
+        Only the metadata file is rewritten, unless the record has a pending
+        mark_dirty() edit or still has its state inline (older records).
+        """
+        with self._dirty_lock:
+            pending = file_id in self._dirty
+        if not pending:
+            try:
+                meta = json_utils.loads(self._doc_file(file_id).read_bytes())
+            except FileNotFoundError:
+                return False
+            if "state" not in meta:
+                self._update_meta(file_id, meta, status=status)
+                return True
+        
         doc = self.load(file_id)
         if not doc:
             return False
         
         doc["status"] = status
-        doc["updated_at"] = _timestamp()
-        
-        path = self._doc_file(file_id)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(doc, f, indent=2)
-        
-        self._update_index(file_id, doc)
+        self.save_record(file_id, doc)
         return True
 
+    def _update_meta(self, file_id: str, meta: Dict[str, Any], **changes: Any) -> None:
+        """Rewrite a split record's metadata file, leaving its state file alone."""
+        version = self._record_version(file_id)
+        meta.update(changes)
+        meta["updated_at"] = utc_timestamp()
+        _atomic_write_bytes(self._doc_file(file_id), json_utils.dumps_bytes(meta, indent=self.pretty))
+        cached = self._cached_record(file_id, version) if version is not None else None
+        if cached is not None:
+            # Same state as before; readonly callers may still hold the old dict
+            self._cache_record(file_id, {**cached, **meta})
+        else:
+            self._forget_record(file_id)
+        self._update_index(file_id, meta)
+
     def update_markdown(
         self,
         file_id: str,
@@ -204,11 +938,38 @@ class DocReviewStore:
             state["rejected_suggestions"] = rejected_suggestions
         
         doc["state"] = state
-        doc["updated_at"] = _timestamp()
-        
-        path = self._doc_file(file_id)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(doc, f, indent=2)
-        
-        self._update_index(file_id, doc)
+        self.save_record(file_id, doc)
         return True
+
+
+T = TypeVar("T")
+
+
+class StateCollectionManager:
+    """Base for the managers that keep a collection (comments, AI suggestions,
+    chat messages) inside the document state."""
+
+    def __init__(self, store: DocReviewStore):
+        self.store = store
+
+    def _get_state(self, file_id: str) -> Dict[str, Any]:
+        """Get the (read-only) document state, or an empty dict."""
+        record = self.store.load(file_id, readonly=True)
+        if not record:
+            return {}
+        return record.get("state") or {}
+
+    def _mutate(self, file_id: str, mutator: Callable[[Dict[str, Any]], T]) -> T:
+        """
+        Load the record once, let ``mutator`` edit its state in place, and hand
+        the record back to the store only if the mutator returns a truthy result.
+        The write is debounced (see DocReviewStore.mark_dirty).
+        """
+        record = self.store.load(file_id)
+        if not record:
+            return mutator({})
+
+        result = mutator(record.setdefault("state", {}))
+        if result:
+            self.store.mark_dirty(file_id, record)
+        return result
@@ -0,0 +1,430 @@
+"""SQLite storage for per-document comments, AI suggestions and chat messages.
+
+Opt-in alternative (``ENTITY_STORE: sqlite``) to keeping these collections
+inside each document's JSON record. Every comment/suggestion/message is its own
+row, so adding, updating or deleting one item never touches the rest of the
+document. The agent state itself stays in the JSON store.
+
+The managers here expose the same methods as CommentsManager,
+AISuggestionsManager and ChatHistoryManager and build items the same way.
+Items a document already holds in its JSON record are copied into the
+tables the first time the document is accessed here.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from core.ai_suggestions import build_suggestions
+from core.chat_history import build_messages
+from core.comments import build_comments
+from core.store import DocReviewStore, make_id, next_seq
+from tools import json_utils
+from tools.time_utils import utc_timestamp
+
+# One table per collection; rows keep insertion order through the rowid (pos)
+ENTITY_TABLES = ("comments", "ai_suggestions", "chat_messages")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    pos INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    block_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS {table}_file_id ON {table} (file_id, id);
+CREATE INDEX IF NOT EXISTS {table}_file_block ON {table} (file_id, block_id);
+"""
+
+_SEQ_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entity_seq (
+    file_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (file_id, kind)
+);
+"""
+
+# Documents whose JSON-record items were copied in (see import_state)
+_IMPORTED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imported_documents (
+    file_id TEXT PRIMARY KEY
+);
+"""
+
+
+class SQLiteEntityStore:
+    """Row-per-item storage for the append-heavy per-document collections."""
+
+    def __init__(self, db_path: str = "data/documents/entities.sqlite3"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        # Documents whose JSON-record items are known to be in the tables
+        self._imported: set = set()
+        self._import_lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SEQ_SCHEMA)
+            conn.executescript(_IMPORTED_SCHEMA)
+            for table in ENTITY_TABLES:
+                conn.executescript(_SCHEMA.format(table=table))
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _table(kind: str) -> str:
+        if kind not in ENTITY_TABLES:
+            raise ValueError(f"Unknown entity collection: {kind}")
+        return kind
+
+    def list(self, kind: str, file_id: str, block_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        table = self._table(kind)
+        if block_id:
+            rows = self._conn().execute(
+                f"SELECT data FROM {table} WHERE file_id = ? AND block_id = ? ORDER BY pos",
+                (file_id, block_id),
+            )
+        else:
+            rows = self._conn().execute(
+                f"SELECT data FROM {table} WHERE file_id = ? ORDER BY pos", (file_id,)
+            )
+        return [json_utils.loads(data) for (data,) in rows]
+
+    def get(self, kind: str, file_id: str, item_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            f"SELECT data FROM {self._table(kind)} WHERE file_id = ? AND id = ?",
+            (file_id, item_id),
+        ).fetchone()
+        return json_utils.loads(row[0]) if row else None
+
+    def reserve_seq(self, kind: str, file_id: str, count: int) -> int:
+        """Reserve ``count`` id sequence numbers and return the first one.
+
+        A single upsert reads and bumps the counter, so concurrent writers
+        (threads or processes) never reserve the same numbers.
+        """
+        conn = self._conn()
+        with conn:
+            (last,) = conn.execute(
+                "INSERT INTO entity_seq (file_id, kind, seq) VALUES (?, ?, ?) "
+                "ON CONFLICT (file_id, kind) DO UPDATE SET seq = seq + excluded.seq "
+                "RETURNING seq",
+                (file_id, kind, count),
+            ).fetchone()
+        return last - count + 1
+
+    def import_state(self, file_id: str, load_state: Callable[[], Optional[Dict[str, Any]]]) -> None:
+        """Copy the collections kept in a document's JSON state into the tables, once.
+
+        ``load_state`` returns the document state, or None if the document does
+        not exist (nothing is imported or recorded then). Later imports of the
+        same document are skipped, including across restarts.
+        """
+        if file_id in self._imported:
+            return
+        with self._import_lock:
+            if file_id in self._imported:
+                return
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT 1 FROM imported_documents WHERE file_id = ?", (file_id,)
+            ).fetchone()
+            if row is None:
+                state = load_state()
+                if state is None:
+                    return
+                with conn:
+                    for table in ENTITY_TABLES:
+                        items = [item for item in state.get(table) or [] if item.get("id")]
+                        if not items:
+                            continue
+                        conn.executemany(
+                            f"INSERT OR IGNORE INTO {table} (file_id, id, block_id, data) VALUES (?, ?, ?, ?)",
+                            [
+                                (file_id, item["id"], item.get("block_id"), json_utils.dumps(item))
+                                for item in items
+                            ],
+                        )
+                        # New ids continue after the imported ones
+                        conn.execute(
+                            "INSERT INTO entity_seq (file_id, kind, seq) VALUES (?, ?, ?) "
+                            "ON CONFLICT (file_id, kind) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                            (file_id, table, next_seq(state, table) - 1),
+                        )
+                    conn.execute("INSERT INTO imported_documents (file_id) VALUES (?)", (file_id,))
+            self._imported.add(file_id)
+
+    def insert(self, kind: str, file_id: str, items: Iterable[Dict[str, Any]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                f"INSERT INTO {self._table(kind)} (file_id, id, block_id, data) VALUES (?, ?, ?, ?)",
+                [
+                    (file_id, item["id"], item.get("block_id"), json_utils.dumps(item))
+                    for item in items
+                ],
+            )
+
+    def replace(self, kind: str, file_id: str, item: Dict[str, Any]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"UPDATE {self._table(kind)} SET data = ? WHERE file_id = ? AND id = ?",
+                (json_utils.dumps(item), file_id, item["id"]),
+            )
+
+    def delete(self, kind: str, file_id: str, item_id: Optional[str] = None) -> int:
+        """Delete one item, or every item of ``kind`` for the document. Returns the row count."""
+        conn = self._conn()
+        table = self._table(kind)
+        with conn:
+            if item_id is None:
+                cursor = conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+            else:
+                cursor = conn.execute(
+                    f"DELETE FROM {table} WHERE file_id = ? AND id = ?", (file_id, item_id)
+                )
+        return cursor.rowcount
+
+    def delete_document(self, file_id: str) -> None:
+        """Remove every collection row (and id counter) for a deleted document."""
+        conn = self._conn()
+        with self._import_lock:
+            with conn:
+                for table in ENTITY_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+                conn.execute("DELETE FROM entity_seq WHERE file_id = ?", (file_id,))
+                # A new document under the same id imports its own JSON items
+                conn.execute("DELETE FROM imported_documents WHERE file_id = ?", (file_id,))
+            self._imported.discard(file_id)
+
+
+class _SQLiteCollectionManager:
+    """Shared setup for the SQLite-backed managers."""
+
+    def __init__(self, store: DocReviewStore, entities: SQLiteEntityStore):
+        self.store = store
+        self.entities = entities
+
+    def _import(self, file_id: str) -> None:
+        """Bring in the document's JSON-record items on first access."""
+        self.entities.import_state(file_id, lambda: self._json_state(file_id))
+
+    def _json_state(self, file_id: str) -> Optional[Dict[str, Any]]:
+        record = self.store.load(file_id, readonly=True)
+        if not record:
+            return None
+        return record.get("state") or {}
+
+
+class SQLiteCommentsManager(_SQLiteCollectionManager):
+    """CommentsManager backed by SQLiteEntityStore."""
+
+    def list_comments(self, file_id: str, block_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        self._import(file_id)
+        return self.entities.list("comments", file_id, block_id)
+
+    def add_comment(
+        self,
+        file_id: str,
+        block_id: str,
+        block_title: str,
+        content: str,
+        author: str = "User",
+        selection_text: Optional[str] = None,
+        start_offset: Optional[int] = None,
+        end_offset: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        item: Dict[str, Any] = {
+            "block_id": block_id,
+            "block_title": block_title,
+            "content": content,
+            "author": author,
+            "selection_text": selection_text,
+            "start_offset": start_offset,
+            "end_offset": end_offset,
+        }
+        created = self.add_comments_bulk(file_id, [item])
+        return None if created is None else created[0]
+
+    def add_comments_bulk(self, file_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        if not self.store.exists(file_id):
+            return None
+        self._import(file_id)
+        comments = build_comments(items, self.entities.reserve_seq("comments", file_id, len(items)))
+        self.entities.insert("comments", file_id, comments)
+        return comments
+
+    def add_reply(
+        self,
+        file_id: str,
+        comment_id: str,
+        content: str,
+        author: str = "User",
+    ) -> Optional[Dict[str, Any]]:
+        self._import(file_id)
+        comment = self.entities.get("comments", file_id, comment_id)
+        if comment is None:
+            return None
+        now = time.time()
+        comment["replies"].append(
+            {
+                "id": make_id("r", len(comment["replies"]) + 1, int(now * 1000)),
+                "author": author,
+                "timestamp": utc_timestamp(now),
+                "content": content,
+            }
+        )
+        self.entities.replace("comments", file_id, comment)
+        return comment
+
+    def resolve_comment(self, file_id: str, comment_id: str) -> Optional[Dict[str, Any]]:
+        self._import(file_id)
+        comment = self.entities.get("comments", file_id, comment_id)
+        if comment is None:
+            return None
+        comment["resolved"] = not comment.get("resolved", False)
+        self.entities.replace("comments", file_id, comment)
+        return comment
+
+    def delete_comment(self, file_id: str, comment_id: str) -> bool:
+        self._import(file_id)
+        return self.entities.delete("comments", file_id, comment_id) > 0
+
+    def update_comment(
+        self,
+        file_id: str,
+        comment_id: str,
+        content: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        if content is None:
+            return None
+        self._import(file_id)
+        comment = self.entities.get("comments", file_id, comment_id)
+        if comment is None:
+            return None
+        comment["content"] = content
+        comment["updated_at"] = utc_timestamp()
+        self.entities.replace("comments", file_id, comment)
+        return comment
+
+    def get_comment_count_by_block(self, file_id: str) -> Dict[str, int]:
+        counts = Counter(
+            comment["block_id"]
+            for comment in self.list_comments(file_id)
+            if not comment.get("resolved", False) and comment.get("block_id")
+        )
+        return dict(counts)
+
+
+class SQLiteAISuggestionsManager(_SQLiteCollectionManager):
+    """AISuggestionsManager backed by SQLiteEntityStore."""
+
+    def list_suggestions(self, file_id: str, block_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        self._import(file_id)
+        return self.entities.list("ai_suggestions", file_id, block_id)
+
+    def add_suggestion(
+        self,
+        file_id: str,
+        block_id: str,
+        selection_text: str,
+        improved_text: str,
+        status: str = "pending",
+        start_offset: Optional[int] = None,
+        end_offset: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        item: Dict[str, Any] = {
+            "block_id": block_id,
+            "selection_text": selection_text,
+            "improved_text": improved_text,
+            "status": status,
+            "start_offset": start_offset,
+            "end_offset": end_offset,
+        }
+        created = self.add_suggestions_bulk(file_id, [item])
+        return None if created is None else created[0]
+
+    def add_suggestions_bulk(self, file_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        if not self.store.exists(file_id):
+            return None
+        self._import(file_id)
+        suggestions = build_suggestions(
+            items, self.entities.reserve_seq("ai_suggestions", file_id, len(items))
+        )
+        self.entities.insert("ai_suggestions", file_id, suggestions)
+        return suggestions
+
+    def update_status(
+        self,
+        file_id: str,
+        suggestion_id: str,
+        status: str,
+    ) -> Optional[Dict[str, Any]]:
+        self._import(file_id)
+        suggestion = self.entities.get("ai_suggestions", file_id, suggestion_id)
+        if suggestion is None:
+            return None
+        suggestion["status"] = status
+        suggestion["updated_at"] = utc_timestamp()
+        self.entities.replace("ai_suggestions", file_id, suggestion)
+        return suggestion
+
+    def delete_suggestion(self, file_id: str, suggestion_id: str) -> bool:
+        self._import(file_id)
+        return self.entities.delete("ai_suggestions", file_id, suggestion_id) > 0
+
+    def get_suggestion(self, file_id: str, suggestion_id: str) -> Optional[Dict[str, Any]]:
+        self._import(file_id)
+        return self.entities.get("ai_suggestions", file_id, suggestion_id)
+
+
+class SQLiteChatHistoryManager(_SQLiteCollectionManager):
+    """ChatHistoryManager backed by SQLiteEntityStore."""
+
+    def list_messages(self, file_id: str) -> List[Dict[str, Any]]:
+        self._import(file_id)
+        return self.entities.list("chat_messages", file_id)
+
+    def add_message(
+        self,
+        file_id: str,
+        role: str,
+        content: str,
+        context: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        item = {"role": role, "content": content, "context": context}
+        created = self.add_messages_bulk(file_id, [item])
+        return None if created is None else created[0]
+
+    def add_messages_bulk(self, file_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        if not self.store.exists(file_id):
+            return None
+        self._import(file_id)
+        messages = build_messages(
+            items, self.entities.reserve_seq("chat_messages", file_id, len(items))
+        )
+        self.entities.insert("chat_messages", file_id, messages)
+        return messages
+
+    def clear_messages(self, file_id: str) -> bool:
+        if not self.store.exists(file_id):
+            return False
+        self._import(file_id)
+        self.entities.delete("chat_messages", file_id)
+        return True
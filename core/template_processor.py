@@ -5,19 +5,135 @@ Performs gap analysis and content improvement using templates.
 
 import json
 import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 from anthropic import Anthropic
 
+from tools import json_utils
+from tools.llm_client import EPHEMERAL_CACHE_CONTROL, MIN_CACHEABLE_PROMPT_CHARS
+
 logger = logging.getLogger(__name__)
 
 
+_BLOCK_FIELDS = ('block_id', 'content', 'type')
+# Opening text kept in the document summary sent with improvement prompts
+SUMMARY_OPENING_CHARS = 800
+# Most recent earlier suggestions quoted in each page's prompts
+RECENT_SUGGESTIONS_IN_PROMPT = 10
+
+# Prompt and template files shared by every processor: path -> (mtime_ns, content)
+_FILE_CACHE: Dict[Path, Tuple[int, str]] = {}
+
+
+def _cached_read(path: Path) -> str:
+    """``path.read_text()``, re-read only when the file's mtime changes."""
+    mtime_ns = path.stat().st_mtime_ns
+    cached = _FILE_CACHE.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    content = path.read_text()
+    _FILE_CACHE[path] = (mtime_ns, content)
+    return content
+
+
+def _toon_value(value: Any) -> str:
+    """A table cell: bare when unambiguous, otherwise a JSON-quoted string."""
+    text = "" if value is None else str(value)
+    if not text or text != text.strip() or any(c in text for c in ',"\n\r\\'):
+        return json_utils.dumps(text)
+    return text
+
+
+def _blocks_table(page_blocks: List[Dict[str, Any]]) -> str:
+    """A page's blocks as sent to the LLM, in TOON tabular form.
+
+    The rows all have the same three fields, so the field names are given once
+    in the header instead of on every block as JSON would repeat them:
+
+        blocks[2]{block_id,content,type}:
+          p1_b1,Risk Appetite Statement,heading
+          p1_b2,"The Board sets limits, reviewed annually.",paragraph
+    """
+    lines = [f"blocks[{len(page_blocks)}]{{{','.join(_BLOCK_FIELDS)}}}:"]
+    for b in page_blocks:
+        lines.append("  " + ",".join(_toon_value(v) for v in (b['id'], b['content'], b['type'])))
+    return "\n".join(lines)
+
+
+def _parse_json_response(response_text: str) -> Any:
+    """Parse an LLM JSON reply, dropping the first and last line of a fenced one."""
+    response_text = response_text.strip()
+    if response_text.startswith('```'):
+        _, _, rest = response_text.partition('\n')
+        response_text, _, _ = rest.rpartition('\n')
+    return json_utils.loads(response_text)
+
+
+def _document_summary(full_markdown: str) -> str:
+    """Short stand-in for the whole document: its opening text and headings."""
+    opening = full_markdown[:SUMMARY_OPENING_CHARS]
+    if len(full_markdown) > SUMMARY_OPENING_CHARS:
+        cutoff = opening.rfind(' ')
+        opening = (opening[:cutoff] if cutoff > 0 else opening) + '...'
+    headings = [line.strip() for line in full_markdown.splitlines() if line.lstrip().startswith('#')]
+    if not headings:
+        return opening
+    return f"{opening}\n\nSECTION HEADINGS:\n" + "\n".join(headings)
+
+
+def _page_prompt_messages(
+    full_document: str,
+    template: str,
+    page_prompt: str,
+    document_label: str = "ORIGINAL FULL DOCUMENT"
+) -> List[Dict[str, Any]]:
+    """User message for a per-page call: the document and template first, as a
+    prompt-cache prefix shared by every page, then the page-specific part."""
+    preamble = f"""
+{document_label}:
+{full_document}
+
+---
+
+TEMPLATE:
+{template}
+
+---
+"""
+    preamble_block: Dict[str, Any] = {"type": "text", "text": preamble}
+    if len(preamble) >= MIN_CACHEABLE_PROMPT_CHARS:
+        preamble_block["cache_control"] = EPHEMERAL_CACHE_CONTROL
+    return [{"role": "user", "content": [preamble_block, {"type": "text", "text": page_prompt}]}]
+
+
 class TemplateProcessor:
     """Process documents against templates with LLM-based gap analysis and improvement."""
     
-    def __init__(self, api_key: str):
-        """Initialize with Anthropic API key."""
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrency: Optional[int] = None,
+        summarize_for_improvements: bool = False,
+    ):
+        """Initialize with Anthropic API key.
+        
+        ``max_concurrency`` caps how many pages are processed at once. The
+        default, 1, processes pages in order so each page's prompt includes the
+        suggestions already made for earlier pages; concurrent pages lose that
+        context, so raise it only where throughput matters more.
+        
+        With ``summarize_for_improvements`` the improvement prompts get the
+        document's opening and headings instead of the full text. That is
+        smaller, but the gap analysis each page's improvements build on only
+        covers that page, and the improvement calls no longer share the
+        document prefix the gap-analysis calls cache. Off by default.
+        """
         self.client = Anthropic(api_key=api_key)
+        self.max_concurrency = max_concurrency
+        self.summarize_for_improvements = summarize_for_improvements
         self.config_dir = Path(__file__).parent.parent.parent / "config" / "prompts" / "doc-review"
         
         # Load prompts
@@ -29,7 +145,7 @@ class TemplateProcessor:
             # Check new location first
             synthesis_path = Path(__file__).parent / "prompts" / "phase2_synthesis_summary.md"
             if synthesis_path.exists():
-                self.synthesis_prompt = synthesis_path.read_text()
+                self.synthesis_prompt = _cached_read(synthesis_path)
             else:
                 self.synthesis_prompt = None
                 logger.warning("Synthesis prompt not found - synthesis summary will be unavailable")
@@ -42,7 +158,7 @@ class TemplateProcessor:
         prompt_path = self.config_dir / filename
         if not prompt_path.exists():
             raise FileNotFoundError(f"Prompt template not found: {prompt_path}")
-        return prompt_path.read_text()
+        return _cached_read(prompt_path)
     
     def process_document_with_template(
         self,
@@ -67,49 +183,114 @@ class TemplateProcessor:
         
         # Group blocks by page
         pages = self._group_blocks_by_page(block_metadata, full_markdown)
+        # Improvement prompts get the full document unless summaries were asked for
+        document_summary = _document_summary(full_markdown) if self.summarize_for_improvements else None
         
         all_gap_analysis = []
         all_improvements = []
-        new_doc_so_far = ""
         
-        for page_num, page_data in enumerate(pages, start=1):
-            logger.info(f"Processing page {page_num}/{len(pages)}")
-            
-            # Step 1: Gap Analysis
-            gap_analysis = self._perform_gap_analysis(
-                full_document=full_markdown,
-                template=template_content,
-                new_doc_so_far=new_doc_so_far,
-                current_page=page_data['markdown'],
-                page_blocks=page_data['blocks'],
-                page_num=page_num,
-                current_suggestions=all_improvements  # Pass existing suggestions
-            )
-            all_gap_analysis.extend(gap_analysis)
-            
-            # Step 2: Content Improvement
-            improvements = self._generate_improvements(
-                full_document=full_markdown,
-                template=template_content,
-                new_doc_so_far=new_doc_so_far,
-                current_page=page_data['markdown'],
-                page_blocks=page_data['blocks'],
-                gap_analysis=gap_analysis,
-                page_num=page_num,
-                current_suggestions=all_improvements  # Pass existing suggestions
-            )
-            all_improvements.extend(improvements)
+        workers = min(len(pages), self._max_concurrency())
+        # Pages as improved so far; joined only when a prompt needs the text
+        new_doc_parts: List[str] = []
+        if workers <= 1:
+            # Latest suggestions, each serialized once as it comes in
+            recent_suggestions: deque = deque(maxlen=RECENT_SUGGESTIONS_IN_PROMPT)
+            for page_num, page_data in enumerate(pages, start=1):
+                gap_analysis, improvements = self._process_page(
+                    full_markdown, template_content, "".join(new_doc_parts), page_data, page_num, len(pages),
+                    current_suggestions=all_improvements,  # Pass existing suggestions
+                    document_summary=document_summary,
+                    suggestions_json="[" + ",".join(recent_suggestions) + "]" if recent_suggestions else None
+                )
+                all_gap_analysis.extend(gap_analysis)
+                all_improvements.extend(improvements)
+                recent_suggestions.extend(json_utils.dumps(imp) for imp in improvements)
+                
+                # Update new_doc_so_far with improved content
+                improved_page = self._apply_improvements_to_page(
+                    page_data['markdown'],
+                    improvements
+                )
+                new_doc_parts.append(improved_page)
+                new_doc_parts.append("\n\n---\n\n")
+        else:
+            # Pages run concurrently, so none of them sees another page's
+            # suggestions; new_doc_so_far is the preceding pages as written,
+            # which is what _apply_improvements_to_page produces today anyway
+            prefixes = []
+            for page_data in pages:
+                prefixes.append("".join(new_doc_parts))
+                new_doc_parts.append(self._apply_improvements_to_page(page_data['markdown'], []))
+                new_doc_parts.append("\n\n---\n\n")
             
-            # Update new_doc_so_far with improved content
-            improved_page = self._apply_improvements_to_page(
-                page_data['markdown'],
-                improvements
-            )
-            new_doc_so_far += improved_page + "\n\n---\n\n"
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(
+                    lambda job: self._process_page(
+                        full_markdown, template_content, job[0], job[1], job[2], len(pages),
+                        document_summary=document_summary
+                    ),
+                    zip(prefixes, pages, range(1, len(pages) + 1)),
+                ))
+            for gap_analysis, improvements in outcomes:
+                all_gap_analysis.extend(gap_analysis)
+                all_improvements.extend(improvements)
         
         logger.info(f"Template processing complete: {len(all_gap_analysis)} gaps, {len(all_improvements)} improvements")
         return all_gap_analysis, all_improvements
     
+    def _max_concurrency(self) -> int:
+        value = self.max_concurrency
+        if value is None:
+            return 1
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return 1
+    
+    def _process_page(
+        self,
+        full_markdown: str,
+        template_content: str,
+        new_doc_so_far: str,
+        page_data: Dict[str, Any],
+        page_num: int,
+        total_pages: int,
+        current_suggestions: Optional[List[Dict]] = None,
+        document_summary: Optional[str] = None,
+        suggestions_json: Optional[str] = None
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """Gap analysis, then improvements, for one page."""
+        logger.info(f"Processing page {page_num}/{total_pages}")
+        
+        # Step 1: Gap Analysis
+        gap_analysis = self._perform_gap_analysis(
+            full_document=full_markdown,
+            template=template_content,
+            new_doc_so_far=new_doc_so_far,
+            current_page=page_data['markdown'],
+            page_blocks=page_data['blocks'],
+            page_num=page_num,
+            current_suggestions=current_suggestions,
+            blocks_table=page_data['blocks_table'],
+            suggestions_json=suggestions_json
+        )
+        
+        # Step 2: Content Improvement
+        improvements = self._generate_improvements(
+            full_document=full_markdown,
+            document_summary=document_summary,
+            template=template_content,
+            new_doc_so_far=new_doc_so_far,
+            current_page=page_data['markdown'],
+            page_blocks=page_data['blocks'],
+            gap_analysis=gap_analysis,
+            page_num=page_num,
+            current_suggestions=current_suggestions,
+            blocks_table=page_data['blocks_table'],
+            suggestions_json=suggestions_json
+        )
+        return gap_analysis, improvements
+    
     def _group_blocks_by_page(
         self,
         block_metadata: List[Dict[str, Any]],
@@ -136,6 +317,8 @@ class TemplateProcessor:
                 start_line = min(b['start_line'] for b in page_blocks)
                 end_line = max(b['end_line'] for b in page_blocks)
                 pages[page_num]['markdown'] = '\n'.join(markdown_lines[start_line:end_line+1])
+            # Shared by the page's gap analysis and improvement prompts
+            pages[page_num]['blocks_table'] = _blocks_table(page_blocks)
         
         # Return sorted by page number
         return [pages[p] for p in sorted(pages.keys())]
@@ -148,37 +331,25 @@ class TemplateProcessor:
         current_page: str,
         page_blocks: List[Dict],
         page_num: int,
-        current_suggestions: List[Dict] = None
+        current_suggestions: List[Dict] = None,
+        blocks_table: Optional[str] = None,
+        suggestions_json: Optional[str] = None
     ) -> List[Dict]:
         """Perform gap analysis for a single page."""
         logger.info(f"Performing gap analysis for page {page_num}")
         
         # Prepare blocks for LLM
-        blocks_json = json.dumps([
-            {
-                'block_id': b['id'],
-                'content': b['content'],
-                'type': b['type']
-            }
-            for b in page_blocks
-        ], indent=2)
+        if blocks_table is None:
+            blocks_table = _blocks_table(page_blocks)
         
         # Prepare existing suggestions summary
+        if suggestions_json is None and current_suggestions:
+            suggestions_json = json_utils.dumps(current_suggestions[-RECENT_SUGGESTIONS_IN_PROMPT:])
         suggestions_summary = ""
-        if current_suggestions:
-            suggestions_summary = f"\n\nEXISTING SUGGESTIONS (from previous pages):\n{json.dumps(current_suggestions[-10:], indent=2)}\nNote: Avoid duplicate or contradictory suggestions."
+        if suggestions_json:
+            suggestions_summary = f"\n\nEXISTING SUGGESTIONS (from previous pages):\n{suggestions_json}\nNote: Avoid duplicate or contradictory suggestions."
         
-        user_prompt = f"""
-ORIGINAL FULL DOCUMENT:
-{full_document}
-
----
-
-TEMPLATE:
-{template}
-
----
-
+        page_prompt = f"""
 NEW DOCUMENT SO FAR:
 {new_doc_so_far if new_doc_so_far else "(This is page 1, no previous content)"}
 {suggestions_summary}
@@ -190,8 +361,8 @@ CURRENT PAGE (Page {page_num}):
 
 ---
 
-BLOCK METADATA:
-{blocks_json}
+BLOCK METADATA (TOON table: a header naming the fields, then one comma-separated row per block; values containing commas, quotes or line breaks are JSON-quoted):
+{blocks_table}
 
 ---
 
@@ -203,16 +374,10 @@ Analyze the current page against the template and identify gaps block by block.
                 model="claude-3-haiku-20240307",
                 max_tokens=4096,
                 system=self.gap_analysis_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
+                messages=_page_prompt_messages(full_document, template, page_prompt)
             )
             
-            response_text = response.content[0].text.strip()
-            
-            # Remove markdown code fences if present
-            if response_text.startswith('```'):
-                response_text = '\n'.join(response_text.split('\n')[1:-1])
-            
-            result = json.loads(response_text)
+            result = _parse_json_response(response.content[0].text)
             gap_analysis = result.get('gap_analysis', [])
             
             logger.info(f"Page {page_num}: Found {len(gap_analysis)} gaps")
@@ -231,39 +396,32 @@ Analyze the current page against the template and identify gaps block by block.
         page_blocks: List[Dict],
         gap_analysis: List[Dict],
         page_num: int,
-        current_suggestions: List[Dict] = None
+        current_suggestions: List[Dict] = None,
+        blocks_table: Optional[str] = None,
+        suggestions_json: Optional[str] = None,
+        document_summary: Optional[str] = None
     ) -> List[Dict]:
-        """Generate content improvements for a single page."""
+        """Generate content improvements for a single page.
+        
+        The prompt starts with the same document and template prefix as the gap
+        analysis, unless ``document_summary`` replaces the full document.
+        """
         logger.info(f"Generating improvements for page {page_num}")
         
         # Prepare blocks for LLM
-        blocks_json = json.dumps([
-            {
-                'block_id': b['id'],
-                'content': b['content'],
-                'type': b['type']
-            }
-            for b in page_blocks
-        ], indent=2)
+        if blocks_table is None:
+            blocks_table = _blocks_table(page_blocks)
         
         gap_analysis_json = json.dumps(gap_analysis, indent=2)
         
         # Prepare existing suggestions summary
+        if suggestions_json is None and current_suggestions:
+            suggestions_json = json_utils.dumps(current_suggestions[-RECENT_SUGGESTIONS_IN_PROMPT:])
         suggestions_summary = ""
-        if current_suggestions:
-            suggestions_summary = f"\n\nEXISTING SUGGESTIONS (from previous pages):\n{json.dumps(current_suggestions[-10:], indent=2)}\nNote: Maintain consistency with previous suggestions."
+        if suggestions_json:
+            suggestions_summary = f"\n\nEXISTING SUGGESTIONS (from previous pages):\n{suggestions_json}\nNote: Maintain consistency with previous suggestions."
         
-        user_prompt = f"""
-ORIGINAL FULL DOCUMENT:
-{full_document}
-
----
-
-TEMPLATE:
-{template}
-
----
-
+        page_prompt = f"""
 NEW DOCUMENT SO FAR:
 {new_doc_so_far if new_doc_so_far else "(This is page 1, no previous content)"}
 {suggestions_summary}
@@ -275,8 +433,8 @@ CURRENT PAGE (Page {page_num}):
 
 ---
 
-BLOCK METADATA:
-{blocks_json}
+BLOCK METADATA (TOON table: a header naming the fields, then one comma-separated row per block; values containing commas, quotes or line breaks are JSON-quoted):
+{blocks_table}
 
 ---
 
@@ -293,16 +451,14 @@ Generate improved content for each block that addresses the identified gaps.
                 model="claude-3-haiku-20240307",
                 max_tokens=4096,
                 system=self.content_improvement_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
+                messages=(
+                    _page_prompt_messages(full_document, template, page_prompt)
+                    if document_summary is None
+                    else _page_prompt_messages(document_summary, template, page_prompt, "DOCUMENT SUMMARY")
+                )
             )
             
-            response_text = response.content[0].text.strip()
-            
-            # Remove markdown code fences if present
-            if response_text.startswith('```'):
-                response_text = '\n'.join(response_text.split('\n')[1:-1])
-            
-            result = json.loads(response_text)
+            result = _parse_json_response(response.content[0].text)
             improvements = result.get('improvements', [])
             
             # Validate improvements match blocks
@@ -442,19 +598,20 @@ def load_template(template_name: str) -> str:
     if not template_path.exists():
         raise FileNotFoundError(f"Template not found: {template_name}")
     
-    return template_path.read_text()
+    return _cached_read(template_path)
 
 
 def list_templates() -> List[str]:
     """List available template names."""
     # Use same path as upload endpoint - relative to current working directory
     template_dir = Path("data/templates")
-    if not template_dir.exists():
+    try:
+        # scandir gets entry types from the directory listing, without a stat per file
+        with os.scandir(template_dir) as entries:
+            return sorted(
+                entry.name[:-3] for entry in entries
+                if entry.name.endswith(".md") and entry.is_file()
+            )
+    except FileNotFoundError:
         return []
-    
-    templates = []
-    for path in template_dir.glob("*.md"):
-        templates.append(path.stem)
-    
-    return sorted(templates)
 
@@ -1,13 +1,26 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from core.models import AgentState
+from tools import json_utils
+
+
+# Severity values a suggested change may carry (see models.SuggestedChange)
+_SEVERITIES: Tuple[str, ...] = ("low", "medium", "high")
+
+# Every non-alphanumeric ASCII character becomes "_"
+_SLUG_TABLE = {code: "_" for code in range(128) if not chr(code).isalnum()}
 
 
 def _slugify_section(title: str) -> str:
-    return "".join(ch.lower() if ch.isalnum() else "_" for ch in title).strip("_") or "section"
+    if title.isascii():
+        slug = title.lower().translate(_SLUG_TABLE)
+    else:
+        # str.isalnum() covers non-ASCII letters and digits too; keep those as they are
+        slug = "".join(ch.lower() if ch.isalnum() else "_" for ch in title)
+    return slug.strip("_") or "section"
 
 
 class DocReviewVFSAdapter:
@@ -25,71 +38,25 @@ class DocReviewVFSAdapter:
     # ------------------------------------------------------------------ #
     def list_dir(self, path: str) -> List[Dict[str, str]]:
         path = self._normalize(path)
-        if path == "/":
-            return self._root_entries()
-        if path == "/original":
-            return self._directory_entries(
-                [("document.md", self.structure.get("raw_text"))], file_extension="md"
-            )
-        if path == "/phase1":
-            files = [
-                ("doc_summary.json", self.phase1.get("doc_summary")),
-                ("toc_review.json", self.phase1.get("toc_review")),
-                ("template_fitness.json", self.phase1.get("template_fitness_report")),
-                ("section_strategy.json", self.phase1.get("section_strategy")),
-            ]
-            return self._directory_entries(files, file_extension="json")
-        if path == "/phase2":
-            entries: List[Dict[str, str]] = []
-            if self.phase2.get("chunks"):
-                entries.append({"name": "sections", "type": "directory"})
-            if self.phase2.get("reviews"):
-                entries.append({"name": "reviews", "type": "directory"})
-            if self.phase2.get("summary_report"):
-                entries.append({"name": "summary_report.json", "type": "file"})
-            return entries
-        if path == "/phase2/sections":
-            return self._list_section_chunks(kind="sections")
-        if path == "/phase2/reviews":
-            return self._list_section_chunks(kind="reviews")
-        if path == "/changes":
-            files = [
-                ("suggested_changes.json", self.changes.get("suggested_changes")),
-                ("applied_changes.json", self.changes.get("applied_change_ids")),
-            ]
-            return self._directory_entries(files, file_extension="json")
-        if path == "/versions":
-            entries = [
-                ("current.md", self.structure.get("raw_text")),
-            ]
-            if self.changes.get("_pre_apply_text"):
-                entries.append(("previous.md", self.changes.get("_pre_apply_text")))
-            return self._directory_entries(entries, file_extension="md")
-        raise FileNotFoundError(path)
+        handler = _LIST_HANDLERS.get(path)
+        if handler is None:
+            raise FileNotFoundError(path)
+        return handler(self)
 
     def stat(self, path: str) -> Dict[str, Optional[int]]:
         path = self._normalize(path)
         if path.endswith("/"):
             path = path.rstrip("/")
-        if path in {"/", "/original", "/phase1", "/phase2", "/phase2/sections", "/phase2/reviews", "/changes", "/versions"}:
+        if (path or "/") in _DIRECTORIES:
             return {"path": path or "/", "type": "directory", "size": 0}
         content = self.read_file(path)
         return {"path": path, "type": "file", "size": len(content)}
 
     def read_file(self, path: str) -> str:
         path = self._normalize(path)
-        if path == "/original/document.md":
-            return self.structure.get("raw_text", "") or ""
-        if path == "/phase1/doc_summary.json":
-            return self._to_json(self.phase1.get("doc_summary"))
-        if path == "/phase1/toc_review.json":
-            return self._to_json(self.phase1.get("toc_review"))
-        if path == "/phase1/template_fitness.json":
-            return self._to_json(self.phase1.get("template_fitness_report"))
-        if path == "/phase1/section_strategy.json":
-            return self._to_json(self.phase1.get("section_strategy"))
-        if path == "/phase2/summary_report.json":
-            return self._to_json(self.phase2.get("summary_report"))
+        handler = _READ_HANDLERS.get(path)
+        if handler is not None:
+            return handler(self)
         if path.startswith("/phase2/reviews/"):
             section = self._resolve_section_from_path(path, suffix=".json")
             reviews = self.phase2.get("reviews") or {}
@@ -99,21 +66,9 @@ class DocReviewVFSAdapter:
             chunks = self.phase2.get("chunks") or {}
             chunk = chunks.get(section, {})
             return chunk.get("text", "") or ""
-        if path == "/changes/suggested_changes.json":
-            return self._to_json(self.changes.get("suggested_changes"))
-        if path == "/changes/applied_changes.json":
-            applied = {
-                "applied_change_ids": self.changes.get("applied_change_ids", []),
-                "failed_changes": self.changes.get("failed_changes", []),
-            }
-            return self._to_json(applied)
-        if path == "/versions/current.md":
-            return self.structure.get("raw_text", "") or ""
-        if path == "/versions/previous.md":
-            previous = self.changes.get("_pre_apply_text")
-            if not previous:
-                raise FileNotFoundError(path)
-            return previous
+        published = self._read_published_file(path)
+        if published is not None:
+            return published
         raise FileNotFoundError(path)
 
     def write_file(self, path: str, data: str) -> None:
@@ -128,7 +83,16 @@ class DocReviewVFSAdapter:
                 raise ValueError("suggested_changes must be valid JSON") from exc
             if not isinstance(parsed, list):
                 raise ValueError("suggested_changes must be a list")
+            for change in parsed:
+                if not isinstance(change, dict) or "severity" not in change:
+                    continue
+                severity = change["severity"]
+                if severity not in _SEVERITIES:
+                    raise ValueError(f"severity must be one of {', '.join(_SEVERITIES)}")
+                # Every change shares one of the fixed severity strings
+                change["severity"] = _SEVERITIES[_SEVERITIES.index(severity)]
             self.changes["suggested_changes"] = parsed
+            self.changes["revision"] = self.changes.get("revision", 0) + 1
             return
         raise PermissionError(f"Path '{path}' is read-only")
 
@@ -142,6 +106,66 @@ class DocReviewVFSAdapter:
             path = "/" + path
         return path.rstrip() or "/"
 
+    def _list_phase1(self) -> List[Dict[str, str]]:
+        files = [
+            ("doc_summary.json", self.phase1.get("doc_summary")),
+            ("toc_review.json", self.phase1.get("toc_review")),
+            ("template_fitness.json", self.phase1.get("template_fitness_report")),
+            ("section_strategy.json", self.phase1.get("section_strategy")),
+        ]
+        return self._directory_entries(files, file_extension="json")
+
+    def _list_phase2(self) -> List[Dict[str, str]]:
+        entries: List[Dict[str, str]] = []
+        if self.phase2.get("chunks"):
+            entries.append({"name": "sections", "type": "directory"})
+        if self.phase2.get("reviews"):
+            entries.append({"name": "reviews", "type": "directory"})
+        if self.phase2.get("summary_report"):
+            entries.append({"name": "summary_report.json", "type": "file"})
+        return entries
+
+    def _list_changes(self) -> List[Dict[str, str]]:
+        files = [
+            ("suggested_changes.json", self.changes.get("suggested_changes")),
+            ("applied_changes.json", self.changes.get("applied_change_ids")),
+        ]
+        return self._directory_entries(files, file_extension="json")
+
+    def _list_versions(self) -> List[Dict[str, str]]:
+        entries = [
+            ("current.md", self.structure.get("raw_text")),
+        ]
+        if self.changes.get("_pre_apply_text"):
+            entries.append(("previous.md", self.changes.get("_pre_apply_text")))
+        return self._directory_entries(entries, file_extension="md")
+
+    def _read_applied_changes(self) -> str:
+        applied = {
+            "applied_change_ids": self.changes.get("applied_change_ids", []),
+            "failed_changes": self.changes.get("failed_changes", []),
+        }
+        return self._to_json(applied)
+
+    def _read_previous_version(self) -> str:
+        previous = self.changes.get("_pre_apply_text")
+        if not previous:
+            raise FileNotFoundError("/versions/previous.md")
+        return previous
+
+    def _read_published_file(self, path: str) -> Optional[str]:
+        """Resolve files published under state['vfs']['files'] by the agent."""
+        files = (self.state.get("vfs") or {}).get("files") or {}
+        entry = files.get(path)
+        if not entry:
+            return None
+        if "ref" not in entry:
+            return entry.get("content", "")
+        data = self.state.get(entry["ref"])
+        if isinstance(data, str):
+            return data
+        return self._to_json(data)
+
     def _root_entries(self) -> List[Dict[str, str]]:
         entries = []
         if self.structure.get("raw_text"):
@@ -188,6 +212,34 @@ class DocReviewVFSAdapter:
         raise FileNotFoundError(path)
 
     def _to_json(self, data: object) -> str:
-        return json.dumps(data if data is not None else {}, indent=2, ensure_ascii=False)
-
-
+        return json_utils.dumps(data if data is not None else {}, indent=True)
+
+
+# Exact-path handlers; section and review files are matched by prefix in read_file()
+_LIST_HANDLERS: Dict[str, Callable[[DocReviewVFSAdapter], List[Dict[str, str]]]] = {
+    "/": DocReviewVFSAdapter._root_entries,
+    "/original": lambda self: self._directory_entries(
+        [("document.md", self.structure.get("raw_text"))], file_extension="md"
+    ),
+    "/phase1": DocReviewVFSAdapter._list_phase1,
+    "/phase2": DocReviewVFSAdapter._list_phase2,
+    "/phase2/sections": lambda self: self._list_section_chunks(kind="sections"),
+    "/phase2/reviews": lambda self: self._list_section_chunks(kind="reviews"),
+    "/changes": DocReviewVFSAdapter._list_changes,
+    "/versions": DocReviewVFSAdapter._list_versions,
+}
+
+_DIRECTORIES = frozenset(_LIST_HANDLERS)
+
+_READ_HANDLERS: Dict[str, Callable[[DocReviewVFSAdapter], str]] = {
+    "/original/document.md": lambda self: self.structure.get("raw_text", "") or "",
+    "/phase1/doc_summary.json": lambda self: self._to_json(self.phase1.get("doc_summary")),
+    "/phase1/toc_review.json": lambda self: self._to_json(self.phase1.get("toc_review")),
+    "/phase1/template_fitness.json": lambda self: self._to_json(self.phase1.get("template_fitness_report")),
+    "/phase1/section_strategy.json": lambda self: self._to_json(self.phase1.get("section_strategy")),
+    "/phase2/summary_report.json": lambda self: self._to_json(self.phase2.get("summary_report")),
+    "/changes/suggested_changes.json": lambda self: self._to_json(self.changes.get("suggested_changes")),
+    "/changes/applied_changes.json": DocReviewVFSAdapter._read_applied_changes,
+    "/versions/current.md": lambda self: self.structure.get("raw_text", "") or "",
+    "/versions/previous.md": DocReviewVFSAdapter._read_previous_version,
+}
@@ -0,0 +1,298 @@
+"""Tests for DocReviewStore (core/store.py)."""
+
+import threading
+
+import pytest
+
+from core.store import DocReviewStore
+from tools import json_utils
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocReviewStore(str(tmp_path / "documents"))
+    yield store
+    store.flush()
+    store.flush_index()
+
+
+def _comment(n, block_id="b1"):
+    return {"id": f"c{n}_1700000000000", "block_id": block_id, "content": f"comment {n}"}
+
+
+def test_append_leaves_readonly_record_untouched(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(1)]}, "ready")
+    store.load("doc", readonly=True)  # cache the record
+
+    before = store.load("doc", readonly=True)
+    assert store.append_items("doc", "comments", [_comment(2)])
+
+    assert [c["id"] for c in before["state"]["comments"]] == ["c1_1700000000000"]
+    after = store.load("doc", readonly=True)
+    assert after is not before
+    assert [c["id"] for c in after["state"]["comments"]] == ["c1_1700000000000", "c2_1700000000000"]
+
+
+def test_append_leaves_pending_readonly_record_untouched(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(1)]}, "ready")
+    record = store.load("doc")
+    record["status"] = "reviewed"
+    store.mark_dirty("doc", record)
+
+    before = store.load("doc", readonly=True)
+    assert store.append_items("doc", "comments", [_comment(2)])
+
+    assert len(before["state"]["comments"]) == 1
+    store.flush("doc")
+    reloaded = DocReviewStore(str(store.data_dir)).load("doc")
+    assert reloaded["status"] == "reviewed"
+    assert [c["id"] for c in reloaded["state"]["comments"]] == ["c1_1700000000000", "c2_1700000000000"]
+
+
+def test_append_concurrent_with_readonly_loads(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": []}, "ready")
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        try:
+            while not done.is_set():
+                record = store.load("doc", readonly=True)
+                comments = record["state"].get("comments") or []
+                count = len(comments)
+                # Serializing or iterating a readonly record must see a stable list
+                json_utils.dumps(record)
+                assert sum(1 for _ in comments) == count
+                assert len(comments) == count
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        for n in range(1, 201):
+            assert store.append_items("doc", "comments", [_comment(n, f"b{n % 3}")])
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+
+    assert not errors
+    comments = store.load("doc", readonly=True)["state"]["comments"]
+    assert [c["id"] for c in comments] == [_comment(n)["id"] for n in range(1, 201)]
+
+
+def test_append_to_missing_document_fails(store):
+    assert store.append_items("missing", "comments", [_comment(1)]) is False
+
+
+def test_writers_do_not_edit_records_handed_to_readers(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(1)]}, "ready")
+    reader = store.load("doc", readonly=True)
+    reader_updated_at = reader["updated_at"]
+
+    record = store.load("doc")
+    record["state"]["comments"].append(_comment(2))
+    store.mark_dirty("doc", record)
+    pending = store.load("doc", readonly=True)
+    # Edits after mark_dirty() do not leak into the pending record
+    record["state"]["comments"].append(_comment(3))
+    store.flush("doc")
+
+    assert reader["updated_at"] == reader_updated_at
+    assert len(reader["state"]["comments"]) == 1
+    assert len(pending["state"]["comments"]) == 2
+    assert len(store.load("doc", readonly=True)["state"]["comments"]) == 2
+
+    saved = store.load("doc")
+    store.save_record("doc", saved)
+    cached = store.load("doc", readonly=True)
+    saved["state"]["comments"].clear()
+    assert len(cached["state"]["comments"]) == 2
+    assert len(store.load("doc", readonly=True)["state"]["comments"]) == 2
+
+
+def test_delete_removes_llm_cache(tmp_path):
+    llm_cache_dir = tmp_path / "llm_cache"
+    store = DocReviewStore(str(tmp_path / "documents"), llm_cache_dir=str(llm_cache_dir))
+    store.save("doc", "/tmp/doc.pdf", {}, "ready")
+    (llm_cache_dir / "doc").mkdir(parents=True)
+    (llm_cache_dir / "doc" / "abc.json").write_text("{}")
+    (llm_cache_dir / "other").mkdir()
+
+    assert store.delete("doc")
+    assert not (llm_cache_dir / "doc").exists()
+    assert (llm_cache_dir / "other").exists()
+    store.delete("..")
+    assert llm_cache_dir.exists()
+
+
+def test_discarded_store_is_not_kept_alive(tmp_path):
+    import gc
+    import weakref
+
+    store = DocReviewStore(str(tmp_path / "documents"))
+    ref = weakref.ref(store)
+    del store
+    gc.collect()
+    assert ref() is None
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_save_load_round_trip(tmp_path, compress):
+    if compress:
+        pytest.importorskip("zstandard")
+    data_dir = tmp_path / "documents"
+    store = DocReviewStore(str(data_dir), compress=compress)
+    state = {"doc_meta": {"doc_title": "Policy"}, "raw_markdown": "# Policy", "comments": [_comment(1)]}
+    saved = store.save("doc", "/tmp/doc.pdf", state, "ready")
+    store.flush_index()
+
+    assert (data_dir / ("doc.state.json.zst" if compress else "doc.state.json")).exists()
+    # Read back by a fresh store, so nothing comes from the in-memory cache
+    loaded = DocReviewStore(str(data_dir)).load("doc")
+    assert loaded["title"] == "Policy"
+    assert loaded["status"] == "ready"
+    assert loaded["uploaded_at"] == saved["uploaded_at"]
+    assert loaded["state"]["original_markdown"] == "# Policy"
+    assert loaded["state"]["comments"] == [_comment(1)]
+    assert [doc["file_id"] for doc in DocReviewStore(str(data_dir)).list_documents()] == ["doc"]
+
+
+def test_append_log_is_replayed_by_a_new_store(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(1)]}, "ready")
+    store.append_items("doc", "comments", [_comment(2)])
+    store.append_items("doc", "ai_suggestions", [{"id": "ai1_1700000000000", "block_id": "b1"}])
+    assert store._append_log_file("doc").exists()
+
+    reloaded = DocReviewStore(str(store.data_dir)).load("doc")
+    assert [c["id"] for c in reloaded["state"]["comments"]] == ["c1_1700000000000", "c2_1700000000000"]
+    assert [s["id"] for s in reloaded["state"]["ai_suggestions"]] == ["ai1_1700000000000"]
+
+
+def test_replay_skips_torn_lines_and_items_already_saved(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": []}, "ready")
+    store.append_items("doc", "comments", [_comment(1)])
+    # save() writes the full state but leaves the log, so c1 is in both
+    record = store.load("doc")
+    store.save("doc", "/tmp/doc.pdf", record["state"], "ready")
+    with store._append_log_file("doc").open("ab") as log:
+        log.write(b'{"key": "comments", "item": {"id": "c2_')
+
+    reloaded = DocReviewStore(str(store.data_dir)).load("doc")
+    assert [c["id"] for c in reloaded["state"]["comments"]] == ["c1_1700000000000"]
+
+
+def test_save_record_folds_the_append_log_in(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": []}, "ready")
+    store.append_items("doc", "comments", [_comment(1)])
+
+    record = store.load("doc")
+    record["status"] = "reviewed"
+    store.save_record("doc", record)
+
+    assert not store._append_log_file("doc").exists()
+    reloaded = DocReviewStore(str(store.data_dir)).load("doc")
+    assert reloaded["status"] == "reviewed"
+    assert [c["id"] for c in reloaded["state"]["comments"]] == ["c1_1700000000000"]
+
+
+def test_append_log_is_compacted_past_the_size_limit(store, monkeypatch):
+    import core.store
+
+    monkeypatch.setattr(core.store, "APPEND_LOG_COMPACT_BYTES", 1024)
+    store.save("doc", "/tmp/doc.pdf", {"comments": []}, "ready")
+    log = store._append_log_file("doc")
+    for n in range(1, 31):
+        store.append_items("doc", "comments", [_comment(n)])
+        assert not log.exists() or log.stat().st_size <= 1024
+
+    reloaded = DocReviewStore(str(store.data_dir)).load("doc")
+    assert [c["id"] for c in reloaded["state"]["comments"]] == [_comment(n)["id"] for n in range(1, 31)]
+
+
+def test_update_status_keeps_state_and_index_in_step(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(1)]}, "ready")
+    before = store.load("doc", readonly=True)
+
+    assert store.update_status("doc", "running")
+    assert before["status"] == "ready"
+    assert store.load("doc", readonly=True)["status"] == "running"
+    assert store.load("doc")["state"]["comments"] == [_comment(1)]
+    assert store.list_documents()[0]["status"] == "running"
+    assert not store.update_status("missing", "running")
+
+
+def test_derived_indexes_are_not_persisted(store):
+    from core.store import find_by_id, items_for_block
+
+    store.save(
+        "doc",
+        "/tmp/doc.pdf",
+        # Written by older versions; stripped when the record is read
+        {"comments": [_comment(1, "b1"), _comment(2, "b2")], "comments_index": {"stale": 0}, "comments_seq": 9},
+        "ready",
+    )
+    state = store.load("doc", readonly=True)["state"]
+    assert "comments_index" not in state and "comments_seq" not in state
+    assert find_by_id(state, "comments", "c2_1700000000000") == 1
+    assert [c["id"] for c in items_for_block(state, "comments", "b2")] == ["c2_1700000000000"]
+
+    record = store.load("doc")
+    record["state"]["comments"].reverse()
+    assert find_by_id(record["state"], "comments", "c2_1700000000000") == 0
+    store.save_record("doc", record)
+    saved = json_utils.loads(store._read_state_bytes("doc"))
+    assert set(saved) == {"comments"}
+
+
+def test_delete_removes_record_files(store):
+    store.save("doc", "/tmp/doc.pdf", {"comments": []}, "ready")
+    store.append_items("doc", "comments", [_comment(1)])
+
+    assert store.delete("doc")
+    assert store.load("doc") is None
+    assert list(store.data_dir.glob("doc*")) == []
+    assert store.list_documents() == []
+    assert not store.delete("doc")
+
+
+def test_concurrent_adds_get_distinct_ids(store):
+    from core.comments import CommentsManager
+
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(7)]}, "ready")
+    comments = CommentsManager(store)
+    ids = []
+    lock = threading.Lock()
+
+    def add():
+        for _ in range(25):
+            comment = comments.add_comment("doc", "b1", "Block", "hi")
+            with lock:
+                ids.append(comment["id"])
+
+    threads = [threading.Thread(target=add) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    seqs = sorted(int(item_id[1:].split("_")[0]) for item_id in ids)
+    assert seqs == list(range(8, 108))
+    assert len(comments.list_comments("doc")) == 101
+
+    # A record replaced wholesale numbers from its own ids again
+    store.save("doc", "/tmp/doc.pdf", {"comments": [_comment(500)]}, "ready")
+    assert comments.add_comment("doc", "b1", "Block", "hi")["id"].startswith("c501_")
+    assert comments.add_comment("missing", "b1", "Block", "hi") is None
+
+
+def test_list_documents_is_ordered_by_file_id(store):
+    for file_id in ("b", "c", "a"):
+        store.save(file_id, f"/tmp/{file_id}.pdf", {}, "ready")
+    store.update_status("b", "running")
+
+    assert [doc["file_id"] for doc in store.list_documents()] == ["a", "b", "c"]
+    store.flush_index()
+    assert [doc["file_id"] for doc in DocReviewStore(str(store.data_dir)).list_documents()] == ["a", "b", "c"]
@@ -0,0 +1,93 @@
+"""Tests for the SQLite-backed collection managers (core/store_sqlite.py)."""
+
+import pytest
+
+from core.comments import CommentsManager
+from core.store import DocReviewStore
+from core.store_sqlite import (
+    SQLiteAISuggestionsManager,
+    SQLiteChatHistoryManager,
+    SQLiteCommentsManager,
+    SQLiteEntityStore,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocReviewStore(str(tmp_path / "documents"))
+    yield store
+    store.flush()
+    store.flush_index()
+
+
+@pytest.fixture
+def entities(tmp_path):
+    return SQLiteEntityStore(str(tmp_path / "documents" / "entities.sqlite3"))
+
+
+def test_add_to_missing_document_fails(store, entities):
+    comments = SQLiteCommentsManager(store, entities)
+    suggestions = SQLiteAISuggestionsManager(store, entities)
+    chat = SQLiteChatHistoryManager(store, entities)
+
+    assert comments.add_comment("missing", "b1", "Block", "hi") is None
+    assert comments.add_comments_bulk("missing", [{"block_id": "b1", "block_title": "", "content": "x"}]) is None
+    assert suggestions.add_suggestion("missing", "b1", "old", "new") is None
+    assert chat.add_message("missing", "user", "hi") is None
+    assert comments.list_comments("missing") == []
+
+
+def test_json_items_are_imported_once(tmp_path, store, entities):
+    store.save("doc", "/tmp/doc.pdf", {}, "ready")
+    json_comments = CommentsManager(store)
+    first = json_comments.add_comment("doc", "b1", "Block", "from json")
+    second = json_comments.add_comment("doc", "b2", "Block", "also from json")
+    store.flush()
+
+    comments = SQLiteCommentsManager(store, entities)
+    assert [c["id"] for c in comments.list_comments("doc")] == [first["id"], second["id"]]
+    assert [c["id"] for c in comments.list_comments("doc", "b2")] == [second["id"]]
+
+    added = comments.add_comment("doc", "b1", "Block", "from sqlite")
+    assert added["id"].startswith("c3_")
+    assert comments.delete_comment("doc", first["id"])
+
+    # Neither a second manager nor a restart brings deleted JSON items back
+    reopened = SQLiteEntityStore(str(tmp_path / "documents" / "entities.sqlite3"))
+    ids = [c["id"] for c in SQLiteCommentsManager(store, reopened).list_comments("doc")]
+    assert ids == [second["id"], added["id"]]
+
+
+def test_deleted_document_imports_again(store, entities):
+    store.save("doc", "/tmp/doc.pdf", {}, "ready")
+    chat = SQLiteChatHistoryManager(store, entities)
+    assert chat.list_messages("doc") == []
+
+    store.delete("doc")
+    entities.delete_document("doc")
+    store.save("doc", "/tmp/doc.pdf", {"chat_messages": [{"id": "msg1_1", "role": "user", "content": "hi"}]}, "ready")
+    assert [m["id"] for m in chat.list_messages("doc")] == ["msg1_1"]
+
+
+def test_reserve_seq_is_atomic_across_connections(tmp_path, entities):
+    import threading
+
+    db_path = str(tmp_path / "documents" / "entities.sqlite3")
+    firsts = []
+    lock = threading.Lock()
+
+    def reserve():
+        # Each thread gets its own connection, as in the app
+        for _ in range(20):
+            first = entities.reserve_seq("comments", "doc", 2)
+            with lock:
+                firsts.append(first)
+
+    threads = [threading.Thread(target=reserve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(firsts) == list(range(1, 161, 2))
+    assert SQLiteEntityStore(db_path).reserve_seq("comments", "doc", 1) == 161
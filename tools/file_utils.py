@@ -1,11 +1,16 @@
 """File utility functions."""
 
 import hashlib
+import io
 import re
 import uuid
 from pathlib import Path
 from typing import Any, Dict, List
 
+_SLUG_SEPARATORS = re.compile(r"[^a-z0-9]+")
+# Inline marks of a formatted paragraph segment, innermost first
+_INLINE_WRAP = (("bold", "**"), ("italic", "*"), ("code", "`"))
+
 
 def ensure_directory(path: Path) -> Path:
     """Create directory if it doesn't exist."""
@@ -32,7 +37,7 @@ def resolve_path(path_str: str) -> Path:
 def slugify(value: str) -> str:
     """Convert string to URL-friendly slug."""
     value = value.strip().lower()
-    value = re.sub(r"[^a-z0-9]+", "-", value)
+    value = _SLUG_SEPARATORS.sub("-", value)
     return value.strip("-") or uuid.uuid4().hex[:8]
 
 
@@ -41,85 +46,79 @@ def blocks_to_markdown(block_metadata: List[Dict[str, Any]]) -> str:
     if not block_metadata:
         return ""
     
-    lines = []
+    # Every line is written followed by "\n"; the final one is dropped on return
+    buf = io.StringIO()
+    w = buf.write
     for block in block_metadata:
-        block_type = block.get("type", "paragraph")
-        content = block.get("content", "")
-        level = block.get("level", 1)
+        get = block.get
+        block_type = get("type", "paragraph")
+        content = get("content", "")
         
         if block_type == "heading":
             # Heading: # for level 1, ## for level 2, etc.
-            prefix = "#" * level
+            w("#" * get("level", 1))
+            w(" ")
             if isinstance(content, str):
-                lines.append(f"{prefix} {content}")
+                w(content)
             else:
                 # If content is array, extract text
-                text = "".join(seg.get("text", "") for seg in content if isinstance(seg, dict))
-                lines.append(f"{prefix} {text}")
-            lines.append("")
+                w("".join(seg.get("text", "") for seg in content if isinstance(seg, dict)))
+            w("\n\n")
         
         elif block_type == "paragraph":
             if isinstance(content, str):
-                lines.append(content)
+                w(content)
             elif isinstance(content, list):
                 # Handle formatted segments
                 text_parts = []
                 for seg in content:
                     if isinstance(seg, dict):
                         text = seg.get("text", "")
-                        if seg.get("bold"):
-                            text = f"**{text}**"
-                        if seg.get("italic"):
-                            text = f"*{text}*"
-                        if seg.get("code"):
-                            text = f"`{text}`"
+                        # Most segments are plain text
+                        if seg.get("bold") or seg.get("italic") or seg.get("code"):
+                            for key, mark in _INLINE_WRAP:
+                                if seg.get(key):
+                                    text = f"{mark}{text}{mark}"
                         text_parts.append(text)
                     else:
                         text_parts.append(str(seg))
-                lines.append("".join(text_parts))
+                w("".join(text_parts))
             else:
-                lines.append(str(content))
-            lines.append("")
+                w(str(content))
+            w("\n\n")
         
-        elif block_type in ["bulleted_list", "numbered_list"]:
-            items = block.get("items", [])
-            for i, item in enumerate(items):
-                if isinstance(item, dict):
-                    item_content = item.get("content", "")
-                    prefix = "- " if block_type == "bulleted_list" else f"{i+1}. "
-                    lines.append(f"{prefix}{item_content}")
-                else:
-                    prefix = "- " if block_type == "bulleted_list" else f"{i+1}. "
-                    lines.append(f"{prefix}{item}")
-            lines.append("")
+        elif block_type in ("bulleted_list", "numbered_list"):
+            bulleted = block_type == "bulleted_list"
+            for i, item in enumerate(get("items", [])):
+                w("- " if bulleted else f"{i+1}. ")
+                w(str(item.get("content", "")) if isinstance(item, dict) else str(item))
+                w("\n")
+            w("\n")
         
         elif block_type == "table":
-            columns = block.get("columns", [])
-            rows = block.get("rows", [])
+            columns = get("columns", [])
             if columns:
                 # Header
-                lines.append("| " + " | ".join(str(c) for c in columns) + " |")
-                lines.append("| " + " | ".join(["---"] * len(columns)) + " |")
+                w("| " + " | ".join(str(c) for c in columns) + " |\n")
+                w("| " + " | ".join(["---"] * len(columns)) + " |\n")
                 # Rows
-                for row in rows:
-                    lines.append("| " + " | ".join(str(c) for c in row) + " |")
-                lines.append("")
+                for row in get("rows", []):
+                    w("| " + " | ".join(str(c) for c in row) + " |\n")
+                w("\n")
         
         elif block_type == "blockquote":
             if isinstance(content, str):
-                lines.append(f"> {content}")
-            lines.append("")
+                w("> ")
+                w(content)
+                w("\n")
+            w("\n")
         
         elif block_type == "code":
-            code_content = content if isinstance(content, str) else str(content)
-            lang = block.get("language", "")
-            lines.append(f"```{lang}")
-            lines.append(code_content)
-            lines.append("```")
-            lines.append("")
+            w(f"```{get('language', '')}\n")
+            w(content if isinstance(content, str) else str(content))
+            w("\n```\n\n")
         
         elif block_type == "divider":
-            lines.append("---")
-            lines.append("")
+            w("---\n\n")
     
-    return "\n".join(lines)
+    return buf.getvalue()[:-1]
@@ -1,15 +1,24 @@
 """Direct Anthropic API integration for LLM operations."""
 
 import os
-from typing import Dict, List, Optional
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Union
 from anthropic import Anthropic
 
 
+# Anthropic ignores cache breakpoints on prompts shorter than ~1024 tokens; use
+# a rough 4 chars/token estimate to avoid marking prompts that can never cache.
+MIN_CACHEABLE_PROMPT_CHARS = 4096
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+
 class LLMClientWrapper:
     """Wrapper around Anthropic client to provide invoke_with_prompt method."""
     
     def __init__(self, client: Anthropic):
         self.client = client
+        # Usage of the most recent response, per calling thread (see last_usage)
+        self._local = threading.local()
     
     @property
     def messages(self):
@@ -18,38 +27,32 @@ class LLMClientWrapper:
     
     def invoke(
         self,
-        messages: List[Dict[str, str]],
-        system: Optional[str] = None,
+        messages: List[Dict[str, Any]],
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
-        response_format: Optional[str] = None
+        response_format: Optional[str] = None,
+        cache_system: bool = False,
     ) -> str:
         """
         Invoke LLM with messages (compatible with old LLM client interface).
         
         Args:
-            messages: List of {"role": "user"|"assistant", "content": "..."}
-            system: Optional system prompt
+            messages: List of {"role": "user"|"assistant", "content": "..."}; content
+                may also be a list of text blocks (e.g. with cache_control)
+            system: Optional system prompt, as a string or a list of text blocks
             temperature: Override default temperature (0.0-1.0)
             max_tokens: Maximum tokens in response
             response_format: "json" to request JSON output (not directly supported, handled in prompt)
+            cache_system: Mark a string system prompt as a provider cache prefix
+                (when it is long enough to be cached on its own)
             
         Returns:
             LLM response text
         """
-        params = {
-            "model": "claude-3-opus-20240229",
-            "max_tokens": max_tokens or 4096,
-            "messages": messages,
-        }
-        
-        if system:
-            params["system"] = system
-        
-        if temperature is not None:
-            params["temperature"] = temperature
-        
+        params = _message_params(messages, system, temperature, max_tokens, cache_system)
         response = self.client.messages.create(**params)
+        self._local.usage = getattr(response, "usage", None)
         
         # Extract text from response
         if hasattr(response, 'content') and response.content:
@@ -63,6 +66,29 @@ class LLMClientWrapper:
         
         return ""
     
+    def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system: bool = False,
+    ) -> Iterator[str]:
+        """
+        Like invoke(), but yield the response text as it is generated.
+        
+        The request is sent when iteration starts. Usage is recorded (see
+        last_usage) when the stream ends, including when the reader stops early.
+        """
+        params = _message_params(messages, system, temperature, max_tokens, cache_system)
+        self._local.usage = None
+        with self.client.messages.stream(**params) as stream:
+            try:
+                for text in stream.text_stream:
+                    yield text
+            finally:
+                self._local.usage = _stream_usage(stream)
+    
     def invoke_with_prompt(
         self,
         system_prompt: str,
@@ -70,7 +96,8 @@ class LLMClientWrapper:
         temperature: Optional[float] = None,
         response_format: Optional[str] = None,
         max_tokens: int = 4096,
-        model: str = "claude-3-opus-20240229"
+        model: str = "claude-3-opus-20240229",
+        cache_prompt: bool = False,
     ) -> str:
         """
         Simplified invoke with system and user prompts.
@@ -82,18 +109,27 @@ class LLMClientWrapper:
             response_format: "json" to request JSON output
             max_tokens: Maximum tokens in response
             model: Model to use
+            cache_prompt: Mark the system prompt, and the system + user prompt, as
+                provider cache prefixes so calls sharing the same instructions (or
+                byte-identical repeats) are served from the prompt cache
             
         Returns:
             LLM response text
         """
-        messages = [{"role": "user", "content": user_prompt}]
+        if cache_prompt and len(system_prompt) + len(user_prompt) >= MIN_CACHEABLE_PROMPT_CHARS:
+            content = [
+                {"type": "text", "text": user_prompt, "cache_control": EPHEMERAL_CACHE_CONTROL}
+            ]
+            messages = [{"role": "user", "content": content}]
+        else:
+            messages = [{"role": "user", "content": user_prompt}]
         
         # Build request parameters
         params = {
             "model": model,
             "max_tokens": max_tokens,
             "messages": messages,
-            "system": system_prompt,
+            "system": _system_param(system_prompt, cache_prompt),
         }
         
         if temperature is not None:
@@ -106,6 +142,7 @@ class LLMClientWrapper:
             pass
         
         response = self.client.messages.create(**params)
+        self._local.usage = getattr(response, "usage", None)
         
         # Extract text from response
         if hasattr(response, 'content') and response.content:
@@ -119,24 +156,75 @@ class LLMClientWrapper:
             return "".join(text_parts)
         
         return ""
+    
+    def last_usage(self) -> Any:
+        """Token usage reported for this thread's most recent call, or None."""
+        return getattr(self._local, "usage", None)
+
+
+def _message_params(
+    messages: List[Dict[str, Any]],
+    system: Optional[Union[str, List[Dict[str, Any]]]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    cache_system: bool,
+) -> Dict[str, Any]:
+    """Request parameters shared by invoke() and stream()."""
+    params: Dict[str, Any] = {
+        "model": "claude-3-opus-20240229",
+        "max_tokens": max_tokens or 4096,
+        "messages": messages,
+    }
+    
+    if system:
+        params["system"] = _system_param(system, cache_system) if isinstance(system, str) else system
+    
+    if temperature is not None:
+        params["temperature"] = temperature
+    return params
+
+
+def _stream_usage(stream: Any) -> Any:
+    """Usage accumulated by a message stream: input tokens from message_start,
+    output tokens from the latest message_delta. None before the first event."""
+    try:
+        return getattr(stream.current_message_snapshot, "usage", None)
+    except AssertionError:
+        return None
+
+
+def _system_param(system_prompt: str, cache: bool) -> Union[str, List[Dict[str, Any]]]:
+    """System prompt as a plain string, or as a cacheable text block when it is
+    long enough to be worth a cache breakpoint on its own."""
+    if cache and len(system_prompt) >= MIN_CACHEABLE_PROMPT_CHARS:
+        return [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE_CONTROL}]
+    return system_prompt
 
 
 _client: Optional[Anthropic] = None
 _wrapper: Optional[LLMClientWrapper] = None
+_client_lock = threading.Lock()
 
 
 def get_llm_client() -> LLMClientWrapper:
     """Get or create Anthropic client wrapper."""
     global _client, _wrapper
-    if _client is None:
-        api_key = os.getenv('ANTHROPIC_API_KEY')
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-        _client = Anthropic(api_key=api_key)
-        _wrapper = LLMClientWrapper(_client)
-    return _wrapper
+    wrapper = _wrapper
+    if wrapper is not None:
+        return wrapper
+    with _client_lock:
+        # Concurrent first calls build a single client
+        if _wrapper is None:
+            api_key = os.getenv('ANTHROPIC_API_KEY')
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+            _client = Anthropic(api_key=api_key)
+            _wrapper = LLMClientWrapper(_client)
+        return _wrapper
 
 
 def is_llm_available() -> bool:
     """Check if LLM is configured."""
-    return os.getenv('ANTHROPIC_API_KEY') is not None
+    # Once the client exists the key was already found; skip the env lookup.
+    # Not cached at import: app.config may load the key from .env afterwards.
+    return _wrapper is not None or 'ANTHROPIC_API_KEY' in os.environ
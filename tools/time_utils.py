@@ -0,0 +1,26 @@
+"""Timestamp helpers."""
+
+import time
+from typing import Optional, Tuple
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") for the most recently formatted second.
+# Replaced as one tuple so concurrent callers never see a mismatched pair.
+_SECOND_PREFIX: Tuple[int, str] = (-1, "")
+
+
+def utc_timestamp(now: Optional[float] = None) -> str:
+    """UTC ISO-8601 timestamp with microseconds and a ``Z`` suffix.
+
+    Same shape as ``datetime.utcnow().isoformat() + "Z"``, except that the
+    fractional part is always present. The date/time prefix is reused for calls
+    within the same second.
+    """
+    global _SECOND_PREFIX
+    if now is None:
+        now = time.time()
+    second = int(now)
+    cached_second, prefix = _SECOND_PREFIX
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _SECOND_PREFIX = (second, prefix)
+    return f"{prefix}.{int((now - second) * 1_000_000):06d}Z"